@@ -857,7 +857,16 @@ public class PluginServerApiClient
             string url = $"{serverAddress.TrimEnd('/')}/api/backups/upload";
             Log.Debug("[{Tag}] 上传备份到: {Url}", LOG_TAG, url);
 
-            var response = await _httpClient.PostAsync(url, content);
+            // 配额预检请求头：服务器在接收文件之前即可按配额拒绝（413），不必等整个文件上传完
+            using var request = new HttpRequestMessage(HttpMethod.Post, url) { Content = content };
+            request.Headers.TryAddWithoutValidation("X-User-Key", userKey);
+            // 请求头只能包含 ASCII 字符，其他插件名仍由服务器在接收文件后检查
+            if (!string.IsNullOrEmpty(pluginName) && pluginName.All(c => c >= 0x20 && c < 0x7f))
+            {
+                request.Headers.TryAddWithoutValidation("X-Plugin-Name", pluginName);
+            }
+
+            var response = await _httpClient.SendAsync(request);
 
             if (response.IsSuccessStatusCode)
             {
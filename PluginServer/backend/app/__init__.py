@@ -1,3 +1,7 @@
 """
 应用包初始化
 """
+import time
+
+# 应用包开始导入的时间点，用于统计 worker 冷启动耗时
+BOOT_STARTED = time.perf_counter()
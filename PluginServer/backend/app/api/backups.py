@@ -1,21 +1,32 @@
 """
 备份管理 API 路由
 """
+import uuid
+from pathlib import Path
 from typing import List, Optional
-from fastapi import APIRouter, Depends, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from urllib.parse import quote
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Request, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import settings
 from app.database import get_db
 from app.schemas.backup import (
     BackupResponse,
     BackupListRequest,
     BackupDownloadRequest,
-    BackupListResponse
+    BackupListResponse,
+    BackupUsageResponse,
+    BackupGcRequest
 )
-from app.schemas.common import ApiResponse
+from app.schemas.common import ApiResponse, SignedUrlResponse
+from app.schemas.job import JobStatusResponse
 from app.services.backup_service import BackupService
+from app.services.job_service import JobService, job_queue
+from app.services.jobs import BACKUP_GC
+from app.utils.compression import ZSTD, zstd_available, iter_decompressed
 from app.utils.auth import require_admin, TokenData
+from app.utils.signed_url import BACKUPS, create_signed_url
 
 router = APIRouter(prefix="/api/backups", tags=["backups"])
 
@@ -29,7 +40,11 @@ async def upload_backup(
     description: str = Form("", description="备份描述（可选）"),
     db: AsyncSession = Depends(get_db)
 ):
-    """上传备份文件"""
+    """
+    上传备份文件
+    
+    可选携带 X-User-Key（及 X-Plugin-Name）请求头，超出配额时在上传请求体之前即返回 413。
+    """
     backup = await BackupService.create_backup(
         db, user_key, backup_type, file, description, plugin_name
     )
@@ -47,6 +62,16 @@ async def list_backups(
     return ApiResponse.ok(data=data, message="获取备份列表成功")
 
 
+@router.post("/usage", response_model=ApiResponse[BackupUsageResponse])
+async def get_backup_usage(
+    request: BackupListRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """获取用户的备份空间用量和配额"""
+    usage = await BackupService.get_usage(db, request.user_key)
+    return ApiResponse.ok(data=usage, message="获取备份用量成功")
+
+
 @router.get("/list-all", response_model=ApiResponse[BackupListResponse])
 async def list_all_backups(
     db: AsyncSession = Depends(get_db),
@@ -58,22 +83,103 @@ async def list_all_backups(
     return ApiResponse.ok(data=data, message="获取所有备份列表成功")
 
 
+def _accepts_encoding(http_request: Request, encoding: str) -> bool:
+    """客户端的 Accept-Encoding 是否包含指定编码（忽略 q=0）"""
+    for item in http_request.headers.get("accept-encoding", "").split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() == encoding and params.replace(" ", "") != "q=0":
+            return True
+    return False
+
+
+def backup_file_response(
+    http_request: Request,
+    file_path: Path,
+    file_name: str,
+    compression: Optional[str],
+    file_size: int,
+    headers: Optional[dict] = None
+):
+    """
+    构造备份下载响应（也用于签名链接，参数不依赖数据库记录）
+    
+    未压缩的备份直接发送文件；zstd 压缩的备份在客户端接受 zstd 编码时原样发送
+    （Content-Encoding: zstd，由客户端解压），否则在线程池中边读边解压后流式发送。
+    file_size 为解压后的原始大小。
+    """
+    headers = headers or {}
+    if compression != ZSTD:
+        return FileResponse(
+            path=file_path,
+            filename=file_name,
+            media_type='application/octet-stream',
+            headers=headers or None
+        )
+    
+    if _accepts_encoding(http_request, ZSTD):
+        return FileResponse(
+            path=file_path,
+            filename=file_name,
+            media_type='application/octet-stream',
+            headers={**headers, "Content-Encoding": ZSTD, "Vary": "Accept-Encoding"}
+        )
+    
+    if not zstd_available():
+        raise HTTPException(status_code=500, detail="服务器未安装 zstandard，无法解压该备份")
+    
+    quoted_name = quote(file_name)
+    if quoted_name != file_name:
+        disposition = f"attachment; filename*=utf-8''{quoted_name}"
+    else:
+        disposition = f'attachment; filename="{file_name}"'
+    return StreamingResponse(
+        iter_decompressed(file_path, settings.FILE_CHUNK_SIZE, ZSTD),
+        media_type='application/octet-stream',
+        headers={
+            **headers,
+            "Content-Disposition": disposition,
+            "Content-Length": str(file_size),
+            "Vary": "Accept-Encoding",
+        }
+    )
+
+
 @router.post("/download")
 async def download_backup(
     request: BackupDownloadRequest,
+    http_request: Request,
     db: AsyncSession = Depends(get_db)
 ):
-    """下载备份文件"""
-    file_path, file_name = await BackupService.download_backup(
-        db, request.user_key, request.id
-    )
-    return FileResponse(
-        path=file_path,
-        filename=file_name,
-        media_type='application/octet-stream'
+    """
+    下载备份文件
+    
+    服务器压缩存储的备份会透明解压；请求头 Accept-Encoding 包含 zstd 时直接发送压缩数据。
+    """
+    backup = await BackupService.download_backup(db, request.user_key, request.id)
+    return backup_file_response(
+        http_request, Path(backup.file_path), backup.file_name, backup.compression, backup.file_size
     )
 
 
+@router.post("/download-url", response_model=ApiResponse[SignedUrlResponse])
+async def create_backup_download_url(
+    request: BackupDownloadRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取备份的签名下载链接
+    
+    验证 user_key 后返回一个有效期为 SIGNED_URL_EXPIRES 秒的链接，
+    下载时只校验签名，不再访问数据库，链接可交给 nginx / CDN 等直接发送。
+    """
+    backup = await BackupService.download_backup(db, request.user_key, request.id)
+    params = {"name": backup.file_name, "size": str(backup.file_size)}
+    if backup.compression:
+        params["c"] = backup.compression
+    url, expires_at = create_signed_url(BACKUPS, backup.file_path, params)
+    return ApiResponse.ok(data=SignedUrlResponse(url=url, expires_at=expires_at), message="获取下载链接成功")
+
+
 @router.post("/delete", response_model=ApiResponse[None])
 async def delete_backup(
     request: BackupDownloadRequest,
@@ -82,3 +188,26 @@ async def delete_backup(
     """删除备份（用户可删除自己的备份，通过 user_key 验证）"""
     await BackupService.delete_backup(db, request.user_key, request.id)
     return ApiResponse.ok(message="备份已删除")
+
+
+@router.post("/gc", response_model=ApiResponse[JobStatusResponse])
+async def run_backup_gc(
+    request: BackupGcRequest,
+    db: AsyncSession = Depends(get_db),
+    admin: TokenData = Depends(require_admin)
+):
+    """
+    立即执行一次存储清理（需要管理员权限）
+    
+    清理在后台任务中执行，通过 /api/jobs/status 查询进度，完成后 result 字段为清理报告。
+    """
+    job_key = await JobService.enqueue(
+        db,
+        BACKUP_GC,
+        {"retention": request.retention, "orphans": request.orphans},
+        job_key=f"{BACKUP_GC}:manual:{uuid.uuid4().hex}",
+    )
+    await db.commit()
+    await job_queue.publish()
+    job = await JobService.get_job_by_key(db, job_key)
+    return ApiResponse.ok(data=job, message="存储清理任务已入队")
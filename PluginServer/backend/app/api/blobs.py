@@ -0,0 +1,49 @@
+"""
+签名链接文件下载路由
+
+只校验链接签名和过期时间（见 app.utils.signed_url），不访问数据库，
+链接本身由 /api/plugins/download-url 和 /api/backups/download-url 在授权后生成。
+"""
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse
+
+from app.api.backups import backup_file_response
+from app.utils.signed_url import PACKAGES, BACKUPS, verify_signed_url, resolve_blob_path
+
+router = APIRouter(prefix="/api/blobs", tags=["blobs"])
+
+
+def _verified_path(kind: str, path: str, http_request: Request):
+    """校验签名并返回 (文件路径, 剩余有效秒数)"""
+    remaining = verify_signed_url(kind, path, dict(http_request.query_params))
+    if not remaining:
+        raise HTTPException(status_code=403, detail="下载链接无效或已过期")
+    try:
+        file_path = resolve_blob_path(kind, path)
+    except ValueError:
+        raise HTTPException(status_code=403, detail="下载链接无效或已过期")
+    if not file_path.is_file():
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return file_path, remaining
+
+
+@router.get("/packages/{path:path}")
+async def download_package_blob(path: str, name: str, http_request: Request):
+    """通过签名链接下载插件安装包（链接有效期内可被共享缓存）"""
+    file_path, remaining = _verified_path(PACKAGES, path, http_request)
+    return FileResponse(
+        path=file_path,
+        filename=name,
+        media_type='application/zip',
+        headers={"Cache-Control": f"public, max-age={remaining}"}
+    )
+
+
+@router.get("/backups/{path:path}")
+async def download_backup_blob(path: str, name: str, size: int, http_request: Request, c: str = ""):
+    """通过签名链接下载备份（备份属于用户私有数据，只允许客户端缓存）"""
+    file_path, remaining = _verified_path(BACKUPS, path, http_request)
+    return backup_file_response(
+        http_request, file_path, name, c or None, size,
+        headers={"Cache-Control": f"private, max-age={remaining}"}
+    )
@@ -0,0 +1,51 @@
+"""
+后台任务 API 路由
+"""
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.schemas.common import ApiResponse
+from app.schemas.job import JobKeyRequest, JobStatusResponse
+from app.services.job_service import JobService, job_queue
+from app.utils.auth import require_admin, TokenData
+
+router = APIRouter(prefix="/api/jobs", tags=["jobs"])
+
+
+@router.post("/status", response_model=ApiResponse[JobStatusResponse])
+async def get_job_status(request: JobKeyRequest, db: AsyncSession = Depends(get_db)):
+    """
+    查询任务状态
+    
+    插件上传后的校验任务键为 verify_package:{插件名}@{版本号}:{文件哈希}。
+    """
+    job = await JobService.get_job_by_key(db, request.job_key)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return ApiResponse.ok(data=job, message="获取任务状态成功")
+
+
+@router.get("/list", response_model=ApiResponse[List[JobStatusResponse]])
+async def list_jobs(
+    status: Optional[str] = Query(None, description="按状态过滤: pending | running | succeeded | failed"),
+    limit: int = Query(100, ge=1, le=1000, description="最多返回条数"),
+    db: AsyncSession = Depends(get_db),
+    admin: TokenData = Depends(require_admin)
+):
+    """获取最近的任务列表（需要管理员权限）"""
+    jobs = await JobService.get_jobs(db, status, limit)
+    return ApiResponse.ok(data=jobs, message="获取任务列表成功")
+
+
+@router.post("/retry", response_model=ApiResponse[JobStatusResponse])
+async def retry_job(
+    request: JobKeyRequest,
+    db: AsyncSession = Depends(get_db),
+    admin: TokenData = Depends(require_admin)
+):
+    """重新执行失败的任务（需要管理员权限）"""
+    job = await JobService.retry_job(db, request.job_key)
+    await job_queue.publish()
+    return ApiResponse.ok(data=job, message="任务已重新入队")
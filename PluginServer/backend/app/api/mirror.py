@@ -0,0 +1,249 @@
+"""
+镜像节点的插件路由（MIRROR_UPSTREAM 不为空时代替 app.api.plugins 注册）
+
+读接口与中心服务器的路径和响应格式相同，客户端只需要把服务器地址换成镜像节点。
+数据来自上游服务器（见 app.services.mirror_service），上传、启用、删除等写操作需要在上游服务器上进行。
+变更订阅（长轮询和 SSE 推送）和增量同步直接转发到上游；下载链接和批量下载使用镜像节点本地的安装包。
+本地发送的下载次数在配置 MIRROR_REPORT_TOKEN 后批量上报给上游，304 不计入。
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Optional
+from urllib.parse import quote
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from app.config import settings
+from app.schemas.change import SyncRequest
+from app.schemas.common import (
+    ApiResponse, PluginNameRequest, PluginVersionRequest, PluginDownloadUrlRequest, SignedUrlResponse,
+    BundleRequest,
+)
+from app.services.mirror_service import MirrorService, UpstreamView
+from app.utils.client import client_identity
+from app.utils.zip_stream import iter_zip, bundle_entries
+from app.utils.http_cache import (
+    IMMUTABLE_MAX_AGE, make_etag, public_cache_control, etag_matches,
+    cache_headers, not_modified,
+)
+
+router = APIRouter(prefix="/api/plugins", tags=["mirror"])
+
+# 只能在上游服务器上执行的写操作
+WRITE_PATHS = ["/upload", "/enable", "/disable", "/deprecate", "/delete", "/version/deprecate"]
+
+
+def _view_cache_control() -> str:
+    return public_cache_control(settings.HTTP_CACHE_MAX_AGE)
+
+
+def _json(view: UpstreamView, http_request: Optional[Request] = None) -> Response:
+    """
+    返回上游响应体
+
+    GET 接口（传入 http_request）沿用上游的 ETag，客户端的 If-None-Match 匹配时返回 304。
+    """
+    if http_request is None:
+        return Response(content=view.body, media_type="application/json")
+    cache_control = _view_cache_control()
+    if etag_matches(http_request, view.etag):
+        return not_modified(view.etag, cache_control)
+    return Response(
+        content=view.body,
+        media_type="application/json",
+        headers=cache_headers(view.etag, cache_control),
+    )
+
+
+async def _download(
+    http_request: Request,
+    name: str,
+    version: Optional[str] = None,
+    cache_control: Optional[str] = None
+):
+    """发送本地保存的安装包（第一次请求时从上游下载）"""
+    package = await MirrorService.get_package(name, version)
+    headers = None
+    if cache_control:
+        etag = make_etag(package.file_hash)
+        if etag_matches(http_request, etag):
+            return not_modified(etag, cache_control)
+        headers = cache_headers(etag, cache_control)
+    MirrorService.record_download(package.plugin_name, package.version, client_identity(http_request))
+    return FileResponse(
+        path=package.file_path,
+        filename=package.file_name,
+        media_type='application/zip',
+        headers=headers
+    )
+
+
+@router.get("/list")
+async def get_plugins(http_request: Request):
+    """获取所有插件列表"""
+    return _json(await MirrorService.get_catalog(), http_request)
+
+
+@router.get("/changes")
+async def get_changes(
+    since: Optional[int] = Query(None, ge=0, description="上次收到的最大序号，不传则返回当前最新序号"),
+    timeout: float = Query(30.0, ge=0, description="没有新变更时的最长等待时间（秒），0 表示立即返回"),
+):
+    """长轮询获取插件变更（直接转发到上游，不缓存）"""
+    params = {"timeout": str(timeout)}
+    if since is not None:
+        params["since"] = str(since)
+    response = await MirrorService.get_changes(params, timeout)
+    return Response(content=response.content, status_code=response.status_code, media_type="application/json")
+
+
+@router.get("/changes/stream")
+async def stream_changes(
+    since: Optional[int] = Query(None, ge=0, description="上次收到的最大序号，不传则从当前最新序号开始"),
+    last_event_id: Optional[str] = Header(None, description="断线重连时浏览器自动携带的最后事件 ID"),
+):
+    """通过 Server-Sent Events 订阅插件变更（流式转发到上游，事件 ID 与上游相同）"""
+    params = {"since": str(since)} if since is not None else {}
+    headers = {"Last-Event-ID": last_event_id} if last_event_id else {}
+    upstream = await MirrorService.open_change_stream(params, headers)
+    if upstream.status_code != 200:
+        content = await upstream.aread()
+        await upstream.aclose()
+        return Response(content=content, status_code=upstream.status_code, media_type="application/json")
+    return StreamingResponse(
+        MirrorService.relay(upstream),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # 禁止 nginx 缓冲，保证事件即时送达
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@router.post("/sync")
+async def sync_plugins(request: SyncRequest):
+    """增量同步插件目录（直接转发到上游，不缓存）"""
+    response = await MirrorService.sync(request.model_dump(mode="json", exclude_none=True))
+    return Response(content=response.content, status_code=response.status_code, media_type="application/json")
+
+
+@router.post("/detail")
+async def get_plugin(request: PluginNameRequest):
+    """获取插件详情（包含版本列表）"""
+    return _json(await MirrorService.get_plugin(request.name))
+
+
+@router.post("/download")
+async def download_plugin(request: PluginNameRequest, http_request: Request):
+    """下载插件当前版本"""
+    return await _download(http_request, request.name)
+
+
+@router.post("/versions")
+async def get_plugin_versions(request: PluginNameRequest):
+    """获取插件的所有版本列表"""
+    return _json(await MirrorService.get_versions(request.name))
+
+
+@router.post("/version/detail")
+async def get_version_detail(request: PluginVersionRequest):
+    """获取指定版本详情"""
+    return _json(await MirrorService.get_version(request.name, request.version))
+
+
+@router.post("/version/download")
+async def download_version(request: PluginVersionRequest, http_request: Request):
+    """下载指定版本"""
+    return await _download(http_request, request.name, request.version)
+
+
+@router.post("/download-url", response_model=ApiResponse[SignedUrlResponse])
+async def create_download_url(request: PluginDownloadUrlRequest):
+    """
+    获取安装包的下载链接（不传版本号时为当前版本）
+
+    返回镜像节点上固定版本的 GET 下载地址，而不是上游的签名链接，安装包仍从镜像节点下载。
+    该地址不需要签名、不会失效，expires_at 只为与中心服务器的响应格式一致。安装包在此时预先拉取到本地。
+    下载次数在客户端用该地址下载时计入，这里不计入。
+    """
+    package = await MirrorService.get_package(request.name, request.version)
+    url = f"/api/plugins/{quote(package.plugin_name, safe='')}/versions/{quote(package.version, safe='')}/download"
+    expires_at = datetime.utcnow() + timedelta(seconds=settings.SIGNED_URL_EXPIRES)
+    return ApiResponse.ok(data=SignedUrlResponse(url=url, expires_at=expires_at), message="获取下载链接成功")
+
+
+@router.post("/bundle")
+async def download_bundle(request: BundleRequest, http_request: Request):
+    """批量下载多个插件（归档格式与中心服务器相同），本地没有的安装包先从上游拉取"""
+    if len(request.plugins) > settings.BUNDLE_MAX_PLUGINS:
+        raise HTTPException(status_code=400, detail=f"单次最多下载 {settings.BUNDLE_MAX_PLUGINS} 个插件")
+
+    items = list(dict.fromkeys((item.name, item.version or None) for item in request.plugins))
+    results = await asyncio.gather(
+        *(MirrorService.get_package(name, version) for name, version in items), return_exceptions=True
+    )
+    missing = []
+    for (name, version), result in zip(items, results):
+        if isinstance(result, HTTPException) and result.status_code == 404:
+            missing.append(f"{name}@{version}" if version else name)
+        elif isinstance(result, BaseException):
+            raise result
+    if missing:
+        raise HTTPException(status_code=404, detail=f"插件或版本不存在: {', '.join(missing)}")
+
+    # 同一版本可能以当前版本和指定版本号各请求一次，只打包一份
+    bundle = list({(p.plugin_name, p.version): p for p in results}.values())
+    client_id = client_identity(http_request)
+    for package in bundle:
+        MirrorService.record_download(package.plugin_name, package.version, client_id)
+    return StreamingResponse(
+        iter_zip(bundle_entries(bundle), settings.FILE_CHUNK_SIZE),
+        media_type='application/zip',
+        headers={"Content-Disposition": 'attachment; filename="microdock-plugins.zip"'}
+    )
+
+
+async def read_only():
+    """写操作（上传、启用、弃用、删除）不在镜像节点上提供"""
+    raise HTTPException(status_code=403, detail="镜像节点只读，请在上游服务器上操作")
+
+
+for _path in WRITE_PATHS:
+    router.add_api_route(_path, read_only, methods=["POST"], include_in_schema=False)
+
+
+# ==================== 可缓存的 GET 读接口 ====================
+# 与中心服务器相同，路径参数路由放在最后
+
+@router.get("/{name}")
+async def get_plugin_cacheable(name: str, http_request: Request):
+    """获取插件详情（包含版本列表）"""
+    return _json(await MirrorService.get_plugin(name), http_request)
+
+
+@router.get("/{name}/download")
+async def download_plugin_cacheable(name: str, http_request: Request):
+    """下载插件当前版本"""
+    return await _download(http_request, name, cache_control=_view_cache_control())
+
+
+@router.get("/{name}/versions")
+async def get_plugin_versions_cacheable(name: str, http_request: Request):
+    """获取插件的所有版本列表"""
+    return _json(await MirrorService.get_versions(name), http_request)
+
+
+@router.get("/{name}/versions/{version}")
+async def get_version_detail_cacheable(name: str, version: str, http_request: Request):
+    """获取指定版本详情"""
+    return _json(await MirrorService.get_version(name, version), http_request)
+
+
+@router.get("/{name}/versions/{version}/download")
+async def download_version_cacheable(name: str, version: str, http_request: Request):
+    """下载指定版本"""
+    return await _download(
+        http_request, name, version,
+        cache_control=public_cache_control(IMMUTABLE_MAX_AGE, immutable=True),
+    )
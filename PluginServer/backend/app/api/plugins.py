@@ -1,41 +1,177 @@
 """
 插件管理 API 路由
 """
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from fastapi.responses import FileResponse
+import asyncio
+import json
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Header, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from pathlib import Path
+from urllib.parse import quote
 
-from app.database import get_db
+from app.config import settings
+from app.database import get_db, AsyncSessionLocal
+from app.schemas.change import ChangeResponse, ChangeFeedResponse, SyncRequest, SyncResponse
 from app.schemas.plugin import PluginResponse, PluginDetailResponse
 from app.schemas.version import VersionResponse, VersionDetailResponse
-from app.schemas.common import ApiResponse, PluginNameRequest, PluginVersionRequest
+from app.schemas.common import (
+    ApiResponse, PluginNameRequest, PluginVersionRequest, PluginDownloadUrlRequest, SignedUrlResponse,
+    BundleRequest,
+)
+from app.services.change_service import ChangeService, change_notifier
+from app.services.package_service import PackageService, PackageInfo
 from app.services.plugin_service import PluginService
+from app.services.sync_service import SyncService
 from app.services.version_service import VersionService
 from app.utils.auth import require_admin, TokenData
+from app.utils.client import client_identity, is_mirror_request
+from app.utils.signed_url import PACKAGES, create_signed_url
+from app.utils.zip_stream import iter_zip, bundle_entries
+from app.utils.http_cache import (
+    IMMUTABLE_MAX_AGE, make_etag, public_cache_control, etag_matches,
+    cache_headers, not_modified, cacheable_json,
+)
 
 router = APIRouter(prefix="/api/plugins", tags=["plugins"])
 
 
+def _view_cache_control() -> str:
+    """可变视图（列表、详情、版本列表）的 Cache-Control"""
+    return public_cache_control(settings.HTTP_CACHE_MAX_AGE)
+
+
 @router.get("/list", response_model=ApiResponse[List[PluginResponse]])
-async def get_plugins(db: AsyncSession = Depends(get_db)):
-    """获取所有插件列表"""
-    plugins = await PluginService.get_all_plugins(db)
-    return ApiResponse.ok(data=plugins, message="获取插件列表成功")
+async def get_plugins(http_request: Request):
+    """获取所有插件列表（支持 If-None-Match 条件请求）"""
+    plugins = await PluginService.get_catalog()
+    return cacheable_json(
+        http_request,
+        ApiResponse[List[PluginResponse]].ok(data=plugins, message="获取插件列表成功"),
+        _view_cache_control(),
+    )
+
+
+async def _read_changes(since: Optional[int]) -> ChangeFeedResponse:
+    """
+    读取 since 之后的一页变更
+    
+    每次查询使用独立的短会话，长时间等待期间不占用数据库连接。
+    since 为空时只返回当前最新序号，供客户端初始化游标。
+    """
+    async with AsyncSessionLocal() as db:
+        first_seq, last_seq = await ChangeService.get_seq_range(db)
+        if since is None:
+            return ChangeFeedResponse(changes=[], last_seq=last_seq)
+        
+        # since 之后的记录已被清理，或游标超出当前日志（数据库被重建），客户端需要全量刷新
+        if first_seq > since + 1 or since > last_seq:
+            return ChangeFeedResponse(changes=[], last_seq=last_seq, reset=True)
+        
+        changes = await ChangeService.get_changes_since(db, since, settings.CHANGE_FEED_PAGE_SIZE)
+    return ChangeFeedResponse(
+        changes=[ChangeResponse.model_validate(change) for change in changes],
+        last_seq=changes[-1].seq if changes else since,
+    )
+
+
+@router.get("/changes", response_model=ApiResponse[ChangeFeedResponse])
+async def get_changes(
+    since: Optional[int] = Query(None, ge=0, description="上次收到的最大序号，不传则返回当前最新序号"),
+    timeout: float = Query(30.0, ge=0, description="没有新变更时的最长等待时间（秒），0 表示立即返回"),
+):
+    """
+    长轮询获取插件变更
+    
+    有新变更时立即返回；否则挂起直到有变更或超时。客户端用返回的 last_seq 作为下次的 since。
+    """
+    timeout = min(timeout, settings.CHANGE_FEED_MAX_TIMEOUT)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        # 先取事件再查询，查询之后发生的变更也能唤醒等待
+        event = change_notifier.current()
+        feed = await _read_changes(since)
+        remaining = deadline - loop.time()
+        if feed.changes or feed.reset or since is None or remaining <= 0:
+            return ApiResponse.ok(data=feed, message="获取变更成功")
+        await change_notifier.wait(event, min(remaining, settings.CHANGE_FEED_POLL_INTERVAL))
+
+
+@router.get("/changes/stream")
+async def stream_changes(
+    since: Optional[int] = Query(None, ge=0, description="上次收到的最大序号，不传则从当前最新序号开始"),
+    last_event_id: Optional[str] = Header(None, description="断线重连时浏览器自动携带的最后事件 ID"),
+):
+    """
+    通过 Server-Sent Events 订阅插件变更
+    
+    每条变更作为一个 change 事件推送，事件 ID 为序号，断线重连时从 Last-Event-ID 继续。
+    记录被清理导致无法续传时推送 reset 事件，客户端应全量刷新。
+    """
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    
+    async def event_stream():
+        cursor = since
+        if cursor is None:
+            cursor = (await _read_changes(None)).last_seq
+        # 告知客户端重连间隔（毫秒）
+        yield "retry: 3000\n\n"
+        
+        loop = asyncio.get_running_loop()
+        last_sent = loop.time()
+        while True:
+            event = change_notifier.current()
+            feed = await _read_changes(cursor)
+            if feed.reset:
+                cursor = feed.last_seq
+                yield f"id: {cursor}\nevent: reset\ndata: {json.dumps({'last_seq': cursor})}\n\n"
+                last_sent = loop.time()
+                continue
+            for change in feed.changes:
+                yield f"id: {change.seq}\nevent: change\ndata: {change.model_dump_json()}\n\n"
+            if feed.changes:
+                cursor = feed.last_seq
+                last_sent = loop.time()
+                continue
+            
+            heartbeat_in = settings.CHANGE_FEED_HEARTBEAT - (loop.time() - last_sent)
+            if heartbeat_in <= 0:
+                yield ": keepalive\n\n"
+                last_sent = loop.time()
+                continue
+            await change_notifier.wait(event, min(heartbeat_in, settings.CHANGE_FEED_POLL_INTERVAL))
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # 禁止 nginx 缓冲，保证事件即时送达
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@router.post("/sync", response_model=ApiResponse[SyncResponse])
+async def sync_plugins(request: SyncRequest, db: AsyncSession = Depends(get_db)):
+    """
+    增量同步插件目录
+    
+    返回游标之后变更的插件、版本和已删除插件，客户端保存返回的 next_cursor 作为下次的 cursor。
+    """
+    delta = await SyncService.get_delta(db, request.cursor)
+    return ApiResponse.ok(data=delta, message="同步成功")
 
 
 @router.post("/detail", response_model=ApiResponse[PluginDetailResponse])
-async def get_plugin(request: PluginNameRequest, db: AsyncSession = Depends(get_db)):
+async def get_plugin(request: PluginNameRequest):
     """获取插件详情（包含版本列表）"""
-    plugin = await PluginService.get_plugin_by_name(db, request.name)
+    plugin = await PluginService.get_plugin_detail(request.name)
     if not plugin:
         raise HTTPException(status_code=404, detail="插件不存在")
     
-    # 加载版本列表
-    versions = await VersionService.get_versions_by_plugin_name(db, request.name)
-    plugin.versions = versions
-    
     return ApiResponse.ok(data=plugin, message="获取插件详情成功")
 
 
@@ -95,39 +231,148 @@ async def delete_plugin(
     return ApiResponse.ok(message="插件已删除")
 
 
+async def _package_response(package: PackageInfo, headers: Optional[dict] = None):
+    """
+    构造安装包下载响应
+    
+    小安装包从内存缓存发送，不访问磁盘；超过缓存上限的安装包直接发送文件。
+    """
+    content = await PackageService.read_content(package)
+    if content is None:
+        file_path = Path(package.file_path)
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail="文件不存在")
+        return FileResponse(
+            path=file_path,
+            filename=package.file_name,
+            media_type='application/zip',
+            headers=headers
+        )
+    
+    quoted_name = quote(package.file_name)
+    if quoted_name != package.file_name:
+        disposition = f"attachment; filename*=utf-8''{quoted_name}"
+    else:
+        disposition = f'attachment; filename="{package.file_name}"'
+    return Response(
+        content=content,
+        media_type='application/zip',
+        headers={**(headers or {}), "Content-Disposition": disposition}
+    )
+
+
+async def _download(
+    db: AsyncSession,
+    http_request: Request,
+    name: str,
+    version: Optional[str] = None,
+    cache_control: Optional[str] = None
+):
+    """
+    下载插件的指定版本（为空时为当前版本）并增加下载次数
+    
+    cache_control 不为空时（GET 接口）响应带文件哈希作为 ETag，If-None-Match 匹配时返回 304，不计下载次数。
+    """
+    package = await PackageService.get_package(db, name, version)
+    if not package:
+        detail = f"插件 '{name}' 的版本 '{version}' 不存在" if version else "插件或版本不存在"
+        raise HTTPException(status_code=404, detail=detail)
+    
+    headers = None
+    if cache_control:
+        etag = make_etag(package.file_hash)
+        if etag_matches(http_request, etag):
+            return not_modified(etag, cache_control)
+        headers = cache_headers(etag, cache_control)
+    
+    response = await _package_response(package, headers)
+    
+    # 增加下载次数（镜像节点回源的下载由镜像节点另行上报）
+    if not is_mirror_request(http_request):
+        await VersionService.increment_download_count(
+            db, name, package.version, client_identity(http_request)
+        )
+    
+    return response
+
+
 @router.post("/download")
-async def download_plugin(request: PluginNameRequest, db: AsyncSession = Depends(get_db)):
+async def download_plugin(
+    request: PluginNameRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db)
+):
     """下载插件当前版本"""
-    plugin = await PluginService.get_plugin_by_name(db, request.name)
-    if not plugin or not plugin.current_version:
+    return await _download(db, http_request, request.name)
+
+
+@router.post("/download-url", response_model=ApiResponse[SignedUrlResponse])
+async def create_download_url(
+    request: PluginDownloadUrlRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    获取安装包的签名下载链接（不传版本号时为当前版本）
+    
+    链接有效期为 SIGNED_URL_EXPIRES 秒，下载时只校验签名，不访问数据库。下载次数在获取链接时计入。
+    """
+    package = await PackageService.get_package(db, request.name, request.version)
+    if not package:
         raise HTTPException(status_code=404, detail="插件或版本不存在")
     
-    version = await VersionService.get_version(db, request.name, plugin.current_version)
-    if not version:
-        raise HTTPException(status_code=404, detail="版本不存在")
+    url, expires_at = create_signed_url(PACKAGES, package.file_path, {"name": package.file_name})
+    await VersionService.increment_download_count(
+        db, request.name, package.version, client_identity(http_request)
+    )
+    return ApiResponse.ok(data=SignedUrlResponse(url=url, expires_at=expires_at), message="获取下载链接成功")
+
+
+@router.post("/bundle")
+async def download_bundle(
+    request: BundleRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    批量下载多个插件（不传版本号时为当前版本），返回一个 ZIP 归档
     
-    file_path = Path(version.file_path)
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="文件不存在")
+    归档内先是 manifest.json（各插件的版本号、文件名、大小和 SHA256），然后是各插件的安装包，
+    安装包按原样存储、不重新压缩。归档边读取边发送，不生成临时文件。
+    """
+    if len(request.plugins) > settings.BUNDLE_MAX_PLUGINS:
+        raise HTTPException(status_code=400, detail=f"单次最多下载 {settings.BUNDLE_MAX_PLUGINS} 个插件")
     
-    # 增加下载次数
-    await VersionService.increment_download_count(db, request.name, plugin.current_version)
+    items = list(dict.fromkeys((item.name, item.version or None) for item in request.plugins))
+    packages = await PackageService.get_packages(db, items)
+    missing = [f"{name}@{version}" if version else name for name, version in items if (name, version) not in packages]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"插件或版本不存在: {', '.join(missing)}")
     
-    return FileResponse(
-        path=file_path,
-        filename=version.file_name,
-        media_type='application/zip'
+    # 同一版本可能以当前版本和指定版本号各请求一次，只打包一份
+    bundle = list({(p.plugin_name, p.version): p for p in (packages[item] for item in items)}.values())
+    for package in bundle:
+        if not Path(package.file_path).exists():
+            raise HTTPException(status_code=404, detail=f"文件不存在: {package.file_name}")
+    
+    await VersionService.increment_download_counts(
+        db, [(package.plugin_name, package.version) for package in bundle], client_identity(http_request)
+    )
+    
+    return StreamingResponse(
+        iter_zip(bundle_entries(bundle), settings.FILE_CHUNK_SIZE),
+        media_type='application/zip',
+        headers={"Content-Disposition": 'attachment; filename="microdock-plugins.zip"'}
     )
 
 
 @router.post("/versions", response_model=ApiResponse[List[VersionResponse]])
-async def get_plugin_versions(request: PluginNameRequest, db: AsyncSession = Depends(get_db)):
+async def get_plugin_versions(request: PluginNameRequest):
     """获取插件的所有版本列表"""
-    plugin = await PluginService.get_plugin_by_name(db, request.name)
-    if not plugin:
+    versions = await PluginService.get_plugin_versions(request.name)
+    if versions is None:
         raise HTTPException(status_code=404, detail=f"插件 '{request.name}' 不存在")
     
-    versions = await VersionService.get_versions_by_plugin_name(db, request.name)
     return ApiResponse.ok(data=versions, message="获取版本列表成功")
 
 
@@ -155,24 +400,78 @@ async def deprecate_version(
 
 
 @router.post("/version/download")
-async def download_version(request: PluginVersionRequest, db: AsyncSession = Depends(get_db)):
+async def download_version(
+    request: PluginVersionRequest,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db)
+):
     """下载指定版本"""
-    version = await VersionService.get_version(db, request.name, request.version)
-    if not version:
-        raise HTTPException(
-            status_code=404, 
-            detail=f"插件 '{request.name}' 的版本 '{request.version}' 不存在"
-        )
-    
-    file_path = Path(version.file_path)
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="文件不存在")
-    
-    # 增加下载次数
-    await VersionService.increment_download_count(db, request.name, request.version)
-    
-    return FileResponse(
-        path=file_path,
-        filename=version.file_name,
-        media_type='application/zip'
+    return await _download(db, http_request, request.name, request.version)
+
+
+# ==================== 可缓存的 GET 读接口 ====================
+# 与上面的 POST 接口返回相同的数据，参数放在路径中，响应带 ETag 和 Cache-Control，
+# 浏览器、nginx 或 CDN 可以直接缓存。路径参数路由放在最后，避免遮挡 /list、/changes 等固定路径。
+
+@router.get("/{name}", response_model=ApiResponse[PluginDetailResponse])
+async def get_plugin_cacheable(name: str, http_request: Request):
+    """获取插件详情（包含版本列表）"""
+    plugin = await PluginService.get_plugin_detail(name)
+    if not plugin:
+        raise HTTPException(status_code=404, detail="插件不存在")
+    return cacheable_json(
+        http_request,
+        ApiResponse[PluginDetailResponse].ok(data=plugin, message="获取插件详情成功"),
+        _view_cache_control(),
+    )
+
+
+@router.get("/{name}/download")
+async def download_plugin_cacheable(name: str, http_request: Request, db: AsyncSession = Depends(get_db)):
+    """下载插件当前版本（当前版本会变化，只短时间缓存）"""
+    return await _download(db, http_request, name, cache_control=_view_cache_control())
+
+
+@router.get("/{name}/versions", response_model=ApiResponse[List[VersionResponse]])
+async def get_plugin_versions_cacheable(name: str, http_request: Request):
+    """获取插件的所有版本列表"""
+    versions = await PluginService.get_plugin_versions(name)
+    if versions is None:
+        raise HTTPException(status_code=404, detail=f"插件 '{name}' 不存在")
+    return cacheable_json(
+        http_request,
+        ApiResponse[List[VersionResponse]].ok(data=versions, message="获取版本列表成功"),
+        _view_cache_control(),
+    )
+
+
+@router.get("/{name}/versions/{version}", response_model=ApiResponse[VersionDetailResponse])
+async def get_version_detail_cacheable(
+    name: str,
+    version: str,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """获取指定版本详情（下载次数和过时标记会变化，只短时间缓存）"""
+    detail = await VersionService.get_version(db, name, version)
+    if not detail:
+        raise HTTPException(status_code=404, detail=f"插件 '{name}' 的版本 '{version}' 不存在")
+    return cacheable_json(
+        http_request,
+        ApiResponse[VersionDetailResponse].ok(data=detail, message="获取版本详情成功"),
+        _view_cache_control(),
+    )
+
+
+@router.get("/{name}/versions/{version}/download")
+async def download_version_cacheable(
+    name: str,
+    version: str,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """下载指定版本（同一 plugin@version 的内容不会改变，可以长期缓存）"""
+    return await _download(
+        db, http_request, name, version,
+        cache_control=public_cache_control(IMMUTABLE_MAX_AGE, immutable=True),
     )
@@ -0,0 +1,85 @@
+"""
+下载统计 API 路由
+"""
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_db
+from app.models.plugin import Plugin
+from app.schemas.common import ApiResponse
+from app.schemas.stats import (
+    TopPluginsRequest, PluginDownloads,
+    DownloadTrendRequest, DownloadTrendPoint,
+    VersionShareRequest, VersionShare,
+    UniqueDownloadsRequest, UniqueDownloads,
+    MirrorDownloadReport, MirrorDownloadResult,
+)
+from app.services.download_stats import DownloadStatsService
+from app.services.plugin_service import PluginService
+from app.services.version_service import VersionService
+from app.utils.client import is_mirror_request
+
+router = APIRouter(prefix="/api/stats", tags=["stats"])
+
+
+async def _ensure_plugin(db: AsyncSession, name: str) -> Plugin:
+    plugin = await PluginService.get_plugin_by_name(db, name)
+    if not plugin:
+        raise HTTPException(status_code=404, detail=f"插件 '{name}' 不存在")
+    return plugin
+
+
+@router.post("/top", response_model=ApiResponse[List[PluginDownloads]])
+async def get_top_plugins(request: TopPluginsRequest, db: AsyncSession = Depends(get_db)):
+    """获取最近 N 天下载次数最多的插件"""
+    plugins = await DownloadStatsService.get_top_plugins(db, request.days, request.limit)
+    return ApiResponse.ok(data=plugins, message="获取热门插件成功")
+
+
+@router.post("/trend", response_model=ApiResponse[List[DownloadTrendPoint]])
+async def get_download_trend(request: DownloadTrendRequest, db: AsyncSession = Depends(get_db)):
+    """获取插件按小时 / 天 / 月的下载趋势"""
+    await _ensure_plugin(db, request.name)
+    points = await DownloadStatsService.get_trend(db, request.name, request.granularity, request.periods)
+    return ApiResponse.ok(data=points, message="获取下载趋势成功")
+
+
+@router.post("/versions", response_model=ApiResponse[List[VersionShare]])
+async def get_version_share(request: VersionShareRequest, db: AsyncSession = Depends(get_db)):
+    """获取插件最近 N 天各版本的下载次数和占比"""
+    await _ensure_plugin(db, request.name)
+    shares = await DownloadStatsService.get_version_share(db, request.name, request.days)
+    return ApiResponse.ok(data=shares, message="获取版本下载占比成功")
+
+
+@router.post("/unique", response_model=ApiResponse[UniqueDownloads])
+async def get_unique_downloads(request: UniqueDownloadsRequest, db: AsyncSession = Depends(get_db)):
+    """获取插件的独立下载者估计（累计和最近 N 个月）"""
+    plugin = await _ensure_plugin(db, request.name)
+    unique = await DownloadStatsService.get_unique_downloads(db, request.name, request.months)
+    return ApiResponse.ok(
+        data={"name": plugin.name, "total_downloads": plugin.total_download_count, **unique},
+        message="获取独立下载者估计成功",
+    )
+
+
+@router.post("/mirror-downloads", response_model=ApiResponse[MirrorDownloadResult])
+async def report_mirror_downloads(
+    request: MirrorDownloadReport,
+    http_request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    镜像节点批量上报本地发送的下载次数
+
+    请求头 X-Mirror-Token 需要与 MIRROR_REPORT_TOKEN 一致。计入版本和插件的下载次数、分时统计和独立下载者估计。
+    """
+    if not is_mirror_request(http_request):
+        raise HTTPException(status_code=403, detail="镜像节点密钥无效或未启用下载上报")
+    downloads = {}
+    for item in request.downloads:
+        count, hashes = downloads.get((item.name, item.version), (0, []))
+        downloads[(item.name, item.version)] = (count + item.count, hashes + item.client_hashes)
+    counted = await VersionService.add_download_counts(db, downloads)
+    return ApiResponse.ok(data=MirrorDownloadResult(counted=counted), message="下载次数上报成功")
@@ -1,13 +1,49 @@
 """
 系统管理 API 路由
 """
-from fastapi import APIRouter
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
 from app.schemas.common import HealthResponse, ApiResponse
 from app.config import settings
+from app.services.invalidation_bus import invalidation_bus
+from app.utils.auth import require_admin, TokenData
+from app.utils.cache import cache_stats
+from app.utils.profiler import profile_for, ProfilerBusyError
+from app.utils.singleflight import singleflight_stats
+from app.utils.startup import startup_timer
 
 router = APIRouter(prefix="/api", tags=["system"])
 
 
+class ProfileRequest(BaseModel):
+    """采样分析请求"""
+    duration: float = Field(10.0, gt=0, description="采样时长（秒）")
+    mode: str = Field("wall", description="采样模式: wall | cpu")
+    interval_ms: float = Field(
+        default_factory=lambda: settings.PROFILER_INTERVAL_MS,
+        ge=1, le=1000,
+        description="采样间隔（毫秒）"
+    )
+    include_tasks: bool = Field(True, description="是否包含 asyncio 任务栈（仅 wall 模式）")
+
+
+class StartupReport(BaseModel):
+    """启动耗时报告"""
+    import_seconds: float | None = None
+    init_seconds: float | None = None
+    ready_seconds: float | None = None
+    first_request_seconds: float | None = None
+
+
+class CacheMetrics(BaseModel):
+    """当前 worker 的缓存和查询合并统计（进程启动以来的累计值）"""
+    caches: List[dict] = Field(..., description="各进程内缓存的条目数和命中次数")
+    single_flight: List[dict] = Field(..., description="查询合并: executed 实际执行次数，coalesced 合并到执行中查询的次数")
+    invalidation_bus: dict = Field(..., description="缓存失效总线的收发统计")
+
+
 @router.get("/health", response_model=ApiResponse[HealthResponse])
 async def health_check():
     """健康检查"""
@@ -17,3 +53,57 @@ async def health_check():
         database="connected"
     )
     return ApiResponse.ok(data=data, message="服务运行正常")
+
+
+@router.get("/system/startup", response_model=ApiResponse[StartupReport])
+async def startup_report():
+    """获取当前 worker 的启动耗时报告（秒，相对应用包开始导入）"""
+    return ApiResponse.ok(data=StartupReport(**startup_timer.report()), message="获取启动耗时成功")
+
+
+@router.get("/system/metrics", response_model=ApiResponse[CacheMetrics])
+async def cache_metrics():
+    """获取当前 worker 的缓存命中、查询合并和失效消息统计"""
+    data = CacheMetrics(
+        caches=cache_stats(),
+        single_flight=singleflight_stats(),
+        invalidation_bus=invalidation_bus.stats(),
+    )
+    return ApiResponse.ok(data=data, message="获取缓存统计成功")
+
+
+@router.post("/system/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    request: ProfileRequest,
+    admin: TokenData = Depends(require_admin)
+):
+    """
+    对当前 worker 进行限时采样分析（需要管理员权限）
+    
+    返回 flamegraph 兼容的折叠栈文本，可直接交给 flamegraph.pl 或 speedscope。
+    """
+    if request.duration > settings.PROFILER_MAX_DURATION:
+        raise HTTPException(
+            status_code=400,
+            detail=f"采样时长不能超过 {settings.PROFILER_MAX_DURATION} 秒"
+        )
+    
+    try:
+        profiler = await profile_for(
+            request.duration,
+            mode=request.mode,
+            interval=request.interval_ms / 1000,
+            include_tasks=request.include_tasks,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={
+            "X-Profile-Mode": request.mode,
+            "X-Profile-Samples": str(profiler.samples),
+        }
+    )
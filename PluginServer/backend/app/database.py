@@ -1,33 +1,81 @@
 """
 数据库连接和会话管理
 """
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import URL, make_url
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import declarative_base
+from sqlalchemy.orm import Session, declarative_base
 from app.config import settings
 
-# 验证 aiosqlite 是否正确安装
-try:
-    import aiosqlite
-    print(f"[DEBUG] aiosqlite version: {aiosqlite.__version__}")
-except ImportError as e:
-    print(f"[ERROR] aiosqlite not found: {e}")
-    raise
+# 未指定驱动时使用的异步驱动
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+}
 
-# 打印调试信息
-print(f"[DEBUG] DATABASE_URL: {settings.DATABASE_URL}")
 
-# 确保使用正确的异步驱动 URL
-db_url = settings.DATABASE_URL
-if db_url.startswith("sqlite:///") and not db_url.startswith("sqlite+aiosqlite:///"):
-    db_url = db_url.replace("sqlite:///", "sqlite+aiosqlite:///")
-    print(f"[DEBUG] Converted to async URL: {db_url}")
+def async_database_url(database_url: str) -> URL:
+    """
+    确保使用异步驱动的 URL
+    
+    sqlite:///... -> sqlite+aiosqlite:///...，postgres(ql)://... -> postgresql+asyncpg://...，
+    已指定驱动的 URL 保持不变。
+    """
+    url = make_url(database_url)
+    if url.drivername in _ASYNC_DRIVERS:
+        url = url.set(drivername=_ASYNC_DRIVERS[url.drivername])
+    return url
+
+
+def engine_options(url: URL) -> dict:
+    """
+    按数据库方言返回引擎参数
+    
+    SQLite 是单文件数据库，沿用 SQLAlchemy 默认的连接池；
+    PostgreSQL 使用可配置的连接池，每个 worker 进程一个池，
+    最多占用 DB_POOL_SIZE + DB_MAX_OVERFLOW 个服务端连接。
+    """
+    options = {"echo": settings.DEBUG, "future": True}
+    if url.get_backend_name() != "postgresql":
+        return options
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+    if url.get_driver_name() == "asyncpg":
+        # 预编译语句缓存：SQLAlchemy 层（prepared_statement_cache_size）和 asyncpg 层（statement_cache_size），
+        # 经 PgBouncer 等事务级连接池访问时需设为 0
+        # 会话时区固定为 UTC：不带时区的 DateTime 列由 func.now() 填充，与代码中的 datetime.utcnow() 比较，
+        # 服务器 TimeZone 不是 UTC 时两者会相差时区偏移
+        options["connect_args"] = {
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "server_settings": {"application_name": settings.APP_NAME, "timezone": "UTC"},
+        }
+    return options
+
+
+db_url = async_database_url(settings.DATABASE_URL)
 
 # 创建异步引擎
-engine = create_async_engine(
-    db_url,
-    echo=settings.DEBUG,
-    future=True
-)
+engine = create_async_engine(db_url, **engine_options(db_url))
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    """为每个新的 SQLite 连接设置日志模式和锁等待超时"""
+    if engine.dialect.name != "sqlite":
+        return
+    cursor = dbapi_connection.cursor()
+    if settings.SQLITE_JOURNAL_MODE:
+        cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    cursor.close()
+
 
 # 创建异步会话工厂
 AsyncSessionLocal = async_sessionmaker(
@@ -42,6 +90,35 @@ AsyncSessionLocal = async_sessionmaker(
 Base = declarative_base()
 
 
+def serialize_inserts(model, lock_key: int) -> None:
+    """
+    让 model 的自增序号按提交顺序分配（PostgreSQL）
+    
+    日志表的读取方按 seq > 上次位置 轮询。PostgreSQL 中序号在插入时分配，并发事务可能先拿到序号 N 却晚于 N+1 提交，
+    读取方在这期间读到 N+1 后游标越过 N，N 就永远不会被读到。
+    刷新包含 model 新记录的事务前先获取事务级咨询锁（提交或回滚时释放），持锁期间分配的序号一定按提交顺序递增。
+    会话不自动刷新，新记录在提交时才写入，持锁时间只有写入到提交之间。
+    SQLite 同一时间只有一个写事务，不需要加锁。
+    """
+    @event.listens_for(Session, "before_flush")
+    def _lock_before_insert(session, flush_context, instances):
+        if session.get_bind().dialect.name != "postgresql":
+            return
+        if any(isinstance(obj, model) for obj in session.new):
+            session.connection().execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": lock_key})
+
+
+def dialect_insert(table):
+    """
+    按当前数据库方言返回 insert 构造，支持 on_conflict_do_nothing / on_conflict_do_update
+    """
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(table)
+
+
 async def get_db() -> AsyncSession:
     """
     依赖注入函数：获取数据库会话
@@ -59,12 +136,51 @@ async def get_db() -> AsyncSession:
 
 async def init_db():
     """
-    初始化数据库（创建所有表）
+    初始化数据库（创建所有表、补充新增的列和索引、执行结构迁移）
     """
     # 导入所有模型以确保它们被注册到 Base.metadata
     from app.models.plugin import Plugin
     from app.models.version import PluginVersion
     from app.models.backup import Backup
+    from app.models.backup_usage import BackupUsage
+    from app.models.schema_migration import SchemaMigration
+    from app.models.data_migration import DataMigration
+    from app.models.download_stat import DownloadStat
+    from app.models.download_sketch import DownloadSketch
+    from app.migrations import run_migrations
+    from app.models.cache_invalidation import CacheInvalidation
+    from app.models.change import PluginChange
+    from app.models.job import Job
     
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(run_migrations)
+
+
+def _add_missing_columns(sync_conn) -> None:
+    """
+    为已有的表补充模型中新增的列和索引
+    
+    create_all 只创建不存在的表，已有表的新列需要 ALTER TABLE 补充。
+    声明了常量 server_default 的列带默认值添加（不可空时加 NOT NULL），其余新列以可空方式添加
+    （SQLite 不支持非常量默认值）。已有行的回填由 app.migrations.data 中的数据迁移在后台分批执行，
+    不在启动时长时间锁表。
+    """
+    inspector = inspect(sync_conn)
+    ddl_compiler = sync_conn.dialect.ddl_compiler(sync_conn.dialect, None)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_spec = column.type.compile(dialect=sync_conn.dialect)
+            default = ddl_compiler.get_column_default_string(column)
+            if default is not None:
+                column_spec += f" DEFAULT {default}"
+                if not column.nullable:
+                    column_spec += " NOT NULL"
+            sync_conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_spec}'))
+            print(f"✓ 已为表 {table.name} 添加列 {column.name}")
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
@@ -0,0 +1,3 @@
+"""
+静态目录导出（python -m app.export），导出逻辑见 app.services.export_service
+"""
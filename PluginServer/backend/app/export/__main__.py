@@ -0,0 +1,67 @@
+"""
+静态目录导出命令行
+
+用法（在 backend 目录下）:
+    python -m app.export /srv/microdock              # 增量导出（首次运行时为全量导出）
+    python -m app.export /srv/microdock --full       # 重新生成所有插件（同时刷新下载次数）
+    python -m app.export /srv/microdock --watch 30   # 每 30 秒增量导出一次，上传后自动更新
+
+导出目录需要与 UPLOAD_DIR 位于同一文件系统，安装包才能使用硬链接；否则会复制文件。
+nginx 配置示例见 frontend/nginx.static.conf。
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+from app.config import settings
+from app.database import engine, init_db
+from app.services.export_service import StaticExportService
+
+
+async def export_once(dest: Path, full: bool) -> None:
+    report = await StaticExportService.export(dest, full=full)
+    mode = "全量" if report["full"] else "增量"
+    print(
+        f"✓ {mode}导出完成（序号 {report['last_seq']}）: "
+        f"导出 {report['plugins_exported']} 个插件，删除 {report['plugins_removed']} 个，"
+        f"写入 {report['files_written']} 个文件，链接 {report['blobs_linked']} 个安装包"
+        + (f"，复制 {report['blobs_copied']} 个安装包" if report["blobs_copied"] else "")
+    )
+
+
+async def run(args) -> int:
+    dest = Path(args.dest)
+    settings.ensure_directories()
+    try:
+        await init_db()
+        await export_once(dest, args.full)
+        while args.watch:
+            await asyncio.sleep(args.watch)
+            try:
+                await export_once(dest, False)
+            except Exception as e:
+                # 持续运行时单次失败（例如数据库暂时不可用）不退出，下次重试
+                print(f"❌ 导出失败: {e}")
+        return 0
+    finally:
+        await engine.dispose()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.export", description="导出静态插件目录")
+    parser.add_argument("dest", help="导出目录")
+    parser.add_argument("--full", action="store_true", help="忽略上次的导出状态，重新生成所有插件")
+    parser.add_argument("--watch", type=float, default=0, help="持续运行，每隔指定秒数增量导出一次")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    try:
+        return asyncio.run(run(parse_args(argv)))
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,19 +9,57 @@ from contextlib import asynccontextmanager
 
 from app.config import settings
 from app.database import init_db
-from app.api import plugins, system, backups, auth
+from app.api import plugins, system, backups, auth, jobs, stats, blobs
+from app.services.invalidation_bus import invalidation_bus
+from app.services.backup_service import BackupService
+from app.services.download_stats import download_stats
+from app.services.job_service import job_queue
+from app.services.jobs import enqueue_pending_data_migrations
+from app.database import AsyncSessionLocal
+from app.utils.profiler import ProfileMiddleware
+from app.utils.startup import startup_timer, StartupTimingMiddleware
+from app.utils.upload_quota import BackupQuotaMiddleware
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    # 启动时：初始化数据库
+    # 启动时：创建数据目录并初始化数据库
+    settings.ensure_directories()
     await init_db()
     print("✓ 数据库已初始化")
     
+    async with AsyncSessionLocal() as db:
+        await BackupService.ensure_usage(db)
+    
+    await invalidation_bus.start()
+    print(f"✓ 缓存失效总线已启动: {invalidation_bus.transport.name}")
+    
+    await job_queue.start(settings.JOB_WORKERS)
+    await download_stats.start()
+    
+    if settings.MIRROR_UPSTREAM:
+        # 延迟导入：只有镜像节点才需要 httpx
+        from app.services.mirror_service import MirrorService
+        await MirrorService.start()
+        print(f"✓ 镜像节点模式，上游服务器: {settings.MIRROR_UPSTREAM}")
+    
+    # 未完成的数据迁移交给后台任务分批执行
+    if settings.DATA_MIGRATIONS_ON_STARTUP:
+        await enqueue_pending_data_migrations()
+    
+    startup_timer.mark("ready")
+    report = startup_timer.report()
+    print(f"✓ 启动完成: 导入 {report['import_seconds']}s, 初始化 {report['init_seconds']}s")
+    
     yield
     
-    # 关闭时：清理资源
+    # 关闭时：清理资源（先写入缓冲区中的下载统计）
+    await download_stats.stop()
+    if settings.MIRROR_UPSTREAM:
+        await MirrorService.stop()
+    await job_queue.stop()
+    await invalidation_bus.stop()
     print("应用关闭")
 
 
@@ -98,6 +136,9 @@ async def general_exception_handler(request: Request, exc: Exception):
 
 # ==================== 中间件配置 ====================
 
+# 备份上传配额预检（位于 CORS 内层，拒绝响应同样带有跨域头）
+app.add_middleware(BackupQuotaMiddleware)
+
 # 配置 CORS
 app.add_middleware(
     CORSMiddleware,
@@ -107,11 +148,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 按请求采样分析（仅管理员携带 X-Profile 请求头时生效）
+app.add_middleware(ProfileMiddleware)
+
+# 记录首个请求的完成时间（冷启动统计）
+app.add_middleware(StartupTimingMiddleware)
+
 # 注册路由
-app.include_router(auth.router)
-app.include_router(plugins.router)
-app.include_router(backups.router)
-app.include_router(system.router)
+if settings.MIRROR_UPSTREAM:
+    # 镜像节点只提供插件读接口和系统接口，其余功能（认证、备份、统计等）由上游服务器提供
+    from app.api import mirror
+    app.include_router(mirror.router)
+    app.include_router(system.router)
+else:
+    app.include_router(auth.router)
+    app.include_router(plugins.router)
+    app.include_router(backups.router)
+    app.include_router(system.router)
+    app.include_router(jobs.router)
+    app.include_router(stats.router)
+    app.include_router(blobs.router)
 
 
 @app.get("/")
@@ -125,6 +181,10 @@ async def root():
     }
 
 
+# 应用模块导入完成
+startup_timer.mark("imported")
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
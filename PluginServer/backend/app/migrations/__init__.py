@@ -0,0 +1,21 @@
+"""
+数据库迁移
+
+init_db 依次执行:
+1. Base.metadata.create_all  创建不存在的表（新数据库直接得到最新结构和索引）
+2. _add_missing_columns       为已有的表补充模型中新增的列和索引
+3. run_migrations             执行 schema.py 中尚未执行的迁移，并记录到 schema_migrations 表
+
+新数据库也会从第一个迁移开始执行，因此迁移必须是幂等的（DROP ... IF EXISTS 等）。
+
+需要改写大量已有数据的操作放在 data.py 中，作为分批数据迁移在后台执行，不阻塞启动。
+命令行: python -m app.migrations status | upgrade | backfill
+"""
+from app.migrations.runner import MIGRATIONS, Migration, migration, applied_versions, run_migrations
+from app.migrations import schema  # noqa: F401  注册迁移
+from app.migrations.data import DATA_MIGRATIONS, data_migration, run_data_migration, pending_migrations
+
+__all__ = [
+    "MIGRATIONS", "Migration", "migration", "applied_versions", "run_migrations",
+    "DATA_MIGRATIONS", "data_migration", "run_data_migration", "pending_migrations",
+]
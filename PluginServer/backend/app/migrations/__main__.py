@@ -0,0 +1,86 @@
+"""
+数据库迁移命令行
+
+用法（在 backend 目录下）:
+    python -m app.migrations status                 # 查看结构迁移和数据迁移进度
+    python -m app.migrations upgrade                # 执行结构迁移（与启动时相同）
+    python -m app.migrations backfill               # 在前台执行所有未完成的数据迁移
+    python -m app.migrations backfill --name backups_stored_size --batch-size 5000 --pause 0
+"""
+import argparse
+import asyncio
+import sys
+
+from app.config import settings
+from app.database import AsyncSessionLocal, engine, init_db
+from app.migrations.data import DATA_MIGRATIONS, get_states, pending_migrations, run_data_migration
+from app.migrations.runner import MIGRATIONS, applied_versions
+
+
+async def show_status() -> None:
+    async with engine.connect() as conn:
+        applied = set(await conn.run_sync(applied_versions))
+    print("结构迁移:")
+    for version in sorted(MIGRATIONS):
+        mark = "✓" if version in applied else " "
+        print(f"  [{mark}] {version}: {MIGRATIONS[version].description}")
+
+    async with AsyncSessionLocal() as db:
+        states = await get_states(db)
+    print("数据迁移:")
+    for name, spec in DATA_MIGRATIONS.items():
+        state = states.get(name)
+        if state is None:
+            progress = "未开始"
+        elif state.finished_at is not None:
+            progress = f"已完成 {state.finished_at:%Y-%m-%d %H:%M:%S}（{state.rows_done} 行）"
+        else:
+            progress = f"进行中（{state.batches} 批，{state.rows_done} 行）"
+        print(f"  {name}: {spec.description} - {progress}")
+
+
+async def backfill(name, batch_size, pause) -> int:
+    names = [name] if name else await pending_migrations()
+    for item in names:
+        if item not in DATA_MIGRATIONS:
+            print(f"❌ 未知的数据迁移: {item}")
+            return 1
+        print(f"执行数据迁移: {item}")
+        await run_data_migration(item, batch_size=batch_size, pause=pause)
+    if not names:
+        print("没有未完成的数据迁移")
+    return 0
+
+
+async def run(args) -> int:
+    settings.ensure_directories()
+    try:
+        # 所有命令都先确保结构是最新的（status 需要进度表存在）
+        await init_db()
+        if args.command == "status":
+            await show_status()
+        elif args.command == "backfill":
+            return await backfill(args.name, args.batch_size, args.pause)
+        return 0
+    finally:
+        await engine.dispose()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.migrations", description="数据库迁移")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="查看迁移状态")
+    subparsers.add_parser("upgrade", help="执行结构迁移")
+    backfill_parser = subparsers.add_parser("backfill", help="在前台执行数据迁移")
+    backfill_parser.add_argument("--name", default=None, help="只执行指定的数据迁移")
+    backfill_parser.add_argument("--batch-size", type=int, default=None, help="每批行数")
+    backfill_parser.add_argument("--pause", type=float, default=None, help="批间暂停（秒）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    return asyncio.run(run(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
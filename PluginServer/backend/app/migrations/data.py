@@ -0,0 +1,200 @@
+"""
+分批数据迁移
+
+回填新列、重算冗余字段等需要改写整张表的操作不能在启动时一次性执行：
+大表上的单条 UPDATE 会长时间持有写锁（SQLite 只有一个写者），期间所有写请求都会等待。
+
+数据迁移按主键游标分批执行，每批一个短事务，批与批之间暂停 DATA_MIGRATION_BATCH_PAUSE 秒，
+进度（游标）和该批的数据修改一起提交，中断后从游标处继续。执行方式:
+- 服务运行时：启动后入队 data_migration 后台任务，每个任务执行 DATA_MIGRATION_SLICE 秒后
+  保存进度并入队下一个任务，不会超过任务锁超时
+- 维护窗口：python -m app.migrations backfill 在前台一次执行完
+
+每批处理函数签名: async (db, cursor, batch_size) -> (下一批游标, 本批修改行数)，
+返回的游标为 None 表示已全部完成。处理函数不提交事务，必须是幂等的（同一批可能被重复执行）。
+"""
+import asyncio
+import json
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import select, update, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import AsyncSessionLocal, dialect_insert
+from app.models.backup import Backup
+from app.models.data_migration import DataMigration
+from app.models.version import PluginVersion
+from app.services.version_service import VersionService
+
+BatchHandler = Callable[[AsyncSession, Optional[str], int], Awaitable[Tuple[Optional[str], int]]]
+
+
+@dataclass
+class DataMigrationSpec:
+    """一个数据迁移"""
+    name: str
+    description: str
+    run_batch: BatchHandler
+
+
+# 名称 -> 数据迁移（按注册顺序执行）
+DATA_MIGRATIONS: Dict[str, DataMigrationSpec] = {}
+
+
+def data_migration(name: str, description: str):
+    """注册数据迁移的装饰器"""
+    def decorator(func: BatchHandler) -> BatchHandler:
+        if name in DATA_MIGRATIONS:
+            raise ValueError(f"数据迁移名称重复: {name}")
+        DATA_MIGRATIONS[name] = DataMigrationSpec(name, description, func)
+        return func
+    return decorator
+
+
+async def get_states(db: AsyncSession) -> Dict[str, DataMigration]:
+    """所有已开始的数据迁移的进度"""
+    result = await db.execute(select(DataMigration))
+    return {state.name: state for state in result.scalars().all()}
+
+
+async def pending_migrations() -> List[str]:
+    """尚未完成的数据迁移名称"""
+    async with AsyncSessionLocal() as db:
+        states = await get_states(db)
+    return [
+        name for name in DATA_MIGRATIONS
+        if name not in states or states[name].finished_at is None
+    ]
+
+
+async def _load_state(db: AsyncSession, name: str) -> DataMigration:
+    await db.execute(
+        dialect_insert(DataMigration)
+        .values(name=name, batches=0, rows_done=0)
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    result = await db.execute(select(DataMigration).where(DataMigration.name == name))
+    return result.scalar_one()
+
+
+async def run_data_migration(
+    name: str,
+    batch_size: Optional[int] = None,
+    pause: Optional[float] = None,
+    time_limit: Optional[float] = None
+) -> bool:
+    """
+    分批执行一个数据迁移
+
+    Args:
+        name: 数据迁移名称
+        batch_size: 每批行数，默认 DATA_MIGRATION_BATCH_SIZE
+        pause: 批间暂停（秒），默认 DATA_MIGRATION_BATCH_PAUSE
+        time_limit: 最长执行时间（秒），到时保存进度后返回，为空表示执行到完成
+
+    Returns:
+        bool: 是否已全部完成
+    """
+    spec = DATA_MIGRATIONS[name]
+    batch_size = batch_size or settings.DATA_MIGRATION_BATCH_SIZE
+    pause = settings.DATA_MIGRATION_BATCH_PAUSE if pause is None else pause
+    deadline = time.monotonic() + time_limit if time_limit else None
+
+    while True:
+        async with AsyncSessionLocal() as db:
+            state = await _load_state(db, name)
+            if state.finished_at is not None:
+                await db.commit()
+                return True
+
+            next_cursor, rows = await spec.run_batch(db, state.cursor, batch_size)
+            batches = state.batches + 1
+            rows_done = state.rows_done + rows
+            now = datetime.utcnow()
+            # 游标和本批的数据修改在同一事务中提交
+            await db.execute(
+                update(DataMigration)
+                .where(DataMigration.name == name)
+                .values(
+                    cursor=next_cursor,
+                    batches=DataMigration.batches + 1,
+                    rows_done=DataMigration.rows_done + rows,
+                    updated_at=now,
+                    finished_at=now if next_cursor is None else None,
+                )
+            )
+            await db.commit()
+
+        if next_cursor is None:
+            print(f"✓ 数据迁移完成: {name}（{batches} 批，修改 {rows_done} 行）")
+            return True
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(pause)
+
+
+# ==================== 数据迁移 ====================
+
+
+def _batch_result(keys: list, rows: int, batch_size: int, cursor: str) -> Tuple[Optional[str], int]:
+    """不足一批说明已到表尾"""
+    return (cursor if len(keys) == batch_size else None), rows
+
+
+@data_migration("backups_stored_size", "按 file_size 回填 backups.stored_size")
+async def backfill_backup_stored_size(
+    db: AsyncSession,
+    cursor: Optional[str],
+    batch_size: int
+) -> Tuple[Optional[str], int]:
+    last_id = int(cursor or 0)
+    ids = (await db.execute(
+        select(Backup.id).where(Backup.id > last_id).order_by(Backup.id).limit(batch_size)
+    )).scalars().all()
+    if not ids:
+        return None, 0
+    result = await db.execute(
+        update(Backup)
+        .where(Backup.id > last_id, Backup.id <= ids[-1], Backup.stored_size.is_(None))
+        .values(stored_size=Backup.file_size)
+    )
+    return _batch_result(ids, result.rowcount or 0, batch_size, str(ids[-1]))
+
+
+@data_migration("plugin_versions_updated_at", "按 created_at 回填 plugin_versions.updated_at")
+async def backfill_version_updated_at(
+    db: AsyncSession,
+    cursor: Optional[str],
+    batch_size: int
+) -> Tuple[Optional[str], int]:
+    # 联合主键 (plugin_name, version) 作为游标
+    key = tuple_(PluginVersion.plugin_name, PluginVersion.version)
+    query = select(PluginVersion.plugin_name, PluginVersion.version).order_by(
+        PluginVersion.plugin_name, PluginVersion.version
+    ).limit(batch_size)
+    if cursor:
+        start = tuple(json.loads(cursor))
+        query = query.where(key > start)
+    keys = (await db.execute(query)).all()
+    if not keys:
+        return None, 0
+    end = tuple(keys[-1])
+    condition = [key <= end, PluginVersion.updated_at.is_(None)]
+    if cursor:
+        condition.append(key > start)
+    result = await db.execute(
+        update(PluginVersion).where(*condition).values(updated_at=PluginVersion.created_at)
+    )
+    return _batch_result(keys, result.rowcount or 0, batch_size, json.dumps(list(end)))
+
+
+@data_migration("plugins_total_download_count", "按各版本下载次数回填 plugins.total_download_count")
+async def backfill_plugin_download_totals(
+    db: AsyncSession,
+    cursor: Optional[str],
+    batch_size: int
+) -> Tuple[Optional[str], int]:
+    return await VersionService.recount_download_totals(db, cursor, batch_size)
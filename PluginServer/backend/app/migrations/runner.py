@@ -0,0 +1,64 @@
+"""
+数据库迁移注册与执行
+"""
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+from sqlalchemy import select
+from sqlalchemy.engine import Connection
+
+from app.database import dialect_insert
+from app.models.schema_migration import SchemaMigration
+
+
+@dataclass
+class Migration:
+    """一个结构迁移"""
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+# 版本号 -> 迁移
+MIGRATIONS: Dict[int, Migration] = {}
+
+
+def migration(version: int, description: str):
+    """注册迁移的装饰器，被装饰的函数接收同步连接（在 init_db 的事务中执行）"""
+    def decorator(func: Callable[[Connection], None]) -> Callable[[Connection], None]:
+        if version in MIGRATIONS:
+            raise ValueError(f"迁移版本号重复: {version}")
+        MIGRATIONS[version] = Migration(version, description, func)
+        return func
+    return decorator
+
+
+def applied_versions(sync_conn: Connection) -> List[int]:
+    """已执行的迁移版本号"""
+    return sorted(sync_conn.execute(select(SchemaMigration.version)).scalars().all())
+
+
+def run_migrations(sync_conn: Connection) -> List[int]:
+    """
+    按版本号依次执行尚未执行的迁移
+
+    迁移和迁移记录在同一事务中提交，任一迁移失败时整体回滚、应用启动失败。
+    多个进程同时启动时迁移可能被执行两次，因此迁移必须是幂等的，记录插入忽略冲突。
+
+    Returns:
+        List[int]: 本次执行的迁移版本号
+    """
+    applied = set(applied_versions(sync_conn))
+    executed = []
+    for version in sorted(MIGRATIONS):
+        if version in applied:
+            continue
+        item = MIGRATIONS[version]
+        item.upgrade(sync_conn)
+        sync_conn.execute(
+            dialect_insert(SchemaMigration)
+            .values(version=version, description=item.description)
+            .on_conflict_do_nothing(index_elements=["version"])
+        )
+        print(f"✓ 已执行数据库迁移 {version}: {item.description}")
+        executed.append(version)
+    return executed
@@ -0,0 +1,22 @@
+"""
+结构迁移
+
+模型中新增的列和索引由 init_db 自动补充（_add_missing_columns），
+这里只放无法从模型声明推导出的变更：删除被取代的索引、重建统计信息、改写数据等。
+新增迁移时版本号递增，已发布的迁移不要修改。
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.migrations.runner import migration
+
+
+@migration(1, "删除 backups 表的冗余索引并更新查询优化器统计信息")
+def drop_redundant_backup_indexes(sync_conn: Connection) -> None:
+    # ix_backups_user_created (user_key, created_at) 的前缀已覆盖按 user_key 的查询
+    sync_conn.execute(text("DROP INDEX IF EXISTS ix_backups_user_key"))
+    # id 是整数主键（SQLite 中即 rowid），单独的索引只会增加写入开销
+    sync_conn.execute(text("DROP INDEX IF EXISTS ix_backups_id"))
+    # 新索引创建后更新统计信息（SQLite 的 sqlite_stat1 / PostgreSQL 的 pg_statistic），
+    # 让优化器在多个可用索引之间做出正确选择
+    sync_conn.execute(text("ANALYZE"))
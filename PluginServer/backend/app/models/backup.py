@@ -1,7 +1,7 @@
 """
 备份数据模型
 """
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -12,10 +12,10 @@ class Backup(Base):
     __tablename__ = "backups"
     
     # 主键
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     
     # 用户标识
-    user_key = Column(String(256), nullable=False, index=True, comment="用户密钥")
+    user_key = Column(String(256), nullable=False, comment="用户密钥")
     
     # 备份类型
     backup_type = Column(String(20), nullable=False, comment="备份类型: program | plugin")
@@ -29,12 +29,22 @@ class Backup(Base):
     file_size = Column(Integer, nullable=False, comment="文件大小（字节）")
     file_hash = Column(String, nullable=False, comment="SHA256 哈希值")
     
+    # 存储压缩（file_size / file_hash 对应原始内容，stored_size 为磁盘上的实际大小）
+    stored_size = Column(Integer, nullable=True, comment="存储大小（字节）")
+    compression = Column(String(16), nullable=True, comment="存储压缩算法: zstd，为空表示未压缩")
+    
     # 可选描述
     description = Column(Text, default="", comment="备份描述")
     
     # 时间戳
     created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
     
+    __table_args__ = (
+        # 按用户列出备份（ORDER BY created_at DESC）和保留策略（created_at DESC, id DESC）：
+        # 升序索引反向扫描即可满足两种排序（索引末尾隐含 rowid），不需要额外排序
+        Index("ix_backups_user_created", "user_key", "created_at"),
+    )
+    
     def __repr__(self):
         return f"<Backup(id={self.id}, user_key='{self.user_key}', type='{self.backup_type}', plugin='{self.plugin_name}')>"
 
@@ -0,0 +1,36 @@
+"""
+备份空间用量数据模型
+"""
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime
+from sqlalchemy.sql import func
+from app.database import Base
+
+# plugin_name 为该值的记录是用户的总用量（含 program 和所有 plugin 备份）
+USAGE_TOTAL = ""
+
+
+class BackupUsage(Base):
+    """
+    备份空间用量汇总
+
+    每个用户一条总量记录（plugin_name = ""），每个插件一条分项记录。
+    在创建和删除备份的同一事务中增减，查询用量不需要扫描 backups 表。
+    """
+
+    __tablename__ = "backup_usage"
+
+    # 用户标识
+    user_key = Column(String(256), primary_key=True, comment="用户密钥")
+
+    # 插件名称，空字符串表示用户总量
+    plugin_name = Column(String, primary_key=True, default=USAGE_TOTAL, comment="插件名称，空字符串表示总量")
+
+    # 用量
+    total_bytes = Column(BigInteger, nullable=False, default=0, comment="备份总大小（字节）")
+    backup_count = Column(Integer, nullable=False, default=0, comment="备份数量")
+
+    # 时间戳
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+    def __repr__(self):
+        return f"<BackupUsage(user_key='{self.user_key}', plugin='{self.plugin_name}', bytes={self.total_bytes})>"
@@ -0,0 +1,37 @@
+"""
+缓存失效日志模型
+
+数据库传输方式的失效总线使用此表在多个 worker 之间广播失效消息：
+发布方插入一行，各 worker 按自增序号轮询 seq > 上次位置 的新行。
+序号按提交顺序分配（见 app.database.serialize_inserts），并发发布的消息不会被轮询跳过。
+"""
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.database import Base, serialize_inserts
+
+
+class CacheInvalidation(Base):
+    """缓存失效消息"""
+
+    __tablename__ = "cache_invalidations"
+    # 使用 AUTOINCREMENT，清理全部旧记录后序号也不会回退
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    # 单调递增序号（主键，轮询游标）
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+
+    # 失效的缓存键
+    cache_key = Column(String, nullable=False, comment="缓存键")
+
+    # 发布消息的进程标识，用于跳过自己发布的消息
+    origin = Column(String(64), nullable=False, comment="发布方进程标识")
+
+    # 时间戳（用于清理旧消息）
+    created_at = Column(DateTime, server_default=func.now(), index=True, comment="创建时间")
+
+    def __repr__(self):
+        return f"<CacheInvalidation(seq={self.seq}, key='{self.cache_key}')>"
+
+
+# PostgreSQL 咨询锁的键（各日志表使用不同的键）
+serialize_inserts(CacheInvalidation, lock_key=0x4D44_0001)
@@ -0,0 +1,39 @@
+"""
+插件变更日志模型
+
+PluginService / VersionService 的每次修改都会在同一事务中追加一条记录，
+客户端通过变更订阅接口按序号（seq）增量获取。
+序号按提交顺序分配（见 app.database.serialize_inserts）：变更记录在调用方的数据事务中写入，
+否则并发事务可能晚于更大的序号提交，客户端游标越过后就再也读不到这条变更。
+"""
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.database import Base, serialize_inserts
+
+
+class PluginChange(Base):
+    """插件变更记录"""
+    
+    __tablename__ = "plugin_changes"
+    # 使用 AUTOINCREMENT，清理旧记录后序号也不会回退（客户端游标依赖序号单调递增）
+    __table_args__ = {"sqlite_autoincrement": True}
+    
+    # 单调递增序号（主键，客户端订阅游标）
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    
+    # 变更的插件和版本（插件级变更时 version 为空）
+    plugin_name = Column(String, nullable=False, index=True, comment="插件名称")
+    version = Column(String, nullable=True, comment="版本号")
+    
+    # 变更类型，见 app.services.change_service 中的常量
+    action = Column(String(32), nullable=False, comment="变更类型")
+    
+    # 时间戳
+    created_at = Column(DateTime, server_default=func.now(), index=True, comment="创建时间")
+    
+    def __repr__(self):
+        return f"<PluginChange(seq={self.seq}, plugin='{self.plugin_name}', action='{self.action}')>"
+
+
+# PostgreSQL 咨询锁的键（与 cache_invalidations 不同）
+serialize_inserts(PluginChange, lock_key=0x4D44_0002)
@@ -0,0 +1,34 @@
+"""
+数据迁移进度模型
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class DataMigration(Base):
+    """
+    分批执行的数据迁移进度（见 app.migrations.data）
+
+    每处理完一批就和该批的数据修改在同一事务中更新游标，中断后从游标处继续。
+    """
+
+    __tablename__ = "data_migrations"
+
+    # 迁移名称
+    name = Column(String(128), primary_key=True, comment="数据迁移名称")
+
+    # 下一批的起点（迁移自行定义格式），为空表示从头开始
+    cursor = Column(Text, nullable=True, comment="游标")
+
+    # 进度
+    batches = Column(Integer, nullable=False, default=0, comment="已执行批次")
+    rows_done = Column(Integer, nullable=False, default=0, comment="已处理行数")
+
+    # 时间戳
+    started_at = Column(DateTime, server_default=func.now(), comment="开始时间")
+    updated_at = Column(DateTime, server_default=func.now(), comment="最近一批完成时间")
+    finished_at = Column(DateTime, nullable=True, comment="完成时间，为空表示未完成")
+
+    def __repr__(self):
+        return f"<DataMigration(name='{self.name}', rows_done={self.rows_done}, finished={self.finished_at is not None})>"
@@ -0,0 +1,40 @@
+"""
+独立下载者草图数据模型
+"""
+from sqlalchemy import Column, Integer, String, DateTime, LargeBinary, PrimaryKeyConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+# version / period 为空字符串表示所有版本 / 全部时间
+ALL_VERSIONS = ""
+ALL_TIME = ""
+
+
+class DownloadSketch(Base):
+    """
+    下载者的 HyperLogLog 草图（见 app.utils.hyperloglog）
+
+    每行一个草图，按 (插件, 版本, 时间段) 区分:
+    - (插件, 版本, "")      某个版本的独立下载者
+    - (插件, "", "")        插件所有版本的独立下载者
+    - (插件, "", "YYYY-MM") 插件某个月的独立下载者，多个月的草图合并即为该时间段的独立下载者
+    """
+
+    __tablename__ = "download_sketches"
+
+    plugin_name = Column(String, nullable=False, comment="插件名称")
+    version = Column(String, nullable=False, comment="版本号，空字符串表示所有版本")
+    period = Column(String(7), nullable=False, comment="月份 YYYY-MM，空字符串表示全部时间")
+
+    # 序列化的草图和对应的估计值（写入时计算，读取时无需反序列化）
+    sketch = Column(LargeBinary, nullable=False, comment="HyperLogLog 草图")
+    estimate = Column(Integer, nullable=False, default=0, comment="独立下载者估计值")
+
+    updated_at = Column(DateTime, server_default=func.now(), comment="更新时间")
+
+    __table_args__ = (
+        PrimaryKeyConstraint("plugin_name", "version", "period", name="pk_download_sketch"),
+    )
+
+    def __repr__(self):
+        return f"<DownloadSketch(plugin='{self.plugin_name}', version='{self.version}', period='{self.period}')>"
@@ -0,0 +1,35 @@
+"""
+下载统计数据模型
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Index, PrimaryKeyConstraint
+from app.database import Base
+
+
+class DownloadStat(Base):
+    """
+    按时间分桶的下载次数（见 app.services.download_stats）
+
+    granularity 为 hour / day / month，bucket_start 为分桶起点（UTC）。
+    小时桶由各 worker 的内存缓冲区累加写入，日桶和月桶由后台压缩任务从更细的桶汇总。
+    """
+
+    __tablename__ = "download_stats"
+
+    plugin_name = Column(String, nullable=False, comment="插件名称")
+    granularity = Column(String(8), nullable=False, comment="分桶粒度: hour / day / month")
+    bucket_start = Column(DateTime, nullable=False, comment="分桶起点（UTC）")
+    version = Column(String, nullable=False, comment="版本号")
+    count = Column(Integer, nullable=False, default=0, comment="下载次数")
+
+    __table_args__ = (
+        # 趋势、版本占比和热门排行：按 (插件, 粒度) 定位后按时间范围扫描
+        PrimaryKeyConstraint("plugin_name", "granularity", "bucket_start", "version", name="pk_download_stat"),
+        # 压缩汇总和过期清理：按粒度和时间范围扫描所有插件
+        Index("ix_download_stats_granularity_bucket", "granularity", "bucket_start"),
+    )
+
+    def __repr__(self):
+        return (
+            f"<DownloadStat(plugin='{self.plugin_name}', version='{self.version}', "
+            f"{self.granularity}={self.bucket_start}, count={self.count})>"
+        )
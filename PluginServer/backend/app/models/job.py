@@ -0,0 +1,53 @@
+"""
+后台任务数据模型
+
+持久化的任务队列：请求中只写入任务记录，由后台 worker 协程领取执行，
+进程重启后未完成的任务会被重新领取。
+"""
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class Job(Base):
+    """后台任务"""
+    
+    __tablename__ = "jobs"
+    
+    # 主键
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    
+    # 幂等键：相同键的任务只会入队一次
+    job_key = Column(String, nullable=False, unique=True, comment="任务幂等键")
+    
+    # 任务类型（对应已注册的处理函数）和参数（JSON）
+    job_type = Column(String(64), nullable=False, comment="任务类型")
+    payload = Column(Text, default="{}", comment="任务参数（JSON）")
+    
+    # 状态: pending | running | succeeded | failed
+    status = Column(String(16), nullable=False, default="pending", comment="任务状态")
+    
+    # 重试信息
+    attempts = Column(Integer, nullable=False, default=0, comment="已执行次数")
+    max_attempts = Column(Integer, nullable=False, default=5, comment="最大执行次数")
+    run_after = Column(DateTime, server_default=func.now(), comment="最早执行时间")
+    last_error = Column(Text, nullable=True, comment="最近一次错误信息")
+    
+    # 处理函数返回的结果（JSON），用于清理报告等
+    result = Column(Text, nullable=True, comment="执行结果（JSON）")
+    
+    # 领取信息：worker 崩溃后超过锁超时的任务会被重新领取
+    locked_by = Column(String(64), nullable=True, comment="领取任务的 worker")
+    locked_at = Column(DateTime, nullable=True, comment="领取时间")
+    
+    # 时间戳
+    created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
+    finished_at = Column(DateTime, nullable=True, comment="完成时间")
+    
+    __table_args__ = (
+        # 领取任务的查询条件
+        Index("ix_jobs_status_run_after", "status", "run_after"),
+    )
+    
+    def __repr__(self):
+        return f"<Job(id={self.id}, type='{self.job_type}', status='{self.status}')>"
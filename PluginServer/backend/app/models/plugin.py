@@ -1,7 +1,7 @@
 """
 插件数据模型
 """
-from sqlalchemy import Column, String, Boolean, DateTime
+from sqlalchemy import Column, String, Boolean, DateTime, Integer
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -33,12 +33,23 @@ class Plugin(Base):
     is_enabled = Column(Boolean, default=True, comment="是否启用")
     is_deprecated = Column(Boolean, default=False, comment="是否过时")
     
+    # 所有版本下载次数总和（冗余字段）：与版本的下载次数在同一事务中递增，
+    # 列表查询无需聚合 plugin_versions；由 repair_download_counts 任务定期按版本重新统计校正
+    total_download_count = Column(
+        Integer, nullable=False, default=0, server_default="0", comment="所有版本下载次数总和"
+    )
+    
+    # 独立下载者估计值（HyperLogLog，误差约 2%），由下载统计刷新时更新
+    unique_download_count = Column(
+        Integer, nullable=False, default=0, server_default="0", comment="独立下载者估计值"
+    )
+    
     # 上传密钥（首次上传时绑定，后续更新需验证）
     upload_key = Column(String(256), nullable=False, comment="插件上传密钥")
     
     # 时间戳
-    created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新时间")
+    created_at = Column(DateTime, server_default=func.now(), index=True, comment="创建时间")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), index=True, comment="更新时间")
     
     # 关系：一个插件有多个版本
     versions = relationship("PluginVersion", back_populates="plugin", cascade="all, delete-orphan")
@@ -0,0 +1,24 @@
+"""
+数据库迁移记录模型
+"""
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.database import Base
+
+
+class SchemaMigration(Base):
+    """已执行的数据库迁移（见 app.migrations）"""
+
+    __tablename__ = "schema_migrations"
+
+    # 迁移版本号
+    version = Column(Integer, primary_key=True, autoincrement=False, comment="迁移版本号")
+
+    # 迁移说明
+    description = Column(String, nullable=False, comment="迁移说明")
+
+    # 执行时间
+    applied_at = Column(DateTime, server_default=func.now(), comment="执行时间")
+
+    def __repr__(self):
+        return f"<SchemaMigration(version={self.version}, description='{self.description}')>"
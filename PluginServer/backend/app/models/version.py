@@ -1,7 +1,7 @@
 """
 插件版本数据模型
 """
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Integer, Text, PrimaryKeyConstraint
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Integer, Text, PrimaryKeyConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -30,9 +30,15 @@ class PluginVersion(Base):
     # 状态
     is_deprecated = Column(Boolean, default=False, comment="是否过时")
     download_count = Column(Integer, default=0, comment="下载次数")
+    # 独立下载者估计值（HyperLogLog），由下载统计刷新时更新
+    unique_download_count = Column(
+        Integer, nullable=False, default=0, server_default="0", comment="独立下载者估计值"
+    )
     
     # 时间戳
     created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
+    # 增量同步游标使用。不设置 onupdate：下载次数变化不算目录变更，由服务层在状态变化时显式更新
+    updated_at = Column(DateTime, server_default=func.now(), index=True, comment="更新时间")
     
     # 关系
     plugin = relationship("Plugin", back_populates="versions")
@@ -40,6 +46,8 @@ class PluginVersion(Base):
     # 联合主键约束
     __table_args__ = (
         PrimaryKeyConstraint('plugin_name', 'version', name='pk_plugin_version'),
+        # 按插件列出版本（ORDER BY created_at DESC），主键只能定位插件、还需要排序
+        Index('ix_plugin_versions_plugin_created', 'plugin_name', 'created_at'),
     )
     
     def __repr__(self):
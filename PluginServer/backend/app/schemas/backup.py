@@ -26,6 +26,8 @@ class BackupResponse(BaseModel):
     file_name: str
     file_size: int
     file_hash: str
+    stored_size: Optional[int] = Field(None, description="服务器存储大小（字节）")
+    compression: Optional[str] = Field(None, description="服务器存储压缩算法")
     description: str
     created_at: datetime
     
@@ -33,6 +35,31 @@ class BackupResponse(BaseModel):
         from_attributes = True
 
 
+class PluginBackupUsage(BaseModel):
+    """单个插件的备份用量"""
+    plugin_name: str
+    total_bytes: int
+    backup_count: int
+    quota_bytes: int = Field(..., description="配额（字节），0 表示不限制")
+    remaining_bytes: Optional[int] = Field(None, description="剩余空间（字节），不限制时为空")
+
+
+class BackupUsageResponse(BaseModel):
+    """用户备份空间用量响应"""
+    user_key: str
+    total_bytes: int
+    backup_count: int
+    quota_bytes: int = Field(..., description="配额（字节），0 表示不限制")
+    remaining_bytes: Optional[int] = Field(None, description="剩余空间（字节），不限制时为空")
+    plugins: list[PluginBackupUsage]
+
+
+class BackupGcRequest(BaseModel):
+    """手动触发存储清理请求"""
+    retention: bool = Field(True, description="是否执行保留策略")
+    orphans: bool = Field(True, description="是否清理孤儿文件")
+
+
 class BackupListResponse(BaseModel):
     """备份列表响应"""
     total: int
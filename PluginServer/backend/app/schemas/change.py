@@ -0,0 +1,53 @@
+"""
+插件变更订阅和增量同步相关的 Pydantic schemas
+"""
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+
+from app.schemas.plugin import PluginResponse
+from app.schemas.version import VersionResponse
+
+
+class ChangeResponse(BaseModel):
+    """变更记录响应 schema"""
+    seq: int
+    plugin_name: str
+    version: Optional[str] = None
+    action: str
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+class ChangeFeedResponse(BaseModel):
+    """变更订阅响应"""
+    changes: List[ChangeResponse]
+    # 下次请求应传入的 since
+    last_seq: int
+    # 为 True 表示 since 之后的部分记录已被清理，客户端需要重新获取完整列表
+    reset: bool = False
+
+
+class SyncRequest(BaseModel):
+    """增量同步请求"""
+    cursor: Optional[datetime] = Field(None, description="上次同步返回的 next_cursor，不传表示全量同步")
+
+
+class DeletedPlugin(BaseModel):
+    """已删除插件（墓碑记录）"""
+    name: str
+    deleted_at: datetime
+
+
+class SyncResponse(BaseModel):
+    """增量同步响应"""
+    plugins: List[PluginResponse]
+    versions: List[VersionResponse]
+    # 已删除的插件，客户端应先删除本地记录（含所有版本），再应用 plugins / versions
+    deleted: List[DeletedPlugin]
+    # 下次同步应传入的游标
+    next_cursor: datetime
+    # 为 True 表示本次为全量数据，客户端应丢弃本地不在结果中的插件
+    full: bool
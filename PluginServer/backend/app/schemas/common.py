@@ -1,6 +1,7 @@
 """
 通用响应 schemas
 """
+from datetime import datetime
 from pydantic import BaseModel, Field
 from typing import Any, Optional, Generic, TypeVar, List
 
@@ -61,3 +62,20 @@ class PluginVersionRequest(BaseModel):
     """插件名 + 版本号查询请求"""
     name: str = Field(..., description="插件名称")
     version: str = Field(..., description="版本号")
+
+
+class PluginDownloadUrlRequest(BaseModel):
+    """插件签名下载链接请求"""
+    name: str = Field(..., description="插件名称")
+    version: Optional[str] = Field(None, description="版本号，不传则为当前版本")
+
+
+class BundleRequest(BaseModel):
+    """批量下载请求"""
+    plugins: List[PluginDownloadUrlRequest] = Field(..., min_length=1, description="要下载的插件（版本号可选）")
+
+
+class SignedUrlResponse(BaseModel):
+    """签名下载链接"""
+    url: str = Field(..., description="下载链接（GET，无需其他认证）")
+    expires_at: datetime = Field(..., description="过期时间（UTC）")
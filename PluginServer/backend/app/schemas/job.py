@@ -0,0 +1,37 @@
+"""
+后台任务相关的 Pydantic schemas
+"""
+import json
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, Dict, Optional
+from datetime import datetime
+
+
+class JobKeyRequest(BaseModel):
+    """按幂等键查询任务请求"""
+    job_key: str = Field(..., description="任务幂等键")
+
+
+class JobStatusResponse(BaseModel):
+    """任务状态响应 schema"""
+    job_key: str
+    job_type: str
+    status: str
+    attempts: int
+    max_attempts: int
+    last_error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    run_after: Optional[datetime] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    
+    @field_validator("result", mode="before")
+    @classmethod
+    def parse_result(cls, value):
+        """数据库中以 JSON 文本存储"""
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+    
+    class Config:
+        from_attributes = True
@@ -46,6 +46,7 @@ class PluginResponse(BaseModel):
     is_enabled: bool
     is_deprecated: bool
     total_download_count: int = 0  # 所有版本下载次数总和
+    unique_download_count: int = 0  # 独立下载者估计值（HyperLogLog）
     created_at: datetime
     updated_at: datetime
     
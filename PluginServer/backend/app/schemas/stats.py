@@ -0,0 +1,86 @@
+"""
+下载统计相关的 Pydantic schemas
+"""
+from datetime import datetime
+from typing import Annotated, List, Literal
+from pydantic import BaseModel, Field
+
+
+class TopPluginsRequest(BaseModel):
+    """热门插件排行请求"""
+    days: int = Field(7, ge=1, le=366, description="统计最近多少天（含今天）")
+    limit: int = Field(10, ge=1, le=100, description="返回的插件数")
+
+
+class PluginDownloads(BaseModel):
+    """插件在统计区间内的下载次数"""
+    name: str
+    display_name: str
+    downloads: int
+
+
+class DownloadTrendRequest(BaseModel):
+    """插件下载趋势请求"""
+    name: str = Field(..., description="插件名称")
+    granularity: Literal["hour", "day", "month"] = Field("day", description="分桶粒度")
+    periods: int = Field(30, ge=1, le=366, description="返回最近多少个分桶（含当前分桶）")
+
+
+class DownloadTrendPoint(BaseModel):
+    """一个分桶的下载次数"""
+    bucket_start: datetime = Field(..., description="分桶起点（UTC）")
+    downloads: int
+
+
+class VersionShareRequest(BaseModel):
+    """插件各版本下载占比请求"""
+    name: str = Field(..., description="插件名称")
+    days: int = Field(30, ge=1, le=366, description="统计最近多少天（含今天）")
+
+
+class VersionShare(BaseModel):
+    """版本在统计区间内的下载次数和占比"""
+    version: str
+    downloads: int
+    share: float = Field(..., description="占该插件下载次数的比例（0 ~ 1）")
+
+
+class UniqueDownloadsRequest(BaseModel):
+    """插件独立下载者估计请求"""
+    name: str = Field(..., description="插件名称")
+    months: int = Field(12, ge=1, le=24, description="返回最近多少个月（含本月）")
+
+
+class MonthlyUniqueDownloads(BaseModel):
+    """一个月的独立下载者估计"""
+    month: str = Field(..., description="月份（UTC），格式 YYYY-MM")
+    unique_downloads: int
+
+
+class UniqueDownloads(BaseModel):
+    """插件独立下载者估计（HyperLogLog，标准误差约 1.6%）"""
+    name: str
+    total_downloads: int = Field(..., description="累计下载次数")
+    unique_downloads: int = Field(..., description="累计独立下载者估计")
+    period_unique_downloads: int = Field(..., description="所选月份内的独立下载者估计（跨月去重）")
+    months: List[MonthlyUniqueDownloads]
+
+
+class MirrorDownload(BaseModel):
+    """镜像节点上报的一个版本的下载次数"""
+    name: str = Field(..., description="插件名称")
+    version: str = Field(..., description="版本号")
+    count: int = Field(..., ge=1, description="上报周期内的下载次数")
+    client_hashes: List[Annotated[int, Field(ge=0, lt=2 ** 64)]] = Field(
+        default_factory=list, description="下载者标识的 64 位哈希（hash_identifier），用于独立下载者估计"
+    )
+
+
+class MirrorDownloadReport(BaseModel):
+    """镜像节点下载次数上报"""
+    downloads: List[MirrorDownload] = Field(..., max_length=1000, description="各版本的下载次数")
+
+
+class MirrorDownloadResult(BaseModel):
+    """镜像节点下载次数上报结果"""
+    counted: int = Field(..., description="计入的下载次数（上游不存在的版本不计入）")
@@ -1,7 +1,8 @@
 """
 插件版本相关的 Pydantic schemas
 """
-from pydantic import BaseModel, Field
+import json
+from pydantic import BaseModel, Field, field_validator
 from typing import Optional, Dict
 from datetime import datetime
 
@@ -22,7 +23,9 @@ class VersionResponse(BaseModel):
     changelog: str
     is_deprecated: bool
     download_count: int
+    unique_download_count: int = 0  # 独立下载者估计值（HyperLogLog）
     created_at: datetime
+    updated_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
@@ -33,5 +36,13 @@ class VersionDetailResponse(VersionResponse):
     dependencies: Dict[str, str] = {}
     engines: Dict[str, str] = {}
     
+    @field_validator("dependencies", "engines", mode="before")
+    @classmethod
+    def parse_json_text(cls, value):
+        """数据库中以 JSON 文本保存"""
+        if isinstance(value, str):
+            return json.loads(value) if value else {}
+        return value
+    
     class Config:
         from_attributes = True
@@ -1,25 +1,61 @@
 """
 备份服务：处理用户备份相关的业务逻辑
 """
-import shutil
-from typing import List, Optional
+import asyncio
+import time
+import uuid
+from typing import Dict, List, Optional
 from pathlib import Path
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, delete, func, literal, or_, union_all
 from fastapi import HTTPException, UploadFile
 import aiofiles
 
 from app.models.backup import Backup
+from app.models.backup_usage import BackupUsage, USAGE_TOTAL
 from app.config import settings
+from app.database import AsyncSessionLocal, dialect_insert
+from app.utils.compression import ZSTD, ZSTD_SUFFIX, zstd_available, sample_ratio, compress_file
 from app.utils.hash import calculate_file_hash
 from app.utils.validators import validate_key_or_raise
 
-# 备份存储根目录
-BACKUP_DIR = Path("./data/backups")
-
 # 允许的备份类型
 ALLOWED_BACKUP_TYPES = {"program", "plugin"}
 
+# 是否已提示过缺少 zstandard
+_zstd_warned = False
+
+
+def _usage_scopes(plugin_name: Optional[str]) -> List[str]:
+    """备份计入的用量记录：用户总量，plugin 备份还计入该插件的分项"""
+    return [USAGE_TOTAL, plugin_name] if plugin_name else [USAGE_TOTAL]
+
+
+def _quota_of(scope: str) -> int:
+    """用量记录对应的上传配额，0 表示不限制"""
+    if scope == USAGE_TOTAL:
+        return settings.BACKUP_UPLOAD_QUOTA_BYTES
+    return settings.BACKUP_PLUGIN_UPLOAD_QUOTA_BYTES
+
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.2f}{unit}"
+        size /= 1024
+    return f"{size:.2f}GB"
+
+
+def _quota_exceeded(scope: str, used: int, incoming_size: int, quota: int) -> HTTPException:
+    target = f"插件 {scope} 的" if scope != USAGE_TOTAL else ""
+    return HTTPException(
+        status_code=413,
+        detail=(
+            f"{target}备份空间不足：已用 {_format_size(used)}，"
+            f"本次 {_format_size(incoming_size)}，配额 {_format_size(quota)}"
+        )
+    )
+
 
 class BackupService:
     """备份服务"""
@@ -34,8 +70,8 @@ class BackupService:
         - plugin:  backups/{user_key}/plugin/{plugin_name}/
         """
         if backup_type == "plugin" and plugin_name:
-            return BACKUP_DIR / user_key / backup_type / plugin_name
-        return BACKUP_DIR / user_key / backup_type
+            return settings.BACKUP_DIR / user_key / backup_type / plugin_name
+        return settings.BACKUP_DIR / user_key / backup_type
     
     @staticmethod
     async def get_user_backups(db: AsyncSession, user_key: str) -> List[Backup]:
@@ -106,30 +142,52 @@ class BackupService:
         if not file.filename:
             raise HTTPException(status_code=400, detail="文件名不能为空")
         
-        # 5. 创建备份目录
+        # 5. 按已知的文件大小预检配额，超出时不写入磁盘
+        if file.size is not None:
+            await BackupService.check_quota(db, user_key, plugin_name, file.size)
+        
+        # 6. 创建备份目录
         backup_dir = BackupService._get_backup_dir(user_key, backup_type, plugin_name)
         backup_dir.mkdir(parents=True, exist_ok=True)
         
-        # 6. 先保存到临时文件以计算哈希
-        temp_path = backup_dir / f"temp_{file.filename}"
+        # 7. 先保存到临时文件以计算哈希（随机后缀，避免同名文件并发上传互相覆盖）
+        temp_path = backup_dir / f"temp_{uuid.uuid4().hex}_{file.filename}"
         file_size = 0
         async with aiofiles.open(temp_path, 'wb') as f:
-            while chunk := await file.read(8192):
+            while chunk := await file.read(settings.FILE_CHUNK_SIZE):
                 await f.write(chunk)
                 file_size += len(chunk)
         
-        # 7. 计算文件哈希
+        # 8. 计算文件哈希（原始内容）
         file_hash = await calculate_file_hash(temp_path)
         
-        # 8. 使用哈希前8位作为文件名（简洁且唯一）
+        # 9. 按配置压缩（在获取数据库写锁之前完成）
+        temp_path, stored_size, compression = await BackupService._compress_for_storage(temp_path, file_size)
+        
+        # 10. 在同一事务中增加用量并确认未超出配额（并发上传在写锁上串行，不会同时越过配额）
+        #     用量和配额按原始大小计算，与客户端看到的文件大小一致
+        try:
+            totals = await BackupService._add_usage(db, user_key, plugin_name, file_size, 1)
+            for scope, total in totals.items():
+                quota = _quota_of(scope)
+                if quota and total > quota:
+                    raise _quota_exceeded(scope, total - file_size, file_size, quota)
+        except BaseException:
+            await db.rollback()
+            temp_path.unlink(missing_ok=True)
+            raise
+        
+        # 11. 使用哈希前8位作为文件名（简洁且唯一），压缩存储的文件追加 .zst
         ext = Path(file.filename).suffix or ".zip"
         safe_filename = f"{file_hash[:8]}{ext}"
+        if compression == ZSTD:
+            safe_filename += ZSTD_SUFFIX
         file_path = backup_dir / safe_filename
         
-        # 9. 重命名临时文件为最终文件名
+        # 12. 重命名临时文件为最终文件名
         temp_path.rename(file_path)
         
-        # 10. 创建数据库记录
+        # 13. 创建数据库记录，与用量一起提交
         backup = Backup(
             user_key=user_key,
             backup_type=backup_type,
@@ -138,6 +196,8 @@ class BackupService:
             file_path=str(file_path),
             file_size=file_size,
             file_hash=file_hash,
+            stored_size=stored_size,
+            compression=compression,
             description=description,
         )
         db.add(backup)
@@ -146,12 +206,50 @@ class BackupService:
         
         return backup
     
+    @staticmethod
+    async def _compress_for_storage(temp_path: Path, file_size: int) -> tuple[Path, int, Optional[str]]:
+        """
+        按 BACKUP_COMPRESSION 压缩上传的临时文件
+        
+        先压缩开头的样本，压缩比高于 BACKUP_COMPRESSION_MIN_RATIO 时（已压缩的内容）直接跳过，
+        避免对整个文件做无效压缩。压缩和读写在线程中执行。
+        
+        Returns:
+            tuple[Path, int, Optional[str]]: (待存储的临时文件, 存储大小, 压缩算法)，未压缩时返回原文件
+        """
+        global _zstd_warned
+        if settings.BACKUP_COMPRESSION.lower() != ZSTD or file_size == 0:
+            return temp_path, file_size, None
+        if not zstd_available():
+            if not _zstd_warned:
+                _zstd_warned = True
+                print("⚠️ 未安装 zstandard，备份将按原样存储")
+            return temp_path, file_size, None
+        
+        level = settings.BACKUP_COMPRESSION_LEVEL
+        ratio = await asyncio.to_thread(
+            sample_ratio, temp_path, settings.BACKUP_COMPRESSION_SAMPLE_SIZE, level
+        )
+        if ratio > settings.BACKUP_COMPRESSION_MIN_RATIO:
+            return temp_path, file_size, None
+        
+        compressed_path = temp_path.with_name(temp_path.name + ZSTD_SUFFIX)
+        stored_size = await asyncio.to_thread(
+            compress_file, temp_path, compressed_path, level, settings.FILE_CHUNK_SIZE
+        )
+        if stored_size >= file_size:
+            # 样本可压缩但整体不可压缩
+            compressed_path.unlink(missing_ok=True)
+            return temp_path, file_size, None
+        temp_path.unlink(missing_ok=True)
+        return compressed_path, stored_size, ZSTD
+    
     @staticmethod
     async def download_backup(
         db: AsyncSession,
         user_key: str,
         backup_id: int
-    ) -> tuple[Path, str]:
+    ) -> Backup:
         """
         获取备份下载信息
         
@@ -161,7 +259,7 @@ class BackupService:
             backup_id: 备份ID
             
         Returns:
-            tuple[Path, str]: (文件路径, 文件名)
+            Backup: 备份记录（已确认存储文件存在，compression 不为空时文件为压缩格式）
         """
         # 1. 验证 user_key 格式
         validate_key_or_raise(user_key, "用户密钥")
@@ -180,7 +278,7 @@ class BackupService:
         if not file_path.exists():
             raise HTTPException(status_code=404, detail="备份文件不存在")
         
-        return file_path, backup.file_name
+        return backup
     
     @staticmethod
     async def delete_backup(
@@ -208,12 +306,254 @@ class BackupService:
         if backup.user_key != user_key:
             raise HTTPException(status_code=403, detail="用户密钥不匹配，无权删除此备份")
         
-        # 4. 删除文件
-        file_path = Path(backup.file_path)
-        if file_path.exists():
-            file_path.unlink()
-        
-        # 5. 删除数据库记录
-        await db.delete(backup)
+        # 4. 删除数据库记录，提交成功后再删除文件
+        paths = await BackupService.purge_backups(db, [backup])
         await db.commit()
+        await BackupService.remove_unreferenced_files(paths)
+    
+    @staticmethod
+    async def purge_backups(db: AsyncSession, backups: List[Backup]) -> List[str]:
+        """
+        删除一批备份的数据库记录并扣减用量（不提交事务）
+        
+        用户删除和保留策略清理共用此方法。文件不在这里删除：调用方提交成功后再调用
+        remove_unreferenced_files，提交失败时记录和文件都保留。
+        
+        Returns:
+            List[str]: 待删除的文件路径
+        """
+        # 按 (用户, 插件) 汇总后扣减用量
+        freed: Dict[tuple, List[int]] = {}
+        for backup in backups:
+            await db.delete(backup)
+            totals = freed.setdefault((backup.user_key, backup.plugin_name), [0, 0])
+            totals[0] += backup.file_size
+            totals[1] += 1
+        for (user_key, plugin_name), (size, count) in freed.items():
+            await BackupService._add_usage(db, user_key, plugin_name, -size, -count)
+        return list({backup.file_path for backup in backups})
+    
+    @staticmethod
+    async def remove_unreferenced_files(paths: List[str]) -> int:
+        """
+        删除已提交删除的备份的文件（purge_backups 提交之后调用）
+        
+        内容相同的备份按哈希命名，会共用同一个文件，仍被其他备份记录引用的文件不删除。
+        修改时间在 ORPHAN_GRACE_SECONDS 以内的文件可能刚被内容相同、尚未提交的上传覆盖，也不删除；
+        留下的文件之后由孤儿文件清理删除。文件删除在线程中执行，避免大量文件时阻塞事件循环。
+        
+        Returns:
+            int: 释放的磁盘空间（字节）
+        """
+        if not paths:
+            return 0
+        async with AsyncSessionLocal() as db:
+            shared = (await db.execute(
+                select(Backup.file_path).where(Backup.file_path.in_(paths))
+            )).scalars().all()
+        candidates = [Path(path) for path in set(paths).difference(shared)]
+        grace_before = time.time() - settings.ORPHAN_GRACE_SECONDS
+        return await asyncio.to_thread(_unlink_files, candidates, grace_before)
+    
+    # ==================== 空间用量与配额 ====================
+    
+    @staticmethod
+    async def _add_usage(
+        db: AsyncSession,
+        user_key: str,
+        plugin_name: Optional[str],
+        size_delta: int,
+        count_delta: int
+    ) -> Dict[str, int]:
+        """
+        增减用户总量和插件分项的用量（不提交）
+        
+        Returns:
+            Dict[str, int]: 用量记录 -> 更新后的总字节数
+        """
+        totals = {}
+        for scope in _usage_scopes(plugin_name):
+            totals[scope] = await BackupService._add_scope_usage(db, user_key, scope, size_delta, count_delta)
+        return totals
+    
+    @staticmethod
+    async def _add_scope_usage(
+        db: AsyncSession,
+        user_key: str,
+        scope: str,
+        size_delta: int,
+        count_delta: int
+    ) -> int:
+        """原子地增减一条用量记录（不存在时插入），返回更新后的总字节数"""
+        statement = dialect_insert(BackupUsage).values(
+            user_key=user_key,
+            plugin_name=scope,
+            total_bytes=size_delta,
+            backup_count=count_delta,
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=["user_key", "plugin_name"],
+            set_={
+                "total_bytes": BackupUsage.total_bytes + statement.excluded.total_bytes,
+                "backup_count": BackupUsage.backup_count + statement.excluded.backup_count,
+                "updated_at": func.now(),
+            },
+        ).returning(BackupUsage.total_bytes)
+        return (await db.execute(statement)).scalar_one()
+    
+    @staticmethod
+    async def check_quota(
+        db: AsyncSession,
+        user_key: str,
+        plugin_name: Optional[str],
+        incoming_size: int
+    ) -> None:
+        """
+        检查上传 incoming_size 字节后是否超出配额，超出时抛出 413
+        
+        只读取用量汇总记录，上传开始前（请求体到达之前）即可调用。
+        """
+        quotas = {scope: _quota_of(scope) for scope in _usage_scopes(plugin_name)}
+        quotas = {scope: quota for scope, quota in quotas.items() if quota}
+        if not quotas:
+            return
+        
+        result = await db.execute(
+            select(BackupUsage.plugin_name, BackupUsage.total_bytes)
+            .where(BackupUsage.user_key == user_key, BackupUsage.plugin_name.in_(quotas))
+        )
+        usage = dict(result.all())
+        for scope, quota in quotas.items():
+            used = usage.get(scope, 0)
+            if used + incoming_size > quota:
+                raise _quota_exceeded(scope, used, incoming_size, quota)
+    
+    @staticmethod
+    async def get_usage(db: AsyncSession, user_key: str) -> dict:
+        """
+        获取用户的备份空间用量和配额
+        
+        Returns:
+            dict: 总用量、配额、剩余空间和各插件分项
+        """
+        validate_key_or_raise(user_key, "用户密钥")
+        
+        result = await db.execute(
+            select(BackupUsage)
+            .where(BackupUsage.user_key == user_key)
+            .order_by(BackupUsage.plugin_name)
+        )
+        rows = {row.plugin_name: row for row in result.scalars().all()}
+        total = rows.pop(USAGE_TOTAL, None)
+        total_bytes = total.total_bytes if total else 0
+        quota = settings.BACKUP_UPLOAD_QUOTA_BYTES
+        plugin_quota = settings.BACKUP_PLUGIN_UPLOAD_QUOTA_BYTES
+        return {
+            "user_key": user_key,
+            "total_bytes": total_bytes,
+            "backup_count": total.backup_count if total else 0,
+            "quota_bytes": quota,
+            "remaining_bytes": max(quota - total_bytes, 0) if quota else None,
+            "plugins": [
+                {
+                    "plugin_name": row.plugin_name,
+                    "total_bytes": row.total_bytes,
+                    "backup_count": row.backup_count,
+                    "quota_bytes": plugin_quota,
+                    "remaining_bytes": max(plugin_quota - row.total_bytes, 0) if plugin_quota else None,
+                }
+                for row in rows.values()
+                if row.backup_count > 0
+            ],
+        }
+    
+    @staticmethod
+    async def rebuild_usage(db: AsyncSession) -> int:
+        """
+        按 backups 表重新计算全部用量汇总（不提交）
+        
+        用于已有数据库的首次初始化，返回汇总记录数。会清空整张表，不能与上传、删除并发执行，
+        定期校正使用 repair_usage。
+        """
+        await db.execute(delete(BackupUsage))
+        totals = select(
+            Backup.user_key,
+            literal(USAGE_TOTAL).label("plugin_name"),
+            func.sum(Backup.file_size),
+            func.count(Backup.id),
+        ).group_by(Backup.user_key)
+        per_plugin = select(
+            Backup.user_key,
+            Backup.plugin_name,
+            func.sum(Backup.file_size),
+            func.count(Backup.id),
+        ).where(Backup.plugin_name.is_not(None)).group_by(Backup.user_key, Backup.plugin_name)
+        columns = ["user_key", "plugin_name", "total_bytes", "backup_count"]
+        await db.execute(BackupUsage.__table__.insert().from_select(columns, totals))
+        await db.execute(BackupUsage.__table__.insert().from_select(columns, per_plugin))
+        return (await db.execute(select(func.count()).select_from(BackupUsage))).scalar_one()
+    
+    @staticmethod
+    async def repair_usage(db: AsyncSession) -> int:
+        """
+        校正与 backups 表不一致的用量记录（不提交），返回校正的记录数
+        
+        实际用量与汇总记录在同一条语句中比较（同一快照，上传和删除的备份记录与用量在同一事务中提交），
+        只对有偏差的记录原子地增减差值，与并发的上传、删除互不覆盖。正常情况下没有偏差，不产生写入。
+        """
+        actual_totals = select(
+            Backup.user_key,
+            literal(USAGE_TOTAL).label("plugin_name"),
+            func.sum(Backup.file_size).label("total_bytes"),
+            func.count(Backup.id).label("backup_count"),
+        ).group_by(Backup.user_key)
+        actual_per_plugin = select(
+            Backup.user_key,
+            Backup.plugin_name,
+            func.sum(Backup.file_size),
+            func.count(Backup.id),
+        ).where(Backup.plugin_name.is_not(None)).group_by(Backup.user_key, Backup.plugin_name)
+        recorded = select(
+            BackupUsage.user_key,
+            BackupUsage.plugin_name,
+            -BackupUsage.total_bytes,
+            -BackupUsage.backup_count,
+        )
+        combined = union_all(actual_totals, actual_per_plugin, recorded).subquery()
+        size_drift = func.sum(combined.c.total_bytes)
+        count_drift = func.sum(combined.c.backup_count)
+        drifted = (await db.execute(
+            select(combined.c.user_key, combined.c.plugin_name, size_drift, count_drift)
+            .group_by(combined.c.user_key, combined.c.plugin_name)
+            .having(or_(size_drift != 0, count_drift != 0))
+        )).all()
+        
+        for user_key, scope, size_delta, count_delta in drifted:
+            await BackupService._add_scope_usage(db, user_key, scope, int(size_delta), int(count_delta))
+        return len(drifted)
+    
+    @staticmethod
+    async def ensure_usage(db: AsyncSession) -> None:
+        """用量表为空而已有备份时（从旧版本升级）重建汇总"""
+        has_usage = (await db.execute(select(BackupUsage.user_key).limit(1))).first()
+        has_backups = (await db.execute(select(Backup.id).limit(1))).first()
+        if has_backups and not has_usage:
+            count = await BackupService.rebuild_usage(db)
+            await db.commit()
+            print(f"✓ 已重建备份用量汇总: {count} 条")
+
+
+def _unlink_files(paths: List[Path], grace_before: float) -> int:
+    """删除修改时间早于 grace_before 的文件（不存在的文件忽略），返回删除的字节数"""
+    freed = 0
+    for path in paths:
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime > grace_before:
+            continue
+        path.unlink(missing_ok=True)
+        freed += stat.st_size
+    return freed
 
@@ -0,0 +1,104 @@
+"""
+变更日志服务：记录插件变更并支持长轮询等待
+"""
+import asyncio
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+
+from app.models.change import PluginChange
+from app.services.invalidation_bus import invalidation_bus, CHANGES_KEY
+
+# 变更类型
+VERSION_ADDED = "version_added"
+VERSION_DEPRECATED = "version_deprecated"
+PLUGIN_ENABLED = "plugin_enabled"
+PLUGIN_DISABLED = "plugin_disabled"
+PLUGIN_DEPRECATED = "plugin_deprecated"
+PLUGIN_UNDEPRECATED = "plugin_undeprecated"
+PLUGIN_DELETED = "plugin_deleted"
+
+
+class ChangeNotifier:
+    """
+    变更通知
+
+    等待方先通过 current() 取得事件再查询数据库，查询后无新记录才等待该事件，
+    这样查询与等待之间发生的变更也不会错过。
+    """
+
+    def __init__(self):
+        self._event: Optional[asyncio.Event] = None
+
+    def current(self) -> asyncio.Event:
+        if self._event is None:
+            self._event = asyncio.Event()
+        return self._event
+
+    def notify(self) -> None:
+        if self._event is not None:
+            self._event.set()
+            self._event = None
+
+    @staticmethod
+    async def wait(event: asyncio.Event, timeout: float) -> bool:
+        """等待事件，超时返回 False"""
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+# 全局变更通知（本进程和其他 worker 的变更都会经失效总线触发）
+change_notifier = ChangeNotifier()
+
+
+def _on_invalidation(keys: List[str]) -> None:
+    if CHANGES_KEY in keys:
+        change_notifier.notify()
+
+
+invalidation_bus.add_listener(_on_invalidation)
+
+
+class ChangeService:
+    """变更日志服务"""
+
+    @staticmethod
+    def record(
+        db: AsyncSession,
+        plugin_name: str,
+        action: str,
+        version: Optional[str] = None
+    ) -> None:
+        """
+        追加一条变更记录
+
+        只加入会话，不提交：由调用方在同一事务中和数据修改一起提交，
+        提交后再通过失效总线发布通知。
+        """
+        db.add(PluginChange(plugin_name=plugin_name, version=version, action=action))
+
+    @staticmethod
+    async def get_changes_since(
+        db: AsyncSession,
+        since: int,
+        limit: int
+    ) -> List[PluginChange]:
+        """获取序号大于 since 的变更（按序号升序）"""
+        result = await db.execute(
+            select(PluginChange)
+            .where(PluginChange.seq > since)
+            .order_by(PluginChange.seq)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def get_seq_range(db: AsyncSession) -> tuple[int, int]:
+        """获取当前最小和最大序号，无记录时均为 0"""
+        row = (await db.execute(
+            select(func.min(PluginChange.seq), func.max(PluginChange.seq))
+        )).one()
+        return row[0] or 0, row[1] or 0
@@ -0,0 +1,440 @@
+"""
+下载统计服务：按时间分桶的下载次数
+
+1. 记录：下载时在当前 worker 的内存缓冲区中按 (插件, 版本, 小时) 累加，不访问数据库；
+   每 DOWNLOAD_STATS_FLUSH_INTERVAL 秒以累加方式（count = count + n）批量写入小时桶，
+   多个 worker 写入同一个桶时结果正确。进程崩溃时最多丢失一个刷新周期的统计，
+   正常退出时在 lifespan 关闭阶段刷新。
+2. 压缩：周期任务 compact_download_stats 从小时桶重新汇总日桶、从日桶重新汇总月桶，
+   再按保留天数删除过期的小时桶和日桶。汇总是覆盖写入而不是累加，重复执行结果不变，
+   晚到的小时桶在下一次压缩时被计入。
+3. 查询：热门排行、趋势和版本占比读取汇总桶，扫描的行数与插件/版本数和时间范围成正比，
+   与下载次数无关。汇总桶每个压缩周期才重新计算，因此昨天和今天读取小时桶、本月其余日期读取日桶，
+   刷新到小时桶的下载立即计入，不受压缩周期的延迟影响。
+4. 独立下载者：缓冲区同时收集下载者标识的哈希，刷新时合并到 HyperLogLog 草图
+   （每个版本、每个插件、每个插件每月各一个），并把估计值写入 plugins / plugin_versions 的
+   unique_download_count。同一下载者重复下载不改变草图，也不产生写入。
+
+分桶时间均为 UTC。
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, func, literal, tuple_, and_, or_, String, DateTime
+
+from app.config import settings
+from app.database import AsyncSessionLocal, dialect_insert
+from app.models.download_sketch import DownloadSketch, ALL_VERSIONS, ALL_TIME
+from app.models.download_stat import DownloadStat
+from app.models.plugin import Plugin
+from app.models.version import PluginVersion
+from app.utils.hyperloglog import HyperLogLog, hash_identifier
+
+# 分桶粒度
+HOUR = "hour"
+DAY = "day"
+MONTH = "month"
+
+# 每条 INSERT 写入的最大行数（SQLite 单条语句的参数个数有上限）
+_FLUSH_CHUNK = 500
+
+_PK = ["plugin_name", "granularity", "bucket_start", "version"]
+_SKETCH_PK = ["plugin_name", "version", "period"]
+
+
+def bucket_start(moment: datetime, granularity: str) -> datetime:
+    """时间所在分桶的起点"""
+    if granularity == HOUR:
+        return moment.replace(minute=0, second=0, microsecond=0)
+    if granularity == DAY:
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_buckets(start: datetime, granularity: str, count: int) -> datetime:
+    """分桶起点向后（count 为负时向前）移动 count 个桶"""
+    if granularity == HOUR:
+        return start + timedelta(hours=count)
+    if granularity == DAY:
+        return start + timedelta(days=count)
+    months = start.year * 12 + start.month - 1 + count
+    return start.replace(year=months // 12, month=months % 12 + 1)
+
+
+def _fresh_buckets(granularity: str, since: datetime):
+    """
+    查询 granularity 粒度、从 since 开始的下载次数时读取的统计行条件
+
+    最近的数据使用更细的粒度：昨天和今天读小时桶（昨天最后一个压缩周期的下载可能尚未汇总），
+    月统计中本月其余日期读日桶，更早的读 granularity 粒度的汇总桶。各段互不重叠，按 granularity 归并后
+    与汇总完成后的结果相同。小时桶至少保留一天，昨天的小时桶不会被清理。
+    """
+    hours_from = add_buckets(bucket_start(datetime.utcnow(), DAY), DAY, -1)
+    levels = [(HOUR, hours_from)]
+    if granularity == MONTH:
+        levels.append((DAY, bucket_start(hours_from, MONTH)))
+    if granularity != HOUR:
+        levels.append((granularity, since))
+
+    conditions = []
+    upper = None
+    for level, start in levels:
+        start = max(start, since)
+        condition = and_(DownloadStat.granularity == level, DownloadStat.bucket_start >= start)
+        if upper is not None:
+            condition = and_(condition, DownloadStat.bucket_start < upper)
+        conditions.append(condition)
+        upper = start
+    return or_(*conditions)
+
+
+class DownloadStatsBuffer:
+    """当前 worker 的下载计数缓冲区，定期刷新到小时桶"""
+
+    def __init__(self):
+        self._counts: Dict[Tuple[str, str, datetime], int] = {}
+        # (插件, 版本, 月份) -> 本周期内下载者标识的哈希
+        self._clients: Dict[Tuple[str, str, str], Set[int]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.DOWNLOAD_STATS_FLUSH_INTERVAL > 0
+
+    def record(self, plugin_name: str, version: str, client_id: Optional[str] = None) -> None:
+        """
+        记录一次下载（只修改内存）
+
+        Args:
+            plugin_name: 插件名称
+            version: 版本号
+            client_id: 下载者标识，只保存其哈希，为空时不计入独立下载者
+        """
+        self.record_many(plugin_name, version, 1, [hash_identifier(client_id)] if client_id else [])
+
+    def record_many(self, plugin_name: str, version: str, count: int, client_hashes: Iterable[int]) -> None:
+        """记录同一版本的多次下载（镜像节点批量上报），下载者以 hash_identifier 的哈希值给出"""
+        if not self.enabled:
+            return
+        now = datetime.utcnow()
+        key = (plugin_name, version, bucket_start(now, HOUR))
+        self._counts[key] = self._counts.get(key, 0) + count
+        if client_hashes:
+            self._clients.setdefault((plugin_name, version, f"{now:%Y-%m}"), set()).update(client_hashes)
+
+    @property
+    def pending(self) -> int:
+        """尚未写入数据库的分桶数"""
+        return len(self._counts)
+
+    async def flush(self) -> int:
+        """
+        把缓冲区写入小时桶
+
+        下载次数和独立下载者草图在同一事务中写入。写入失败时数据放回缓冲区，下次刷新时重试。
+
+        Returns:
+            int: 写入的分桶数
+        """
+        if not self._counts and not self._clients:
+            return 0
+        counts, self._counts = self._counts, {}
+        clients, self._clients = self._clients, {}
+        rows = [
+            {"plugin_name": name, "granularity": HOUR, "bucket_start": hour, "version": version, "count": n}
+            for (name, version, hour), n in counts.items()
+        ]
+        try:
+            async with AsyncSessionLocal() as db:
+                for i in range(0, len(rows), _FLUSH_CHUNK):
+                    statement = dialect_insert(DownloadStat).values(rows[i:i + _FLUSH_CHUNK])
+                    await db.execute(statement.on_conflict_do_update(
+                        index_elements=_PK,
+                        set_={"count": DownloadStat.count + statement.excluded.count},
+                    ))
+                if clients:
+                    await self._merge_sketches(db, clients)
+                await db.commit()
+        except Exception:
+            for key, n in counts.items():
+                self._counts[key] = self._counts.get(key, 0) + n
+            for key, hashes in clients.items():
+                self._clients.setdefault(key, set()).update(hashes)
+            raise
+        return len(rows)
+
+    @staticmethod
+    async def _merge_sketches(db: AsyncSession, clients: Dict[Tuple[str, str, str], Set[int]]) -> None:
+        """把本周期的下载者哈希合并到草图，并更新插件和版本的独立下载者估计值（不提交事务）"""
+        pending: Dict[Tuple[str, str, str], Set[int]] = {}
+        for (name, version, month), hashes in clients.items():
+            for key in ((name, version, ALL_TIME), (name, ALL_VERSIONS, ALL_TIME), (name, ALL_VERSIONS, month)):
+                pending.setdefault(key, set()).update(hashes)
+
+        version_estimates: Dict[Tuple[str, str], int] = {}
+        plugin_estimates: Dict[str, int] = {}
+        keys = sorted(pending)
+        for i in range(0, len(keys), _FLUSH_CHUNK):
+            chunk = keys[i:i + _FLUSH_CHUNK]
+            # 先插入空草图占位再加锁读取（SQLite 由插入取得写锁，PostgreSQL 由 FOR UPDATE 锁定行），
+            # 多个 worker 合并同一草图时串行执行，不会互相覆盖
+            await db.execute(
+                dialect_insert(DownloadSketch)
+                .values([
+                    {"plugin_name": name, "version": version, "period": period, "sketch": b"", "estimate": 0}
+                    for name, version, period in chunk
+                ])
+                .on_conflict_do_nothing(index_elements=_SKETCH_PK)
+            )
+            key_columns = (DownloadSketch.plugin_name, DownloadSketch.version, DownloadSketch.period)
+            result = await db.execute(
+                select(*key_columns, DownloadSketch.sketch)
+                .where(tuple_(*key_columns).in_(chunk))
+                .order_by(*key_columns)
+                .with_for_update()
+            )
+            for name, version, period, blob in result.all():
+                sketch = HyperLogLog.from_bytes(blob)
+                if not sketch.add_hashes(pending[(name, version, period)]) and blob:
+                    continue
+                estimate = sketch.count()
+                await db.execute(
+                    update(DownloadSketch)
+                    .where(
+                        DownloadSketch.plugin_name == name,
+                        DownloadSketch.version == version,
+                        DownloadSketch.period == period,
+                    )
+                    .values(sketch=sketch.to_bytes(), estimate=estimate, updated_at=func.now())
+                )
+                if period == ALL_TIME and version == ALL_VERSIONS:
+                    plugin_estimates[name] = estimate
+                elif period == ALL_TIME:
+                    version_estimates[(name, version)] = estimate
+
+        # 与下载计数相同的加锁顺序：先版本后插件
+        for (name, version), estimate in version_estimates.items():
+            await db.execute(
+                update(PluginVersion)
+                .where(PluginVersion.plugin_name == name, PluginVersion.version == version)
+                .values(unique_download_count=estimate)
+                .execution_options(synchronize_session=False)
+            )
+        for name, estimate in plugin_estimates.items():
+            await db.execute(
+                update(Plugin)
+                .where(Plugin.name == name)
+                .values(unique_download_count=estimate, updated_at=Plugin.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+
+    async def start(self) -> None:
+        if self.enabled:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止定期刷新，并写入缓冲区中剩余的计数"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f"⚠️ 下载统计写入失败，丢失 {self.pending} 个分桶: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.DOWNLOAD_STATS_FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ 下载统计写入失败，稍后重试: {e}")
+
+
+# 全局下载计数缓冲区（每个 worker 进程一个）
+download_stats = DownloadStatsBuffer()
+
+
+class DownloadStatsService:
+    """下载统计服务"""
+
+    @staticmethod
+    async def _rollup(db: AsyncSession, source: str, target: str, start: datetime) -> None:
+        """用 source 粒度的桶覆盖写入 target 粒度中起点为 start 的桶"""
+        end = add_buckets(start, target, 1)
+        rows = (
+            select(
+                DownloadStat.plugin_name,
+                literal(target, String),
+                literal(start, DateTime),
+                DownloadStat.version,
+                func.sum(DownloadStat.count),
+            )
+            .where(
+                DownloadStat.granularity == source,
+                DownloadStat.bucket_start >= start,
+                DownloadStat.bucket_start < end,
+            )
+            .group_by(DownloadStat.plugin_name, DownloadStat.version)
+        )
+        statement = dialect_insert(DownloadStat).from_select(
+            ["plugin_name", "granularity", "bucket_start", "version", "count"], rows
+        )
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=_PK,
+            set_={"count": statement.excluded.count},
+        ))
+
+    @staticmethod
+    async def compact() -> dict:
+        """
+        汇总日桶和月桶并清理过期的细粒度桶
+
+        重新汇总所有仍有小时桶的日期，以及这些日期所在及之后的月份。
+        日桶的删除不会早于被重新汇总的最早月份，保证月桶汇总时该月的日桶完整。
+
+        Returns:
+            dict: 压缩报告
+        """
+        now = datetime.utcnow()
+        today = bucket_start(now, DAY)
+        report = {"days": 0, "months": 0, "hours_pruned": 0, "days_pruned": 0}
+
+        async with AsyncSessionLocal() as db:
+            first_hour = (await db.execute(
+                select(func.min(DownloadStat.bucket_start)).where(DownloadStat.granularity == HOUR)
+            )).scalar()
+            if first_hour is not None:
+                day = bucket_start(first_hour, DAY)
+                while day <= today:
+                    await DownloadStatsService._rollup(db, HOUR, DAY, day)
+                    report["days"] += 1
+                    day = add_buckets(day, DAY, 1)
+
+                month = bucket_start(first_hour, MONTH)
+                while month <= today:
+                    await DownloadStatsService._rollup(db, DAY, MONTH, month)
+                    report["months"] += 1
+                    month = add_buckets(month, MONTH, 1)
+
+            if settings.DOWNLOAD_STATS_HOURLY_RETENTION_DAYS > 0:
+                cutoff = today - timedelta(days=settings.DOWNLOAD_STATS_HOURLY_RETENTION_DAYS)
+                result = await db.execute(
+                    delete(DownloadStat).where(DownloadStat.granularity == HOUR, DownloadStat.bucket_start < cutoff)
+                )
+                report["hours_pruned"] = result.rowcount or 0
+
+            if settings.DOWNLOAD_STATS_DAILY_RETENTION_DAYS > 0:
+                cutoff = today - timedelta(days=settings.DOWNLOAD_STATS_DAILY_RETENTION_DAYS)
+                if first_hour is not None:
+                    cutoff = min(cutoff, bucket_start(first_hour, MONTH))
+                result = await db.execute(
+                    delete(DownloadStat).where(DownloadStat.granularity == DAY, DownloadStat.bucket_start < cutoff)
+                )
+                report["days_pruned"] = result.rowcount or 0
+
+            await db.commit()
+        return report
+
+    @staticmethod
+    async def get_top_plugins(db: AsyncSession, days: int, limit: int) -> List[dict]:
+        """最近 days 天（含今天）下载次数最多的插件，已删除的插件不计入"""
+        since = add_buckets(bucket_start(datetime.utcnow(), DAY), DAY, -(days - 1))
+        downloads = func.sum(DownloadStat.count).label("downloads")
+        result = await db.execute(
+            select(Plugin.name, Plugin.display_name, downloads)
+            .select_from(DownloadStat)
+            .join(Plugin, Plugin.name == DownloadStat.plugin_name)
+            .where(_fresh_buckets(DAY, since))
+            .group_by(Plugin.name, Plugin.display_name)
+            .order_by(downloads.desc(), Plugin.name)
+            .limit(limit)
+        )
+        return [
+            {"name": row.name, "display_name": row.display_name, "downloads": int(row.downloads)}
+            for row in result
+        ]
+
+    @staticmethod
+    async def get_trend(db: AsyncSession, plugin_name: str, granularity: str, periods: int) -> List[dict]:
+        """插件最近 periods 个桶（含当前桶）的下载次数，没有下载的桶补 0"""
+        current = bucket_start(datetime.utcnow(), granularity)
+        since = add_buckets(current, granularity, -(periods - 1))
+        result = await db.execute(
+            select(DownloadStat.bucket_start, func.sum(DownloadStat.count).label("downloads"))
+            .where(DownloadStat.plugin_name == plugin_name, _fresh_buckets(granularity, since))
+            .group_by(DownloadStat.bucket_start)
+        )
+        # 最近的数据来自更细粒度的桶，归并到所属的 granularity 桶
+        counts: Dict[datetime, int] = {}
+        for row in result:
+            start = bucket_start(row.bucket_start, granularity)
+            counts[start] = counts.get(start, 0) + int(row.downloads)
+        return [
+            {"bucket_start": start, "downloads": counts.get(start, 0)}
+            for start in (add_buckets(since, granularity, i) for i in range(periods))
+        ]
+
+    @staticmethod
+    async def get_version_share(db: AsyncSession, plugin_name: str, days: int) -> List[dict]:
+        """插件最近 days 天（含今天）各版本的下载次数和占比，按下载次数从多到少排序"""
+        since = add_buckets(bucket_start(datetime.utcnow(), DAY), DAY, -(days - 1))
+        downloads = func.sum(DownloadStat.count).label("downloads")
+        result = await db.execute(
+            select(DownloadStat.version, downloads)
+            .where(DownloadStat.plugin_name == plugin_name, _fresh_buckets(DAY, since))
+            .group_by(DownloadStat.version)
+            .order_by(downloads.desc(), DownloadStat.version)
+        )
+        rows = [(row.version, int(row.downloads)) for row in result]
+        total = sum(n for _, n in rows)
+        return [
+            {"version": version, "downloads": n, "share": round(n / total, 4) if total else 0.0}
+            for version, n in rows
+        ]
+
+    @staticmethod
+    async def get_unique_downloads(db: AsyncSession, plugin_name: str, months: int) -> dict:
+        """
+        插件最近 months 个月（含本月）的独立下载者估计
+
+        各月分别估计，区间合计由各月草图合并后估计（同一下载者跨月只计一次），
+        本周期尚未刷新的下载不计入。
+        """
+        first = add_buckets(bucket_start(datetime.utcnow(), MONTH), MONTH, -(months - 1))
+        periods = [f"{add_buckets(first, MONTH, i):%Y-%m}" for i in range(months)]
+        result = await db.execute(
+            select(DownloadSketch.period, DownloadSketch.sketch)
+            .where(
+                DownloadSketch.plugin_name == plugin_name,
+                DownloadSketch.version == ALL_VERSIONS,
+                DownloadSketch.period.in_(periods + [ALL_TIME]),
+            )
+        )
+        sketches = {period: HyperLogLog.from_bytes(blob) for period, blob in result.all()}
+        merged = HyperLogLog()
+        for period in periods:
+            if period in sketches:
+                merged.merge(sketches[period])
+        all_time = sketches.get(ALL_TIME)
+        return {
+            "unique_downloads": all_time.count() if all_time else 0,
+            "period_unique_downloads": merged.count(),
+            "months": [
+                {"month": period, "unique_downloads": sketches[period].count() if period in sketches else 0}
+                for period in periods
+            ],
+        }
+
+    @staticmethod
+    async def delete_plugin_stats(db: AsyncSession, plugin_name: str) -> None:
+        """删除插件的所有统计和草图（不提交事务）"""
+        await db.execute(delete(DownloadStat).where(DownloadStat.plugin_name == plugin_name))
+        await db.execute(delete(DownloadSketch).where(DownloadSketch.plugin_name == plugin_name))
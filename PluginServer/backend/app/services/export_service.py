@@ -0,0 +1,222 @@
+"""
+静态目录导出：把插件读接口预先生成为静态文件，由 nginx 直接提供
+
+导出目录的结构与 GET 读接口的路径一一对应（JSON 保存为目录下的 index.json，见 frontend/nginx.static.conf）:
+    api/plugins/list/index.json                                  插件列表
+    api/plugins/{name}/index.json                                插件详情（包含版本列表）
+    api/plugins/{name}/download                                  当前版本安装包
+    api/plugins/{name}/versions/index.json                       版本列表
+    api/plugins/{name}/versions/{version}/index.json             版本详情
+    api/plugins/{name}/versions/{version}/download               指定版本安装包
+
+JSON 与接口返回的响应体完全相同；安装包是 UPLOAD_DIR 中文件的硬链接，不额外占用磁盘空间。
+每个文件都先写入临时文件再原子替换，nginx 不会读到写了一半的文件；内容没有变化的文件不会被改写。
+
+增量导出依据变更日志（plugin_changes）：导出目录中记录上次导出时的最大序号，
+之后只重新生成有变更的插件，插件列表每次都重新生成。变更日志已被清理到游标之后时自动全量导出。
+下载次数不产生变更记录，未变更插件的详情中的下载次数只在全量导出时刷新。
+"""
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import select
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.database import AsyncSessionLocal
+from app.models.change import PluginChange
+from app.models.plugin import Plugin
+from app.models.version import PluginVersion
+from app.schemas.common import ApiResponse
+from app.schemas.plugin import PluginResponse, PluginDetailResponse
+from app.schemas.version import VersionResponse, VersionDetailResponse
+from app.services.change_service import ChangeService
+from app.services.plugin_service import PluginService
+
+# 导出目录中记录导出状态的文件（nginx 配置中禁止访问以 . 开头的文件）
+STATE_FILE = ".export-state.json"
+
+
+def _safe_segment(value: str) -> bool:
+    """插件名和版本号作为路径的一段使用，不能包含分隔符或指向上级目录"""
+    return bool(value) and value not in (".", "..") and "/" not in value and "\\" not in value
+
+
+def _write_atomic(path: Path, content: bytes, report: Dict[str, int]) -> None:
+    """内容有变化时写入文件（先写临时文件再替换）"""
+    if path.is_file() and path.read_bytes() == content:
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        temp_path.write_bytes(content)
+        os.replace(temp_path, path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+    report["files_written"] += 1
+
+
+def _link_atomic(source: Path, path: Path, report: Dict[str, int]) -> None:
+    """把安装包硬链接到导出目录，不在同一文件系统时复制"""
+    if path.is_file() and os.path.samefile(source, path):
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        try:
+            os.link(source, temp_path)
+            report["blobs_linked"] += 1
+        except OSError:
+            shutil.copy2(source, temp_path)
+            report["blobs_copied"] += 1
+        os.replace(temp_path, path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+def _remove_stale(directory: Path, keep: Iterable[str]) -> None:
+    """删除 directory 下不在 keep 中的子目录（已删除的版本）"""
+    if not directory.is_dir():
+        return
+    keep = set(keep)
+    for child in directory.iterdir():
+        if child.is_dir() and child.name not in keep:
+            shutil.rmtree(child)
+
+
+class StaticExportService:
+    """静态目录导出服务"""
+
+    @staticmethod
+    def _read_state(dest: Path) -> Optional[int]:
+        try:
+            return int(json.loads((dest / STATE_FILE).read_text(encoding="utf-8"))["last_seq"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    @staticmethod
+    async def export(dest: Path, full: bool = False) -> Dict[str, int]:
+        """
+        导出（或增量更新）静态目录
+
+        Args:
+            dest: 导出目录
+            full: 忽略上次的导出状态，重新生成所有插件
+
+        Returns:
+            Dict[str, int]: 导出统计（full 为 1 表示本次是全量导出）
+        """
+        report = {
+            "full": 0, "plugins_exported": 0, "plugins_removed": 0,
+            "files_written": 0, "blobs_linked": 0, "blobs_copied": 0, "last_seq": 0,
+        }
+        plugins_dir = dest / "api" / "plugins"
+        since = None if full else StaticExportService._read_state(dest)
+
+        async with AsyncSessionLocal() as db:
+            # 先取最大序号再读取数据：之后发生的变更下次导出时会再处理一遍，不会遗漏
+            first_seq, last_seq = await ChangeService.get_seq_range(db)
+            report["last_seq"] = last_seq
+
+            catalog = await PluginService.get_all_plugins(db)
+            existing = {plugin["name"] for plugin in catalog}
+
+            if since is None or first_seq > since + 1 or since > last_seq:
+                report["full"] = 1
+                changed: Set[str] = set(existing)
+                # 导出目录中已不存在于数据库的插件
+                if plugins_dir.is_dir():
+                    changed.update(
+                        child.name for child in plugins_dir.iterdir()
+                        if child.is_dir() and child.name != "list"
+                    )
+            else:
+                result = await db.execute(
+                    select(PluginChange.plugin_name)
+                    .where(PluginChange.seq > since, PluginChange.seq <= last_seq)
+                    .distinct()
+                )
+                changed = set(result.scalars().all())
+
+            changed = {name for name in changed if _safe_segment(name) and name != "list"}
+            plugins: Dict[str, Plugin] = {}
+            versions: Dict[str, List[PluginVersion]] = {name: [] for name in changed}
+            if changed:
+                result = await db.execute(select(Plugin).where(Plugin.name.in_(changed)))
+                plugins = {plugin.name: plugin for plugin in result.scalars().all()}
+                result = await db.execute(
+                    select(PluginVersion)
+                    .where(PluginVersion.plugin_name.in_(changed))
+                    # 与 VersionService.get_versions_by_plugin_name 的顺序相同
+                    .order_by(PluginVersion.created_at.desc(), PluginVersion.version.desc())
+                )
+                for version in result.scalars().all():
+                    versions[version.plugin_name].append(version)
+
+        _write_atomic(
+            plugins_dir / "list" / "index.json",
+            ApiResponse[List[PluginResponse]].ok(data=catalog, message="获取插件列表成功").model_dump_json().encode("utf-8"),
+            report,
+        )
+
+        for name in sorted(changed):
+            plugin_dir = plugins_dir / name
+            plugin = plugins.get(name)
+            if plugin is None:
+                if plugin_dir.exists():
+                    shutil.rmtree(plugin_dir)
+                    report["plugins_removed"] += 1
+                continue
+            StaticExportService._export_plugin(plugin_dir, plugin, versions[name], report)
+            report["plugins_exported"] += 1
+
+        _write_atomic(
+            dest / STATE_FILE,
+            json.dumps({"last_seq": last_seq}).encode("utf-8"),
+            report,
+        )
+        return report
+
+    @staticmethod
+    def _export_plugin(
+        plugin_dir: Path,
+        plugin: Plugin,
+        versions: List[PluginVersion],
+        report: Dict[str, int]
+    ) -> None:
+        """生成单个插件的详情、版本列表、版本详情和安装包链接"""
+        # 与 PluginService.get_plugin_detail 相同：直接设置为已提交状态，避免触发关系的惰性加载
+        set_committed_value(plugin, "versions", versions)
+        _write_atomic(
+            plugin_dir / "index.json",
+            ApiResponse[PluginDetailResponse].ok(data=plugin, message="获取插件详情成功").model_dump_json().encode("utf-8"),
+            report,
+        )
+        _write_atomic(
+            plugin_dir / "versions" / "index.json",
+            ApiResponse[List[VersionResponse]].ok(data=versions, message="获取版本列表成功").model_dump_json().encode("utf-8"),
+            report,
+        )
+
+        exported = [version for version in versions if _safe_segment(version.version)]
+        for version in exported:
+            version_dir = plugin_dir / "versions" / version.version
+            _write_atomic(
+                version_dir / "index.json",
+                ApiResponse[VersionDetailResponse].ok(data=version, message="获取版本详情成功").model_dump_json().encode("utf-8"),
+                report,
+            )
+            source = Path(version.file_path)
+            if source.is_file():
+                _link_atomic(source, version_dir / "download", report)
+                if version.version == plugin.current_version:
+                    _link_atomic(source, plugin_dir / "download", report)
+            else:
+                print(f"⚠️  安装包文件不存在，跳过: {plugin.name}@{version.version}")
+
+        _remove_stale(plugin_dir / "versions", [version.version for version in exported])
+        if not any(version.version == plugin.current_version for version in exported):
+            (plugin_dir / "download").unlink(missing_ok=True)
@@ -1,9 +1,11 @@
 """
 文件服务：处理文件上传、存储和ZIP解析
 """
+import asyncio
+import hashlib
 import json
-import zipfile
 import shutil
+import uuid
 from pathlib import Path
 from typing import Dict, Any, Tuple
 from fastapi import UploadFile, HTTPException
@@ -40,12 +42,58 @@ class FileService:
         # 保存文件
         file_size = 0
         async with aiofiles.open(file_path, 'wb') as f:
-            while chunk := await file.read(8192):
+            while chunk := await file.read(settings.FILE_CHUNK_SIZE):
                 await f.write(chunk)
                 file_size += len(chunk)
         
         return file_path, file_size
     
+    @staticmethod
+    async def save_upload_to_temp(file: UploadFile) -> Tuple[Path, int, str]:
+        """
+        将上传文件流式写入临时目录，同时计算 SHA256
+        
+        数据只读写一遍，不再整体读入内存，也不需要保存后重新读取计算哈希。
+        
+        Args:
+            file: 上传的文件
+            
+        Returns:
+            Tuple[Path, int, str]: (临时文件路径, 文件大小, SHA256 哈希值)
+        """
+        settings.TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        temp_path = settings.TEMP_DIR / f"upload_{uuid.uuid4().hex}.zip"
+        
+        sha256_hash = hashlib.sha256()
+        file_size = 0
+        try:
+            async with aiofiles.open(temp_path, 'wb') as f:
+                while chunk := await file.read(settings.FILE_CHUNK_SIZE):
+                    sha256_hash.update(chunk)
+                    await f.write(chunk)
+                    file_size += len(chunk)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+        
+        return temp_path, file_size, sha256_hash.hexdigest()
+    
+    @staticmethod
+    async def move_to_storage(temp_path: Path, plugin_name: str, version: str) -> Path:
+        """
+        将临时文件移动到插件存储目录
+        
+        同一文件系统上只是一次重命名；跨文件系统时退化为复制（在线程中执行）。
+        
+        Returns:
+            Path: 最终文件路径 {UPLOAD_DIR}/{plugin_name}/{plugin_name}@{version}.zip
+        """
+        plugin_dir = settings.UPLOAD_DIR / plugin_name
+        plugin_dir.mkdir(parents=True, exist_ok=True)
+        file_path = plugin_dir / f"{plugin_name}@{version}.zip"
+        await asyncio.to_thread(shutil.move, str(temp_path), str(file_path))
+        return file_path
+    
     @staticmethod
     async def parse_plugin_json(file_path: Path) -> Dict[str, Any]:
         """
@@ -60,6 +108,9 @@ class FileService:
         Raises:
             HTTPException: 解析失败
         """
+        # 延迟导入：只有上传插件时才需要解析 ZIP
+        import zipfile
+        
         try:
             with zipfile.ZipFile(file_path, 'r') as zip_ref:
                 # 查找根目录的plugin.json
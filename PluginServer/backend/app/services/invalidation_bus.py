@@ -0,0 +1,294 @@
+"""
+缓存失效总线：在多个 worker 进程之间广播缓存失效消息
+
+服务层在每次修改数据并提交事务后调用 invalidation_bus.publish(...)，
+当前进程立即清除本地缓存，其他 worker 通过传输层收到消息后清除各自的缓存。
+
+传输方式（配置项 CACHE_BUS_TRANSPORT）:
+- local     仅当前进程（单 worker 部署）
+- database  数据库失效日志表，各 worker 按自增序号轮询新消息，适用于共享同一数据库的多主机部署
+- unix      Unix 数据报套接字，同一主机上的 worker 互相直接投递，延迟最低
+"""
+import asyncio
+import json
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from app.config import settings
+from app.utils.cache import invalidate_local
+
+# 插件列表缓存键
+CATALOG_KEY = "catalog"
+
+# 变更日志有新记录（触发变更订阅的等待方，不对应实际缓存）
+CHANGES_KEY = "changes"
+
+
+def plugin_key(name: str) -> str:
+    """单个插件的缓存键"""
+    return f"plugin:{name}"
+
+
+class LocalTransport:
+    """仅在当前进程内生效的传输方式"""
+
+    name = "local"
+
+    async def start(self, deliver: Callable[[List[str]], None]) -> None:
+        pass
+
+    async def publish(self, keys: List[str]) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class DatabaseTransport:
+    """
+    基于数据库失效日志表的传输方式
+
+    发布时插入 cache_invalidations 记录；后台任务定期查询 seq 大于上次位置的记录，
+    查询只走主键索引，开销很小。旧记录按 CACHE_BUS_RETENTION 定期清理。
+    """
+
+    name = "database"
+
+    def __init__(self, origin: str, poll_interval: float, retention: float):
+        self.origin = origin
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.last_seq = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Callable[[List[str]], None]) -> None:
+        from sqlalchemy import func, select
+        from app.database import AsyncSessionLocal
+        from app.models.cache_invalidation import CacheInvalidation
+
+        # 只关心启动之后的消息：启动时本地缓存为空
+        async with AsyncSessionLocal() as db:
+            self.last_seq = (await db.execute(select(func.max(CacheInvalidation.seq)))).scalar() or 0
+        self._task = asyncio.create_task(self._poll(deliver))
+
+    async def publish(self, keys: List[str]) -> None:
+        from app.database import AsyncSessionLocal
+        from app.models.cache_invalidation import CacheInvalidation
+
+        async with AsyncSessionLocal() as db:
+            db.add_all(CacheInvalidation(cache_key=key, origin=self.origin) for key in keys)
+            await db.commit()
+
+    async def _poll(self, deliver: Callable[[List[str]], None]) -> None:
+        from sqlalchemy import delete, select
+        from app.database import AsyncSessionLocal
+        from app.models.cache_invalidation import CacheInvalidation
+
+        loop = asyncio.get_running_loop()
+        next_prune = loop.time() + self.retention
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    rows = (await db.execute(
+                        select(CacheInvalidation.seq, CacheInvalidation.cache_key, CacheInvalidation.origin)
+                        .where(CacheInvalidation.seq > self.last_seq)
+                        .order_by(CacheInvalidation.seq)
+                        .limit(1000)
+                    )).all()
+                    if rows:
+                        self.last_seq = rows[-1].seq
+                        keys = [row.cache_key for row in rows if row.origin != self.origin]
+                        if keys:
+                            deliver(keys)
+
+                    # 清理过期消息（所有 worker 都可能执行，删除操作是幂等的）
+                    if loop.time() >= next_prune:
+                        next_prune = loop.time() + self.retention
+                        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+                        await db.execute(
+                            delete(CacheInvalidation).where(CacheInvalidation.created_at < cutoff)
+                        )
+                        await db.commit()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ 缓存失效轮询失败: {e}")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    def __init__(self, deliver: Callable[[List[str]], None]):
+        self.deliver = deliver
+
+    def datagram_received(self, data: bytes, addr) -> None:
+        try:
+            keys = json.loads(data.decode("utf-8"))
+        except ValueError:
+            return
+        if isinstance(keys, list):
+            self.deliver([str(key) for key in keys])
+
+
+class UnixSocketTransport:
+    """
+    基于 Unix 数据报套接字的传输方式（仅限同一主机）
+
+    每个 worker 在 CACHE_BUS_SOCKET_DIR 下绑定 {pid}.sock，
+    发布时向目录下其他所有套接字发送一个数据报。已退出 worker 遗留的套接字文件在发送失败时删除。
+    """
+
+    name = "unix"
+
+    # 单个数据报携带的最大键数量
+    KEYS_PER_DATAGRAM = 100
+
+    def __init__(self, socket_dir: Path):
+        self.socket_dir = socket_dir
+        self.path: Optional[Path] = None
+        self._endpoint = None
+        self._sender: Optional[socket.socket] = None
+
+    async def start(self, deliver: Callable[[List[str]], None]) -> None:
+        self.socket_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.socket_dir / f"{os.getpid()}.sock"
+        self.path.unlink(missing_ok=True)
+
+        # 自行创建并绑定套接字，uvloop 不接受字符串形式的 local_addr
+        receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        receiver.bind(str(self.path))
+        receiver.setblocking(False)
+        loop = asyncio.get_running_loop()
+        self._endpoint, _ = await loop.create_datagram_endpoint(
+            lambda: _DatagramProtocol(deliver),
+            sock=receiver,
+        )
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+
+    async def publish(self, keys: List[str]) -> None:
+        payloads = [
+            json.dumps(keys[i:i + self.KEYS_PER_DATAGRAM]).encode("utf-8")
+            for i in range(0, len(keys), self.KEYS_PER_DATAGRAM)
+        ]
+        for peer in self.socket_dir.glob("*.sock"):
+            if peer == self.path:
+                continue
+            for payload in payloads:
+                try:
+                    self._sender.sendto(payload, str(peer))
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # 对端进程已退出
+                    peer.unlink(missing_ok=True)
+                    break
+                except BlockingIOError:
+                    # 对端接收缓冲区已满，丢弃消息（缓存仍会按 TTL 过期）
+                    print(f"⚠️ 缓存失效消息投递失败（缓冲区已满）: {peer.name}")
+                    break
+
+    async def stop(self) -> None:
+        if self._endpoint:
+            self._endpoint.close()
+            self._endpoint = None
+        if self._sender:
+            self._sender.close()
+            self._sender = None
+        if self.path:
+            self.path.unlink(missing_ok=True)
+
+
+class InvalidationBus:
+    """缓存失效总线"""
+
+    def __init__(self):
+        # 进程标识，数据库传输用它跳过自己发布的消息
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.transport = LocalTransport()
+        self.published = 0
+        self.received = 0
+        self._listeners: List[Callable[[List[str]], None]] = []
+
+    def add_listener(self, callback: Callable[[List[str]], None]) -> None:
+        """注册失效消息监听器（本地发布和远端消息都会触发）"""
+        self._listeners.append(callback)
+
+    def _deliver(self, keys: List[str]) -> None:
+        """处理远端 worker 发来的失效消息"""
+        self.received += len(keys)
+        self._apply(keys)
+
+    def _apply(self, keys: List[str]) -> None:
+        invalidate_local(keys)
+        for callback in self._listeners:
+            try:
+                callback(keys)
+            except Exception as e:
+                print(f"⚠️ 缓存失效监听器出错: {e}")
+
+    async def start(self) -> None:
+        """按配置创建传输层并开始接收消息（应用启动时调用）"""
+        # fork 出的 worker 继承了父进程的对象，重新生成进程标识
+        self.origin = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        transport = settings.CACHE_BUS_TRANSPORT.lower()
+        if transport == "database":
+            self.transport = DatabaseTransport(
+                self.origin,
+                settings.CACHE_BUS_POLL_INTERVAL_MS / 1000,
+                settings.CACHE_BUS_RETENTION,
+            )
+        elif transport == "unix":
+            self.transport = UnixSocketTransport(settings.CACHE_BUS_SOCKET_DIR)
+        elif transport == "local":
+            self.transport = LocalTransport()
+        else:
+            raise ValueError(f"未知的缓存失效传输方式: {settings.CACHE_BUS_TRANSPORT}")
+        await self.transport.start(self._deliver)
+
+    async def stop(self) -> None:
+        await self.transport.stop()
+        self.transport = LocalTransport()
+
+    async def publish(self, *keys: str) -> None:
+        """
+        发布失效消息
+
+        必须在数据库事务提交之后调用，否则其他 worker 可能在提交前重新加载到旧数据。
+        发布失败只打印警告，不影响已经成功的修改操作（缓存仍会按 TTL 过期）。
+        """
+        unique_keys = list(dict.fromkeys(keys))
+        if not unique_keys:
+            return
+        self._apply(unique_keys)
+        self.published += len(unique_keys)
+        try:
+            await self.transport.publish(unique_keys)
+        except Exception as e:
+            print(f"⚠️ 缓存失效消息发布失败: {e}")
+
+    async def publish_plugin(self, name: str) -> None:
+        """发布某个插件及插件列表的失效消息，并通知变更订阅"""
+        await self.publish(CATALOG_KEY, plugin_key(name), CHANGES_KEY)
+
+    def stats(self) -> dict:
+        return {
+            "transport": self.transport.name,
+            "origin": self.origin,
+            "published": self.published,
+            "received": self.received,
+        }
+
+
+# 全局失效总线实例
+invalidation_bus = InvalidationBus()
@@ -0,0 +1,358 @@
+"""
+后台任务服务：持久化任务队列
+
+用法:
+    # 注册处理函数（处理函数自行打开数据库会话，参数为 JSON 可序列化的 dict，
+    # 可返回 dict 作为执行结果保存）
+    @register_job("verify_package")
+    async def verify_package(payload: dict) -> None: ...
+
+    # 在业务事务中入队，随业务数据一起提交；提交后调用 job_queue.publish() 唤醒各进程的 worker
+    await JobService.enqueue(db, "verify_package", {...}, job_key="verify:a@1.0.0")
+
+    # 周期任务：每个周期用 {job_type}:{周期序号} 作为幂等键入队，多个进程中只有一个会执行
+    job_queue.add_periodic("backup_gc", lambda: settings.BACKUP_GC_INTERVAL)
+
+worker 协程在应用启动（lifespan）时由 job_queue.start() 创建。
+失败的任务按指数退避重试，超过 max_attempts 后标记为 failed。
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, delete, func, or_, and_
+from fastapi import HTTPException
+
+from app.config import settings
+from app.database import AsyncSessionLocal, dialect_insert
+from app.models.job import Job
+from app.services.invalidation_bus import invalidation_bus
+
+# 有新任务入队（唤醒各 worker 的等待，不对应实际缓存）
+JOBS_KEY = "jobs"
+
+# 任务状态
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# worker 循环出错（例如数据库暂时不可用）后的最长退避时间（秒）
+MAX_WORKER_BACKOFF = 60.0
+
+JobHandler = Callable[[dict], Awaitable[Optional[dict]]]
+
+
+class PermanentJobError(Exception):
+    """不可重试的任务错误（如数据已损坏），抛出后任务直接标记为 failed"""
+
+
+# 任务类型 -> 处理函数
+_handlers: Dict[str, JobHandler] = {}
+
+
+def register_job(job_type: str):
+    """注册任务处理函数的装饰器"""
+    def decorator(func: JobHandler) -> JobHandler:
+        _handlers[job_type] = func
+        return func
+    return decorator
+
+
+def _utcnow() -> datetime:
+    # 与数据库 CURRENT_TIMESTAMP 一致，使用不带时区的 UTC 时间
+    return datetime.utcnow()
+
+
+class JobService:
+    """后台任务服务"""
+
+    @staticmethod
+    async def enqueue(
+        db: AsyncSession,
+        job_type: str,
+        payload: Optional[dict] = None,
+        job_key: Optional[str] = None,
+        delay: float = 0,
+        max_attempts: Optional[int] = None
+    ) -> str:
+        """
+        入队任务（幂等）
+
+        相同 job_key 的任务已存在时不做任何操作。只执行插入，不提交，由调用方提交事务。
+
+        Args:
+            db: 数据库会话
+            job_type: 任务类型
+            payload: 任务参数
+            job_key: 幂等键，默认为 {job_type}:{payload JSON}
+            delay: 延迟执行（秒）
+            max_attempts: 最大执行次数，默认 JOB_MAX_ATTEMPTS
+
+        Returns:
+            str: 任务幂等键
+        """
+        if job_type not in _handlers:
+            raise ValueError(f"未注册的任务类型: {job_type}")
+        payload_json = json.dumps(payload or {}, ensure_ascii=False, sort_keys=True)
+        job_key = job_key or f"{job_type}:{payload_json}"
+        statement = dialect_insert(Job).values(
+            job_key=job_key,
+            job_type=job_type,
+            payload=payload_json,
+            status=PENDING,
+            attempts=0,
+            max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+            run_after=_utcnow() + timedelta(seconds=delay),
+        ).on_conflict_do_nothing(index_elements=["job_key"])
+        await db.execute(statement)
+        return job_key
+
+    @staticmethod
+    async def get_job_by_key(db: AsyncSession, job_key: str) -> Optional[Job]:
+        """根据幂等键获取任务"""
+        result = await db.execute(select(Job).where(Job.job_key == job_key))
+        return result.scalar_one_or_none()
+
+    @staticmethod
+    async def get_jobs(db: AsyncSession, status: Optional[str] = None, limit: int = 100) -> List[Job]:
+        """获取最近的任务（管理员用）"""
+        query = select(Job).order_by(Job.id.desc()).limit(limit)
+        if status:
+            query = query.where(Job.status == status)
+        result = await db.execute(query)
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def prune_finished(db: AsyncSession, older_than: datetime) -> int:
+        """删除早于指定时间完成的成功任务，返回删除数量（不提交）"""
+        result = await db.execute(
+            delete(Job).where(Job.status == SUCCEEDED, Job.finished_at < older_than)
+        )
+        return result.rowcount or 0
+
+    @staticmethod
+    async def retry_job(db: AsyncSession, job_key: str) -> Job:
+        """将失败的任务重新置为待执行"""
+        job = await JobService.get_job_by_key(db, job_key)
+        if not job:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        if job.status != FAILED:
+            raise HTTPException(status_code=409, detail=f"只能重试失败的任务，当前状态: {job.status}")
+        
+        job.status = PENDING
+        job.attempts = 0
+        job.run_after = _utcnow()
+        job.finished_at = None
+        await db.commit()
+        await db.refresh(job)
+        return job
+
+
+class JobQueue:
+    """在当前进程中运行任务 worker 协程"""
+
+    def __init__(self):
+        # 进程标识 host:pid，各 worker 协程的标识为 host:pid#序号
+        self.worker_id = ""
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._periodic: Dict[str, Callable[[], float]] = {}
+        invalidation_bus.add_listener(self._on_invalidation)
+
+    def notify(self) -> None:
+        """唤醒空闲的 worker（新任务入队后调用）"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def add_periodic(self, job_type: str, interval: Callable[[], float]) -> None:
+        """
+        注册周期任务
+        
+        Args:
+            job_type: 已注册的任务类型
+            interval: 返回周期（秒）的函数，启动时读取，小于等于 0 表示不调度
+        """
+        self._periodic[job_type] = interval
+
+    def _on_invalidation(self, keys: List[str]) -> None:
+        if JOBS_KEY in keys:
+            self.notify()
+
+    async def start(self, concurrency: int) -> None:
+        if concurrency <= 0:
+            return
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._run(f"{self.worker_id}#{i}")) for i in range(concurrency)]
+        for job_type, interval in self._periodic.items():
+            seconds = interval()
+            if seconds > 0:
+                self._tasks.append(asyncio.create_task(self._schedule(job_type, seconds)))
+
+    async def stop(self) -> None:
+        """停止 worker；正在执行的任务被取消后保持 running，锁超时后由其他 worker 重新领取"""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def publish(self) -> None:
+        """通知所有 worker 进程有新任务（业务事务提交后调用）"""
+        await invalidation_bus.publish(JOBS_KEY)
+
+    async def _schedule(self, job_type: str, interval: float) -> None:
+        """按周期入队任务；周期序号相同的幂等键保证每个周期只执行一次"""
+        while not self._stopping:
+            period = int(time.time() // interval)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await JobService.enqueue(db, job_type, job_key=f"{job_type}:{period}")
+                    await db.commit()
+                self.notify()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ 周期任务入队失败: {job_type}: {e}")
+            # 睡到下一个周期开始
+            await asyncio.sleep((period + 1) * interval - time.time())
+
+    async def _claim(self, worker_id: str) -> Optional[Job]:
+        """
+        领取一个可执行的任务（locked_by 记为 worker_id）
+
+        先查询候选任务，再用带状态条件的 UPDATE 抢占，多个 worker 同时抢同一任务时只有一个成功。
+        """
+        now = _utcnow()
+        stale_before = now - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+        claimable = or_(
+            and_(Job.status == PENDING, Job.run_after <= now),
+            and_(Job.status == RUNNING, Job.locked_at < stale_before),
+        )
+        async with AsyncSessionLocal() as db:
+            candidates = (await db.execute(
+                select(Job.id).where(claimable).order_by(Job.run_after, Job.id).limit(8)
+            )).scalars().all()
+            for job_id in candidates:
+                result = await db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, claimable)
+                    .values(
+                        status=RUNNING,
+                        locked_by=worker_id,
+                        locked_at=now,
+                        attempts=Job.attempts + 1,
+                    )
+                )
+                await db.commit()
+                if result.rowcount == 1:
+                    return await db.get(Job, job_id)
+        return None
+
+    async def _seconds_until_next(self) -> float:
+        """距离最早一个等待重试的任务到期的秒数，最多 JOB_POLL_INTERVAL"""
+        async with AsyncSessionLocal() as db:
+            next_run = (await db.execute(
+                select(func.min(Job.run_after)).where(Job.status == PENDING)
+            )).scalar()
+        if next_run is None:
+            return settings.JOB_POLL_INTERVAL
+        if isinstance(next_run, str):
+            next_run = datetime.fromisoformat(next_run)
+        remaining = (next_run - _utcnow()).total_seconds()
+        return min(max(remaining, 0.05), settings.JOB_POLL_INTERVAL)
+
+    async def _finish(self, job: Job, error: Optional[str], result: Optional[dict] = None) -> None:
+        values = {"locked_by": None, "locked_at": None}
+        if error is None:
+            values.update(
+                status=SUCCEEDED,
+                finished_at=_utcnow(),
+                last_error=None,
+                result=json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+            )
+        elif job.attempts >= job.max_attempts:
+            values.update(status=FAILED, finished_at=_utcnow(), last_error=error)
+            print(f"❌ 任务失败（已达最大重试次数）: {job.job_key}")
+        else:
+            # 指数退避 + 随机抖动
+            backoff = min(
+                settings.JOB_RETRY_BACKOFF * (2 ** (job.attempts - 1)),
+                settings.JOB_RETRY_BACKOFF_MAX,
+            )
+            backoff *= random.uniform(0.8, 1.2)
+            values.update(status=PENDING, run_after=_utcnow() + timedelta(seconds=backoff), last_error=error)
+        async with AsyncSessionLocal() as db:
+            # 只更新仍由本 worker 持有的任务（job.locked_by 为领取时写入的标识），锁超时后被他人领取的任务不覆盖
+            await db.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.locked_by == job.locked_by, Job.status == RUNNING)
+                .values(**values)
+            )
+            await db.commit()
+
+    async def _execute(self, job: Job) -> None:
+        handler = _handlers.get(job.job_type)
+        if handler is None:
+            await self._finish(job, f"未注册的任务类型: {job.job_type}")
+            return
+        try:
+            result = await handler(json.loads(job.payload or "{}"))
+        except asyncio.CancelledError:
+            raise
+        except PermanentJobError as e:
+            job.attempts = job.max_attempts
+            await self._finish(job, str(e))
+            return
+        except Exception as e:
+            if settings.DEBUG:
+                traceback.print_exc()
+            await self._finish(job, f"{type(e).__name__}: {e}")
+            return
+        await self._finish(job, None, result)
+
+    async def _run(self, worker_id: str) -> None:
+        failures = 0
+        while not self._stopping:
+            try:
+                job = await self._claim(worker_id)
+                failures = 0
+                if job is not None:
+                    await self._execute(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # 数据库暂时不可用等错误：退避后继续，worker 不退出
+                # 未能写入结果的任务保持 running，锁超时后重新领取
+                failures += 1
+                backoff = min(2.0 ** (failures - 1), MAX_WORKER_BACKOFF)
+                print(f"⚠️ 后台任务 worker {worker_id} 出错，{backoff:.0f}s 后重试: {e}")
+                await asyncio.sleep(backoff)
+                continue
+
+            # 没有可执行的任务：等待新任务通知、最早的重试到期或轮询间隔
+            self._wakeup.clear()
+            try:
+                timeout = await self._seconds_until_next()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                timeout = settings.JOB_POLL_INTERVAL
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+# 全局任务队列实例
+job_queue = JobQueue()
@@ -0,0 +1,165 @@
+"""
+后台任务处理函数
+
+处理函数通过 register_job 注册，参数为入队时的 payload，自行打开数据库会话。
+抛出 PermanentJobError 表示不可重试的失败，其他异常按退避策略重试。
+"""
+import asyncio
+from pathlib import Path
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.migrations.data import DATA_MIGRATIONS, get_states, pending_migrations, run_data_migration
+from app.services.download_stats import DownloadStatsService
+from app.services.invalidation_bus import invalidation_bus, CATALOG_KEY
+from app.services.job_service import JobService, register_job, job_queue, PermanentJobError
+from app.services.retention_service import RetentionService
+from app.services.version_service import VersionService
+from app.utils.hash import calculate_file_hash
+
+# 任务类型
+VERIFY_PACKAGE = "verify_package"
+BACKUP_GC = "backup_gc"
+DATA_MIGRATION = "data_migration"
+REPAIR_DOWNLOAD_COUNTS = "repair_download_counts"
+COMPACT_DOWNLOAD_STATS = "compact_download_stats"
+
+
+def _test_zip(file_path: Path):
+    """检查 ZIP 中所有条目的 CRC，返回第一个损坏的条目名（在线程中运行）"""
+    import zipfile
+    
+    with zipfile.ZipFile(file_path, "r") as zip_ref:
+        return zip_ref.testzip()
+
+
+@register_job(VERIFY_PACKAGE)
+async def verify_package(payload: dict) -> None:
+    """
+    上传后校验插件包
+    
+    重新读取已落盘的文件，确认哈希与版本记录一致，并检查 ZIP 内所有条目的 CRC。
+    """
+    async with AsyncSessionLocal() as db:
+        version = await VersionService.get_version(db, payload["plugin_name"], payload["version"])
+    if version is None:
+        # 版本已被删除，无需校验
+        return
+    
+    file_path = Path(version.file_path)
+    if not file_path.exists():
+        raise PermanentJobError(f"插件包文件不存在: {file_path}")
+    
+    file_hash = await calculate_file_hash(file_path)
+    if file_hash != version.file_hash:
+        raise PermanentJobError(f"插件包哈希不一致: 记录 {version.file_hash}，实际 {file_hash}")
+    
+    bad_entry = await asyncio.to_thread(_test_zip, file_path)
+    if bad_entry is not None:
+        raise PermanentJobError(f"插件包条目 CRC 校验失败: {bad_entry}")
+
+
+@register_job(BACKUP_GC)
+async def backup_gc(payload: dict) -> dict:
+    """
+    执行备份保留策略并清理孤儿文件
+    
+    payload 可选 retention / orphans（默认均为 True），返回清理报告。
+    """
+    report = await RetentionService.run(
+        retention=payload.get("retention", True),
+        orphans=payload.get("orphans", True),
+    )
+    if report["retention_deleted"] or report["orphan_files"] or report["temp_files"]:
+        print(
+            f"✓ 存储清理完成: 删除备份 {report['retention_deleted']} 个, "
+            f"孤儿文件 {report['orphan_files']} 个, 临时文件 {report['temp_files']} 个, "
+            f"释放 {(report['retention_bytes'] + report['orphan_bytes']) / 1024 / 1024:.1f}MB"
+        )
+    return report
+
+
+# 按 BACKUP_GC_INTERVAL 周期执行，多个进程中每个周期只执行一次
+job_queue.add_periodic(BACKUP_GC, lambda: settings.BACKUP_GC_INTERVAL)
+
+
+async def _enqueue_data_migration(name: str) -> None:
+    """
+    入队数据迁移任务
+    
+    幂等键带上已执行的批次数：多个 worker 同时启动时只入队一次，
+    每段执行完后入队的下一段键不同。
+    """
+    async with AsyncSessionLocal() as db:
+        state = (await get_states(db)).get(name)
+        batches = state.batches if state else 0
+        await JobService.enqueue(
+            db, DATA_MIGRATION, {"name": name}, job_key=f"{DATA_MIGRATION}:{name}:{batches}"
+        )
+        await db.commit()
+    await job_queue.publish()
+
+
+async def enqueue_pending_data_migrations() -> None:
+    """应用启动时为未完成的数据迁移入队后台任务"""
+    for name in await pending_migrations():
+        await _enqueue_data_migration(name)
+
+
+@register_job(DATA_MIGRATION)
+async def data_migration(payload: dict) -> dict:
+    """
+    分批执行数据迁移
+    
+    每个任务最多执行 DATA_MIGRATION_SLICE 秒，未完成时入队下一段，
+    避免单个任务超过锁超时被其他 worker 重复领取。
+    """
+    name = payload["name"]
+    if name not in DATA_MIGRATIONS:
+        raise PermanentJobError(f"未知的数据迁移: {name}")
+    
+    done = await run_data_migration(name, time_limit=settings.DATA_MIGRATION_SLICE)
+    if not done:
+        await _enqueue_data_migration(name)
+    return {"name": name, "done": done}
+
+
+@register_job(REPAIR_DOWNLOAD_COUNTS)
+async def repair_download_counts(payload: dict) -> dict:
+    """
+    按版本下载次数重新统计插件的 total_download_count
+    
+    按插件名分批，每批一个短事务。冗余字段与版本下载次数同事务更新，正常情况下校正数为 0；
+    不为 0 说明有绕过服务层的写入（如手工修改数据库）。
+    """
+    cursor, batches, repaired = None, 0, 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            cursor, rows = await VersionService.recount_download_totals(
+                db, cursor, settings.DATA_MIGRATION_BATCH_SIZE
+            )
+            await db.commit()
+        batches += 1
+        repaired += rows
+        if cursor is None:
+            break
+        await asyncio.sleep(settings.DATA_MIGRATION_BATCH_PAUSE)
+    
+    if repaired:
+        print(f"⚠️ 已校正 {repaired} 个插件的总下载次数")
+        await invalidation_bus.publish(CATALOG_KEY)
+    return {"batches": batches, "repaired": repaired}
+
+
+# 按 DOWNLOAD_COUNT_REPAIR_INTERVAL 周期校正
+job_queue.add_periodic(REPAIR_DOWNLOAD_COUNTS, lambda: settings.DOWNLOAD_COUNT_REPAIR_INTERVAL)
+
+
+@register_job(COMPACT_DOWNLOAD_STATS)
+async def compact_download_stats(payload: dict) -> dict:
+    """从小时桶汇总下载统计的日桶和月桶，并清理过期的分桶"""
+    return await DownloadStatsService.compact()
+
+
+# 按 DOWNLOAD_STATS_COMPACT_INTERVAL 周期压缩
+job_queue.add_periodic(COMPACT_DOWNLOAD_STATS, lambda: settings.DOWNLOAD_STATS_COMPACT_INTERVAL)
@@ -0,0 +1,372 @@
+"""
+镜像节点服务（pull-through 缓存）
+
+设置 MIRROR_UPSTREAM 后本实例以镜像节点模式运行，供网络较慢的办公室就近部署:
+- 插件列表、详情、版本列表和版本详情转发到上游服务器的 GET 接口，响应按键缓存。
+  MIRROR_CACHE_TTL 内直接返回缓存；过期后携带 If-None-Match 向上游重新验证，未变化时上游只返回 304。
+  上游不可用时继续返回缓存的旧数据。
+- 安装包第一次被请求时从上游下载，校验 file_hash 后保存到 MIRROR_DIR，之后的下载直接发送本地文件。
+  文件按哈希命名（内容寻址），同名版本的文件在上游被替换后会重新下载，不会返回旧内容。
+
+同一个键的并发回源请求通过 SingleFlight 合并，集中启动时每个视图和每个安装包只向上游请求一次。
+缓存键与 app.utils.cache 的层级命名一致，可以在 /api/system/metrics 中看到命中情况。
+
+配置 MIRROR_REPORT_TOKEN 后，本地发送的下载（含下载链接和批量下载）在内存中按版本累加，
+每 DOWNLOAD_STATS_FLUSH_INTERVAL 秒批量上报给上游（/api/stats/mirror-downloads），下载者标识只上报哈希。
+上游据此计入下载次数、分时统计和独立下载者估计，并且不再计入镜像节点回源的下载。
+上报失败时数据留在缓冲区中下次重试；进程崩溃时最多丢失一个上报周期的计数。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+from urllib.parse import quote
+
+import aiofiles
+import httpx
+from fastapi import HTTPException
+
+from app.config import settings
+from app.services.invalidation_bus import plugin_key
+from app.utils.cache import TTLCache
+from app.utils.client import MIRROR_TOKEN_HEADER
+from app.utils.hyperloglog import hash_identifier
+from app.utils.singleflight import SingleFlight
+
+_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# 每次上报的最大版本数（与上游 MirrorDownloadReport 的上限对应）
+_REPORT_CHUNK = 500
+
+
+@dataclass(frozen=True)
+class UpstreamView:
+    """缓存的上游响应（ApiResponse JSON）"""
+    body: bytes
+    etag: str
+    fresh_until: float
+
+    @property
+    def data(self) -> Any:
+        return json.loads(self.body)["data"]
+
+
+@dataclass(frozen=True)
+class MirrorPackage:
+    """本地保存的安装包"""
+    plugin_name: str
+    version: str
+    file_name: str
+    file_path: Path
+    file_hash: str
+    file_size: int
+
+
+# 上游响应只靠重新验证更新，不设过期时间
+_views = TTLCache("mirror_views", max_entries=8192)
+_view_fetches = SingleFlight("mirror_views")
+_blob_fetches = SingleFlight("mirror_blobs")
+_client: Optional[httpx.AsyncClient] = None
+# (插件, 版本) -> [下载次数, 下载者标识的哈希]，等待上报给上游
+_downloads: Dict[Tuple[str, str], List] = {}
+_report_task: Optional[asyncio.Task] = None
+
+
+def _upstream_message(response: httpx.Response) -> str:
+    """上游错误响应中的提示信息"""
+    try:
+        return response.json().get("message") or response.reason_phrase
+    except ValueError:
+        return response.reason_phrase
+
+
+class MirrorService:
+    """镜像节点服务"""
+
+    @staticmethod
+    def reporting() -> bool:
+        """是否向上游上报下载次数"""
+        return bool(settings.MIRROR_REPORT_TOKEN) and settings.DOWNLOAD_STATS_FLUSH_INTERVAL > 0
+
+    @staticmethod
+    async def start() -> None:
+        """创建到上游服务器的连接池并启动下载次数上报（应用启动时调用）"""
+        global _client, _report_task
+        headers = {"User-Agent": f"MicroDock-Mirror/{settings.APP_VERSION}"}
+        if settings.MIRROR_REPORT_TOKEN:
+            # 上游据此识别镜像节点，回源下载不计入下载次数
+            headers[MIRROR_TOKEN_HEADER] = settings.MIRROR_REPORT_TOKEN
+        _client = httpx.AsyncClient(
+            base_url=settings.MIRROR_UPSTREAM.rstrip("/"),
+            timeout=settings.MIRROR_TIMEOUT,
+            headers=headers,
+        )
+        if MirrorService.reporting():
+            _report_task = asyncio.create_task(MirrorService._report_loop())
+
+    @staticmethod
+    async def stop() -> None:
+        """停止定期上报并上报剩余的下载次数，然后关闭连接池"""
+        global _client, _report_task
+        if _report_task is not None:
+            _report_task.cancel()
+            try:
+                await _report_task
+            except asyncio.CancelledError:
+                pass
+            _report_task = None
+        if _client is not None:
+            try:
+                await MirrorService.report_downloads()
+            except Exception as e:
+                print(f"⚠️ 下载次数上报失败，丢失 {len(_downloads)} 个版本的计数: {e}")
+            await _client.aclose()
+            _client = None
+
+    @staticmethod
+    async def get_view(key: str, path: str) -> UpstreamView:
+        """
+        获取上游 GET 接口的响应，需要时向上游重新验证
+
+        Args:
+            key: 缓存键（catalog、plugin:{name}、plugin:{name}:versions ...）
+            path: 上游接口路径
+
+        Raises:
+            HTTPException: 上游返回 404 等错误；上游不可用且没有缓存时返回 503
+        """
+        cached = _views.get(key, None)
+        if cached is not None and cached.fresh_until > time.monotonic():
+            return cached
+        try:
+            return await _view_fetches.do(
+                key, lambda: MirrorService._revalidate(key, path, cached), settings.MIRROR_TIMEOUT
+            )
+        except (httpx.HTTPError, asyncio.TimeoutError):
+            # 上游不可用时返回旧数据，办公室网络中断期间仍然可以浏览和安装已缓存的插件
+            if cached is not None:
+                return cached
+            raise HTTPException(status_code=503, detail="上游服务器不可用")
+
+    @staticmethod
+    async def _revalidate(key: str, path: str, cached: Optional[UpstreamView]) -> UpstreamView:
+        headers = {"If-None-Match": cached.etag} if cached else {}
+        response = await _client.get(path, headers=headers)
+        fresh_until = time.monotonic() + settings.MIRROR_CACHE_TTL
+
+        if response.status_code == 304 and cached is not None:
+            view = UpstreamView(cached.body, cached.etag, fresh_until)
+        elif response.status_code == 200:
+            etag = response.headers.get("etag") or f'"{hashlib.sha256(response.content).hexdigest()[:32]}"'
+            view = UpstreamView(response.content, etag, fresh_until)
+        else:
+            # 插件在上游被删除等情况，丢弃缓存并把错误原样返回
+            _views.invalidate(key)
+            if response.status_code >= 500:
+                raise HTTPException(status_code=502, detail=f"上游服务器错误: {_upstream_message(response)}")
+            raise HTTPException(status_code=response.status_code, detail=_upstream_message(response))
+
+        _views.set(key, view)
+        return view
+
+    # ==================== 插件视图 ====================
+
+    @staticmethod
+    async def get_catalog() -> UpstreamView:
+        return await MirrorService.get_view("catalog", "/api/plugins/list")
+
+    @staticmethod
+    async def get_plugin(name: str) -> UpstreamView:
+        return await MirrorService.get_view(plugin_key(name), f"/api/plugins/{quote(name, safe='')}")
+
+    @staticmethod
+    async def get_versions(name: str) -> UpstreamView:
+        return await MirrorService.get_view(
+            f"{plugin_key(name)}:versions", f"/api/plugins/{quote(name, safe='')}/versions"
+        )
+
+    @staticmethod
+    async def get_version(name: str, version: str) -> UpstreamView:
+        return await MirrorService.get_view(
+            f"{plugin_key(name)}:version:{version}",
+            f"/api/plugins/{quote(name, safe='')}/versions/{quote(version, safe='')}",
+        )
+
+    @staticmethod
+    async def forward(method: str, path: str, timeout: Optional[float] = None, **kwargs) -> httpx.Response:
+        """
+        不缓存的接口直接转发到上游，响应原样返回
+
+        Raises:
+            HTTPException: 上游不可用时返回 503
+        """
+        try:
+            return await _client.request(method, path, timeout=timeout or settings.MIRROR_TIMEOUT, **kwargs)
+        except httpx.HTTPError:
+            raise HTTPException(status_code=503, detail="上游服务器不可用")
+
+    @staticmethod
+    async def get_changes(params: Dict[str, str], wait: float) -> httpx.Response:
+        """变更订阅直接转发（不缓存），等待时间加上上游的长轮询时间"""
+        return await MirrorService.forward(
+            "GET", "/api/plugins/changes", timeout=settings.MIRROR_TIMEOUT + wait, params=params
+        )
+
+    @staticmethod
+    async def open_change_stream(params: Dict[str, str], headers: Dict[str, str]) -> httpx.Response:
+        """
+        打开上游的 SSE 变更推送（不设读取超时，上游定时发送心跳），调用方负责关闭响应
+
+        Raises:
+            HTTPException: 上游不可用时返回 503
+        """
+        request = _client.build_request(
+            "GET", "/api/plugins/changes/stream", params=params, headers=headers,
+            timeout=httpx.Timeout(settings.MIRROR_TIMEOUT, read=None),
+        )
+        try:
+            return await _client.send(request, stream=True)
+        except httpx.HTTPError:
+            raise HTTPException(status_code=503, detail="上游服务器不可用")
+
+    @staticmethod
+    async def relay(response: httpx.Response) -> AsyncIterator[bytes]:
+        """原样转发上游的流式响应；上游断开时结束，客户端按 retry 间隔携带 Last-Event-ID 重连"""
+        try:
+            async for chunk in response.aiter_raw():
+                yield chunk
+        except httpx.HTTPError:
+            pass
+        finally:
+            await response.aclose()
+
+    @staticmethod
+    async def sync(body: Dict[str, Any]) -> httpx.Response:
+        """增量同步直接转发（不缓存），结果取决于客户端的游标"""
+        return await MirrorService.forward("POST", "/api/plugins/sync", json=body)
+
+    # ==================== 下载次数上报 ====================
+
+    @staticmethod
+    def record_download(name: str, version: str, client_id: str) -> None:
+        """记录一次本地发送的下载（只修改内存）"""
+        if not MirrorService.reporting():
+            return
+        entry = _downloads.setdefault((name, version), [0, set()])
+        entry[0] += 1
+        entry[1].add(hash_identifier(client_id))
+
+    @staticmethod
+    async def report_downloads() -> int:
+        """
+        把缓冲区中的下载次数分批上报给上游
+
+        Returns:
+            int: 上报的版本数
+
+        Raises:
+            httpx.HTTPError / HTTPException: 上报失败，未上报的数据放回缓冲区
+        """
+        global _downloads
+        if not _downloads:
+            return 0
+        pending, _downloads = _downloads, {}
+        items = sorted(pending.items())
+        for i in range(0, len(items), _REPORT_CHUNK):
+            chunk = items[i:i + _REPORT_CHUNK]
+            body = {"downloads": [
+                {"name": name, "version": version, "count": count, "client_hashes": sorted(hashes)}
+                for (name, version), (count, hashes) in chunk
+            ]}
+            try:
+                response = await _client.post("/api/stats/mirror-downloads", json=body)
+                if response.status_code != 200:
+                    raise HTTPException(status_code=502, detail=f"上游拒绝下载次数上报: {_upstream_message(response)}")
+            except BaseException:
+                for key, (count, hashes) in items[i:]:
+                    entry = _downloads.setdefault(key, [0, set()])
+                    entry[0] += count
+                    entry[1].update(hashes)
+                raise
+        return len(items)
+
+    @staticmethod
+    async def _report_loop() -> None:
+        while True:
+            await asyncio.sleep(settings.DOWNLOAD_STATS_FLUSH_INTERVAL)
+            try:
+                await MirrorService.report_downloads()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ 下载次数上报失败，稍后重试: {e}")
+
+    # ==================== 安装包 ====================
+
+    @staticmethod
+    def blob_path(file_hash: str) -> Path:
+        """安装包的本地路径 {MIRROR_DIR}/{哈希前两位}/{哈希}.zip"""
+        return settings.MIRROR_DIR / file_hash[:2] / f"{file_hash}.zip"
+
+    @staticmethod
+    async def get_package(name: str, version: Optional[str] = None) -> MirrorPackage:
+        """
+        获取安装包（为空时为当前版本），本地没有时从上游下载并校验
+
+        Raises:
+            HTTPException: 插件或版本不存在；上游不可用；下载的文件哈希不一致
+        """
+        if version is None:
+            version = (await MirrorService.get_plugin(name)).data.get("current_version")
+            if not version:
+                raise HTTPException(status_code=404, detail="插件或版本不存在")
+
+        detail = (await MirrorService.get_version(name, version)).data
+        file_hash = str(detail.get("file_hash", "")).lower()
+        if not _HASH_PATTERN.match(file_hash):
+            raise HTTPException(status_code=502, detail="上游返回的文件哈希无效")
+
+        file_path = MirrorService.blob_path(file_hash)
+        if not file_path.is_file():
+            try:
+                await _blob_fetches.do(
+                    file_hash,
+                    lambda: MirrorService._fetch_blob(name, version, file_hash, file_path),
+                    settings.MIRROR_DOWNLOAD_TIMEOUT,
+                )
+            except (httpx.HTTPError, asyncio.TimeoutError):
+                raise HTTPException(status_code=503, detail="上游服务器不可用")
+
+        return MirrorPackage(name, version, detail["file_name"], file_path, file_hash, file_path.stat().st_size)
+
+    @staticmethod
+    async def _fetch_blob(name: str, version: str, file_hash: str, file_path: Path) -> None:
+        """从上游下载固定版本的安装包，边下载边计算哈希，校验通过后原子替换到最终路径"""
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = file_path.with_name(f"{file_path.name}.{uuid.uuid4().hex}.part")
+        sha256_hash = hashlib.sha256()
+        url = f"/api/plugins/{quote(name, safe='')}/versions/{quote(version, safe='')}/download"
+        try:
+            async with _client.stream("GET", url) as response:
+                if response.status_code != 200:
+                    await response.aread()
+                    if response.status_code == 404:
+                        raise HTTPException(status_code=404, detail=_upstream_message(response))
+                    raise HTTPException(status_code=502, detail=f"上游服务器错误: {_upstream_message(response)}")
+                async with aiofiles.open(temp_path, "wb") as f:
+                    async for chunk in response.aiter_bytes(settings.FILE_CHUNK_SIZE):
+                        sha256_hash.update(chunk)
+                        await f.write(chunk)
+
+            if sha256_hash.hexdigest() != file_hash:
+                print(f"⚠️  镜像下载校验失败: {name}@{version}")
+                raise HTTPException(status_code=502, detail="上游安装包校验失败")
+            os.replace(temp_path, file_path)
+        finally:
+            temp_path.unlink(missing_ok=True)
@@ -0,0 +1,185 @@
+"""
+安装包下载服务：缓存下载信息和小安装包的内容
+
+下载集中在少数热门插件上，这里缓存两样东西（每个 worker 进程各一份）:
+- 下载信息：插件名（和版本号）到版本文件信息的映射，一次联表查询得到，省去每次下载的两次查询。
+  键为 plugin:{name}:package[:{version}]，插件变更时随失效消息清除，另有 TTL 兜底。
+- 文件内容：不超过 PACKAGE_CACHE_MAX_FILE_SIZE 的安装包整个读入内存，按总字节数 LRU 淘汰。
+  键包含文件哈希，同名版本的文件被替换后不会命中旧内容，不需要失效消息。
+"""
+import asyncio
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, and_, or_, tuple_
+from fastapi import HTTPException
+
+from app.config import settings
+from app.models.plugin import Plugin
+from app.models.version import PluginVersion
+from app.services.invalidation_bus import plugin_key
+from app.utils.cache import TTLCache, BytesLRUCache, MISSING
+from app.utils.singleflight import SingleFlight
+
+
+@dataclass(frozen=True)
+class PackageInfo:
+    """下载一个版本所需的信息（与数据库会话无关，可以跨请求共享）"""
+    plugin_name: str
+    version: str
+    file_name: str
+    file_path: str
+    file_size: int
+    file_hash: str
+
+
+_lookup_cache = TTLCache("package_lookup", max_entries=4096)
+_content_cache = BytesLRUCache(
+    "package_content",
+    max_bytes=settings.PACKAGE_CACHE_MAX_BYTES,
+    max_item_bytes=settings.PACKAGE_CACHE_MAX_FILE_SIZE,
+)
+# 缓存未命中时，同一个安装包只读取一次磁盘
+_content_reads = SingleFlight("package_reads")
+
+
+class PackageService:
+    """安装包下载服务"""
+
+    @staticmethod
+    async def get_package(
+        db: AsyncSession,
+        plugin_name: str,
+        version: Optional[str] = None
+    ) -> Optional[PackageInfo]:
+        """
+        获取下载信息
+
+        Args:
+            db: 数据库会话
+            plugin_name: 插件名称
+            version: 版本号，为空时取插件的当前版本
+
+        Returns:
+            Optional[PackageInfo]: 插件或版本不存在时返回 None（不缓存）
+        """
+        key = f"{plugin_key(plugin_name)}:package" + (f":{version}" if version else "")
+        if settings.PACKAGE_LOOKUP_CACHE_TTL > 0:
+            cached = _lookup_cache.get(key)
+            if cached is not MISSING:
+                return cached
+
+        query = select(
+            PluginVersion.plugin_name,
+            PluginVersion.version,
+            PluginVersion.file_name,
+            PluginVersion.file_path,
+            PluginVersion.file_size,
+            PluginVersion.file_hash,
+        )
+        if version:
+            query = query.where(PluginVersion.plugin_name == plugin_name, PluginVersion.version == version)
+        else:
+            query = query.join(
+                Plugin,
+                (Plugin.name == PluginVersion.plugin_name) & (Plugin.current_version == PluginVersion.version),
+            ).where(Plugin.name == plugin_name)
+        row = (await db.execute(query)).one_or_none()
+        if row is None:
+            return None
+
+        package = PackageInfo(**row._asdict())
+        if settings.PACKAGE_LOOKUP_CACHE_TTL > 0:
+            _lookup_cache.set(key, package, ttl=settings.PACKAGE_LOOKUP_CACHE_TTL)
+        return package
+
+    @staticmethod
+    async def get_packages(
+        db: AsyncSession,
+        items: List[Tuple[str, Optional[str]]]
+    ) -> Dict[Tuple[str, Optional[str]], PackageInfo]:
+        """
+        一次查询获取多个版本的下载信息（不使用缓存）
+
+        Args:
+            items: (插件名, 版本号) 列表，版本号为空时取插件的当前版本
+
+        Returns:
+            Dict: 以传入的 (插件名, 版本号) 为键，不存在的项不在结果中
+        """
+        pinned = sorted({(name, version) for name, version in items if version})
+        current = sorted({name for name, version in items if not version})
+        conditions = []
+        if pinned:
+            conditions.append(tuple_(PluginVersion.plugin_name, PluginVersion.version).in_(pinned))
+        if current:
+            conditions.append(and_(
+                PluginVersion.plugin_name.in_(current),
+                PluginVersion.version == Plugin.current_version,
+            ))
+        if not conditions:
+            return {}
+
+        result = await db.execute(
+            select(
+                PluginVersion.plugin_name,
+                PluginVersion.version,
+                PluginVersion.file_name,
+                PluginVersion.file_path,
+                PluginVersion.file_size,
+                PluginVersion.file_hash,
+                Plugin.current_version,
+            )
+            .join(Plugin, Plugin.name == PluginVersion.plugin_name)
+            .where(or_(*conditions))
+        )
+        packages: Dict[Tuple[str, Optional[str]], PackageInfo] = {}
+        for row in result:
+            package = PackageInfo(
+                plugin_name=row.plugin_name,
+                version=row.version,
+                file_name=row.file_name,
+                file_path=row.file_path,
+                file_size=row.file_size,
+                file_hash=row.file_hash,
+            )
+            packages[(row.plugin_name, row.version)] = package
+            if row.version == row.current_version:
+                packages[(row.plugin_name, None)] = package
+        return {item: packages[item] for item in items if item in packages}
+
+    @staticmethod
+    async def read_content(package: PackageInfo) -> Optional[bytes]:
+        """
+        获取安装包内容（优先从内存缓存读取）
+
+        Returns:
+            Optional[bytes]: 文件超过缓存上限或缓存关闭时返回 None，由调用方直接发送文件
+
+        Raises:
+            HTTPException: 文件不存在（404）或读取超时（503）
+        """
+        if not _content_cache.accepts(package.file_size):
+            return None
+
+        key = f"package:{package.plugin_name}:{package.version}:{package.file_hash}"
+        content = _content_cache.get(key)
+        if content is not None:
+            return content
+
+        try:
+            content = await _content_reads.do(
+                key,
+                lambda: asyncio.to_thread(Path(package.file_path).read_bytes),
+                settings.SINGLE_FLIGHT_TIMEOUT,
+            )
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="文件不存在")
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="读取文件超时，请稍后重试")
+
+        # 大小与版本记录不符（文件被替换或损坏）时照常返回，但不缓存
+        if len(content) == package.file_size:
+            _content_cache.set(key, content)
+        return content
@@ -1,42 +1,104 @@
 """
 插件服务：处理插件相关的业务逻辑
 """
+import asyncio
 import json
-from typing import List, Optional
-from pathlib import Path
+from typing import Any, Awaitable, Callable, List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select
+from sqlalchemy.orm.attributes import set_committed_value
 from fastapi import HTTPException, UploadFile
 
+from app.database import AsyncSessionLocal
 from app.models.plugin import Plugin
 from app.models.version import PluginVersion
+from app.services.change_service import (
+    ChangeService, VERSION_ADDED, PLUGIN_ENABLED, PLUGIN_DISABLED,
+    PLUGIN_DEPRECATED, PLUGIN_UNDEPRECATED, PLUGIN_DELETED,
+)
+from app.services.download_stats import DownloadStatsService
 from app.services.file_service import FileService
+from app.services.invalidation_bus import invalidation_bus, CATALOG_KEY, plugin_key
+from app.services.job_service import JobService, job_queue
+from app.services.jobs import VERIFY_PACKAGE
 from app.services.version_service import VersionService
-from app.utils.hash import calculate_file_hash
+from app.utils.cache import TTLCache, MISSING
+from app.utils.singleflight import SingleFlight
 from app.utils.validators import validate_upload_file, validate_key_or_raise
 from app.config import settings
 
+# 插件列表缓存（由失效总线在插件变更时清除）
+_catalog_cache = TTLCache("catalog", max_entries=1)
+
+# 合并并发的相同读请求；失效消息到达时丢弃执行中的查询，之后的请求重新查询
+_read_flights = SingleFlight("plugin_reads")
+invalidation_bus.add_listener(_read_flights.forget_keys)
+
+
+async def _coalesced_read(key: str, loader: Callable[[AsyncSession], Awaitable[Any]]) -> Any:
+    """
+    在独立的短会话中执行只读查询，并发的相同查询（相同 key）共享同一次执行
+
+    结果会被多个请求共享，调用方不能修改返回的对象。
+    """
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await loader(db)
+
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return await run()
+    try:
+        return await _read_flights.do(key, run, settings.SINGLE_FLIGHT_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="查询超时，请稍后重试")
+
 
 class PluginService:
     """插件服务"""
     
+    @staticmethod
+    async def get_catalog() -> List[dict]:
+        """获取插件列表（命中缓存时直接返回，否则与并发的相同请求合并为一次查询）"""
+        if settings.CATALOG_CACHE_TTL > 0:
+            cached = _catalog_cache.get(CATALOG_KEY)
+            if cached is not MISSING:
+                return cached
+        return await _coalesced_read(CATALOG_KEY, PluginService.get_all_plugins)
+    
+    @staticmethod
+    async def get_plugin_detail(name: str) -> Optional[Plugin]:
+        """获取插件及其版本列表（并发的相同请求合并为一次查询），插件不存在时返回 None"""
+        async def load(db: AsyncSession) -> Optional[Plugin]:
+            plugin = await PluginService.get_plugin_by_name(db, name)
+            if plugin:
+                # 直接设置为已提交状态，避免赋值时触发关系的惰性加载
+                versions = await VersionService.get_versions_by_plugin_name(db, name)
+                set_committed_value(plugin, "versions", versions)
+            return plugin
+        
+        return await _coalesced_read(plugin_key(name), load)
+    
+    @staticmethod
+    async def get_plugin_versions(name: str) -> Optional[List[PluginVersion]]:
+        """获取插件的版本列表（并发的相同请求合并为一次查询），插件不存在时返回 None"""
+        async def load(db: AsyncSession) -> Optional[List[PluginVersion]]:
+            if not await PluginService.get_plugin_by_name(db, name):
+                return None
+            return await VersionService.get_versions_by_plugin_name(db, name)
+        
+        return await _coalesced_read(f"{plugin_key(name)}:versions", load)
+    
     @staticmethod
     async def get_all_plugins(db: AsyncSession) -> List[dict]:
-        """获取所有插件（包含总下载次数）"""
-        # 1. 获取所有插件
+        """获取所有插件（包含总下载次数，直接读取 plugins 表的冗余字段）"""
+        if settings.CATALOG_CACHE_TTL > 0:
+            cached = _catalog_cache.get(CATALOG_KEY)
+            if cached is not MISSING:
+                return cached
+        
         result = await db.execute(select(Plugin).order_by(Plugin.created_at.desc()))
         plugins = list(result.scalars().all())
         
-        # 2. 获取每个插件的下载次数总和
-        download_counts_query = select(
-            PluginVersion.plugin_name,
-            func.sum(PluginVersion.download_count).label('total_download_count')
-        ).group_by(PluginVersion.plugin_name)
-        
-        download_result = await db.execute(download_counts_query)
-        download_counts = {row.plugin_name: row.total_download_count or 0 for row in download_result}
-        
-        # 3. 将下载次数附加到插件对象
         plugins_with_downloads = []
         for plugin in plugins:
             plugin_dict = {
@@ -51,12 +113,15 @@ class PluginService:
                 'entry_class': plugin.entry_class,
                 'is_enabled': plugin.is_enabled,
                 'is_deprecated': plugin.is_deprecated,
-                'total_download_count': download_counts.get(plugin.name, 0),
+                'total_download_count': plugin.total_download_count,
+                'unique_download_count': plugin.unique_download_count,
                 'created_at': plugin.created_at,
                 'updated_at': plugin.updated_at,
             }
             plugins_with_downloads.append(plugin_dict)
         
+        if settings.CATALOG_CACHE_TTL > 0:
+            _catalog_cache.set(CATALOG_KEY, plugins_with_downloads, ttl=settings.CATALOG_CACHE_TTL)
         return plugins_with_downloads
     
     @staticmethod
@@ -97,16 +162,10 @@ class PluginService:
                 detail="全局上传密钥无效，无权上传插件"
             )
         
-        # 4. 临时保存文件用于解析
-        temp_path = Path("./data/temp") / file.filename
-        temp_path.parent.mkdir(parents=True, exist_ok=True)
+        # 4. 流式保存到临时文件，同时计算哈希
+        temp_path, file_size, file_hash = await FileService.save_upload_to_temp(file)
         
         try:
-            # 保存临时文件
-            with open(temp_path, 'wb') as f:
-                content = await file.read()
-                f.write(content)
-            
             # 5. 解析 plugin.json
             plugin_data = await FileService.parse_plugin_json(temp_path)
             plugin_name = plugin_data['name']
@@ -147,19 +206,13 @@ class PluginService:
                 db.add(plugin)
                 await db.flush()
             
-            # 8. 重置文件指针并保存（使用插件名和版本号命名）
-            file.file.seek(0)
-            file_path, file_size = await FileService.save_upload_file(
-                file, plugin_name, plugin_version
-            )
-            
-            # 9. 计算文件哈希
-            file_hash = await calculate_file_hash(file_path)
+            # 8. 将临时文件移动到存储目录（使用插件名和版本号命名）
+            file_path = await FileService.move_to_storage(temp_path, plugin_name, plugin_version)
             
-            # 10. 生成规范的文件名：{plugin_name}@{version}.zip
+            # 9. 生成规范的文件名：{plugin_name}@{version}.zip
             formatted_file_name = f"{plugin_name}@{plugin_version}.zip"
             
-            # 11. 创建版本记录
+            # 10. 创建版本记录
             version = PluginVersion(
                 plugin_name=plugin_name,
                 version=plugin_version,
@@ -173,18 +226,28 @@ class PluginService:
             )
             db.add(version)
             
-            # 12. 更新插件的当前版本
+            # 11. 更新插件的当前版本
             plugin.current_version = plugin_version
             
+            # 12. 记录变更日志，并将上传后的校验任务入队（与版本记录同一事务提交）
+            ChangeService.record(db, plugin_name, VERSION_ADDED, plugin_version)
+            await JobService.enqueue(
+                db,
+                VERIFY_PACKAGE,
+                {"plugin_name": plugin_name, "version": plugin_version},
+                job_key=f"{VERIFY_PACKAGE}:{plugin_name}@{plugin_version}:{file_hash}",
+            )
+            
             await db.commit()
             await db.refresh(plugin)
+            await invalidation_bus.publish_plugin(plugin_name)
+            await job_queue.publish()
             
             return plugin
             
         finally:
-            # 清理临时文件
-            if temp_path.exists():
-                temp_path.unlink()
+            # 清理临时文件（已移动到存储目录时不存在）
+            temp_path.unlink(missing_ok=True)
     
     @staticmethod
     async def update_plugin(
@@ -198,13 +261,17 @@ class PluginService:
         if not plugin:
             raise HTTPException(status_code=404, detail="插件不存在")
         
-        if is_enabled is not None:
+        # 只有状态实际改变时才记录变更
+        if is_enabled is not None and is_enabled != plugin.is_enabled:
             plugin.is_enabled = is_enabled
-        if is_deprecated is not None:
+            ChangeService.record(db, name, PLUGIN_ENABLED if is_enabled else PLUGIN_DISABLED)
+        if is_deprecated is not None and is_deprecated != plugin.is_deprecated:
             plugin.is_deprecated = is_deprecated
+            ChangeService.record(db, name, PLUGIN_DEPRECATED if is_deprecated else PLUGIN_UNDEPRECATED)
         
         await db.commit()
         await db.refresh(plugin)
+        await invalidation_bus.publish_plugin(name)
         return plugin
     
     @staticmethod
@@ -217,6 +284,9 @@ class PluginService:
         # 1. 删除所有文件
         await FileService.delete_plugin_directory(name)
         
-        # 2. 删除插件（版本会通过级联删除自动删除）
+        # 2. 删除插件（版本会通过级联删除自动删除）和下载统计
         await db.delete(plugin)
+        await DownloadStatsService.delete_plugin_stats(db, name)
+        ChangeService.record(db, name, PLUGIN_DELETED)
         await db.commit()
+        await invalidation_bus.publish_plugin(name)
@@ -0,0 +1,321 @@
+"""
+备份保留策略与存储清理服务
+
+由周期任务 backup_gc（BACKUP_GC_INTERVAL）执行，也可由管理员手动触发：
+
+1. 保留策略：按 (user_key, backup_type, plugin_name) 分组，保留最近 N 个、
+   每天/每周/每月最新的一个，删除超过最长保留天数的备份；再按用户配额从最旧的开始删除。
+   每组最新的一个备份始终保留。所有策略默认关闭。
+2. 孤儿文件清理：按用户目录 / 插件目录分批对比磁盘文件和数据库记录，
+   删除没有对应记录的文件和残留的临时文件。文件系统操作都在线程中执行，不阻塞事件循环。
+
+修改时间在 ORPHAN_GRACE_SECONDS 以内的文件不会被当作孤儿，避免误删正在上传的文件。
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.models.backup import Backup
+from app.models.version import PluginVersion
+from app.services.backup_service import BackupService
+from app.services.job_service import JobService
+
+
+def plan_retention(
+    backups: List[Tuple[int, datetime]],
+    now: datetime,
+    keep_last: int = 0,
+    keep_daily: int = 0,
+    keep_weekly: int = 0,
+    keep_monthly: int = 0,
+    max_age_days: int = 0,
+) -> Set[int]:
+    """
+    计算一组备份中应删除的备份
+
+    超过最长保留天数的备份一定删除；启用保留规则时，不被任何规则保留的备份也删除。
+    最新的一个备份始终保留。
+
+    Args:
+        backups: (id, created_at) 列表，按创建时间从新到旧排序
+        now: 当前时间（UTC）
+        keep_last / keep_daily / keep_weekly / keep_monthly: 各保留规则的数量，0 表示不启用
+        max_age_days: 最长保留天数，0 表示不限制
+
+    Returns:
+        Set[int]: 应删除的备份 ID
+    """
+    if not backups:
+        return set()
+
+    keep_rules = keep_last or keep_daily or keep_weekly or keep_monthly
+    keep: Set[int] = set()
+    if keep_rules:
+        keep.update(backup_id for backup_id, _ in backups[:keep_last])
+        buckets = (
+            (keep_daily, lambda t: t.date()),
+            (keep_weekly, lambda t: t.isocalendar()[:2]),
+            (keep_monthly, lambda t: (t.year, t.month)),
+        )
+        for count, bucket_of in buckets:
+            seen = set()
+            for backup_id, created_at in backups:
+                if len(seen) >= count:
+                    break
+                bucket = bucket_of(created_at)
+                if bucket not in seen:
+                    # 每个时间段保留最新的一个
+                    seen.add(bucket)
+                    keep.add(backup_id)
+
+    cutoff = now - timedelta(days=max_age_days) if max_age_days else None
+    delete = set()
+    for backup_id, created_at in backups[1:]:
+        expired = cutoff is not None and created_at < cutoff
+        if expired or (keep_rules and backup_id not in keep):
+            delete.add(backup_id)
+    return delete
+
+
+def _retention_enabled() -> bool:
+    return any((
+        settings.BACKUP_KEEP_LAST,
+        settings.BACKUP_KEEP_DAILY,
+        settings.BACKUP_KEEP_WEEKLY,
+        settings.BACKUP_KEEP_MONTHLY,
+        settings.BACKUP_MAX_AGE_DAYS,
+        settings.BACKUP_USER_QUOTA_BYTES,
+    ))
+
+
+# ==================== 文件系统辅助函数（在线程中执行） ====================
+
+def _list_files(directory: Path) -> List[Tuple[Path, int, float]]:
+    """递归列出目录下的文件: (路径, 大小, 修改时间)"""
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in names:
+            path = Path(root) / name
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((path, stat.st_size, stat.st_mtime))
+    return files
+
+
+def _list_subdirectories(directory: Path) -> List[Path]:
+    if not directory.exists():
+        return []
+    with os.scandir(directory) as entries:
+        return sorted(Path(entry.path) for entry in entries if entry.is_dir(follow_symlinks=False))
+
+
+def _remove_files(paths: Iterable[Path]) -> None:
+    for path in paths:
+        path.unlink(missing_ok=True)
+
+
+def _remove_empty_dirs(directory: Path, grace_before: float) -> None:
+    """
+    自底向上删除空目录（保留 directory 本身）
+
+    只删除修改时间早于 grace_before 的目录，避免删掉上传请求刚创建、还未写入文件的目录。
+    """
+    for root, dirs, files in os.walk(directory, topdown=False):
+        if Path(root) == directory or files:
+            continue
+        try:
+            if os.stat(root).st_mtime <= grace_before:
+                os.rmdir(root)
+        except OSError:
+            # 目录非空（子目录未被删除）或已不存在
+            pass
+
+
+def _find_orphans(
+    directory: Path,
+    known_paths: List[str],
+    grace_before: float
+) -> Tuple[List[Tuple[Path, int]], int]:
+    """
+    对比目录下的文件和数据库中记录的路径
+
+    路径统一解析为绝对路径后比较，数据库中的相对路径和配置中的绝对路径可以互相匹配。
+
+    Returns:
+        (孤儿文件 [(路径, 大小)], 有记录但文件缺失的数量)
+    """
+    known = {Path(path).resolve() for path in known_paths}
+    found = set()
+    orphans = []
+    for path, size, mtime in _list_files(directory):
+        resolved = path.resolve()
+        found.add(resolved)
+        if resolved not in known and mtime <= grace_before:
+            orphans.append((path, size))
+    return orphans, len(known - found)
+
+
+class RetentionService:
+    """备份保留策略与孤儿文件清理服务"""
+
+    @staticmethod
+    async def apply_retention(report: Dict[str, int]) -> None:
+        """按用户分批执行保留策略，每个用户一个事务"""
+        if not _retention_enabled():
+            return
+        now = datetime.utcnow()
+        last_user = ""
+        while True:
+            async with AsyncSessionLocal() as db:
+                users = (await db.execute(
+                    select(Backup.user_key)
+                    .where(Backup.user_key > last_user)
+                    .group_by(Backup.user_key)
+                    .order_by(Backup.user_key)
+                    .limit(settings.BACKUP_GC_BATCH_SIZE)
+                )).scalars().all()
+            if not users:
+                return
+            for user_key in users:
+                async with AsyncSessionLocal() as db:
+                    paths = await RetentionService._apply_user_retention(db, user_key, now, report)
+                    await db.commit()
+                # 提交成功后再删除文件，提交失败时记录和文件都保留
+                report["retention_bytes"] += await BackupService.remove_unreferenced_files(paths)
+            last_user = users[-1]
+
+    @staticmethod
+    async def _apply_user_retention(
+        db: AsyncSession,
+        user_key: str,
+        now: datetime,
+        report: Dict[str, int]
+    ) -> List[str]:
+        """对一个用户执行保留策略（不提交），返回待删除的文件路径"""
+        result = await db.execute(
+            select(Backup)
+            .where(Backup.user_key == user_key)
+            .order_by(Backup.created_at.desc(), Backup.id.desc())
+        )
+        backups = list(result.scalars().all())
+
+        # 1. 分组保留规则
+        groups: Dict[Tuple[str, Optional[str]], List[Backup]] = {}
+        for backup in backups:
+            groups.setdefault((backup.backup_type, backup.plugin_name), []).append(backup)
+
+        to_delete: Set[int] = set()
+        newest_of_group: Set[int] = set()
+        for group in groups.values():
+            newest_of_group.add(group[0].id)
+            to_delete |= plan_retention(
+                [(backup.id, backup.created_at) for backup in group],
+                now,
+                keep_last=settings.BACKUP_KEEP_LAST,
+                keep_daily=settings.BACKUP_KEEP_DAILY,
+                keep_weekly=settings.BACKUP_KEEP_WEEKLY,
+                keep_monthly=settings.BACKUP_KEEP_MONTHLY,
+                max_age_days=settings.BACKUP_MAX_AGE_DAYS,
+            )
+
+        # 2. 用户配额：从最旧的开始删除，直到低于配额（每组最新的备份除外）
+        quota = settings.BACKUP_USER_QUOTA_BYTES
+        if quota:
+            usage = sum(backup.file_size for backup in backups if backup.id not in to_delete)
+            for backup in reversed(backups):
+                if usage <= quota:
+                    break
+                if backup.id in to_delete or backup.id in newest_of_group:
+                    continue
+                to_delete.add(backup.id)
+                usage -= backup.file_size
+
+        doomed = [backup for backup in backups if backup.id in to_delete]
+        if not doomed:
+            return []
+        report["retention_deleted"] += len(doomed)
+        return await BackupService.purge_backups(db, doomed)
+
+    @staticmethod
+    async def _reconcile_directory(directory: Path, known_paths: List[str], report: Dict[str, int]) -> None:
+        """删除目录下没有数据库记录的文件（含 temp_ 前缀的残留临时文件）"""
+        grace_before = time.time() - settings.ORPHAN_GRACE_SECONDS
+        orphans, missing = await asyncio.to_thread(_find_orphans, directory, known_paths, grace_before)
+        report["missing_files"] += missing
+        if orphans:
+            for path, size in orphans:
+                report["temp_files" if path.name.startswith("temp_") else "orphan_files"] += 1
+                report["orphan_bytes"] += size
+            await asyncio.to_thread(_remove_files, [path for path, _ in orphans])
+        await asyncio.to_thread(_remove_empty_dirs, directory, grace_before)
+
+    @staticmethod
+    async def reconcile_backups(report: Dict[str, int]) -> None:
+        """逐个用户目录（BACKUP_DIR/{user_key}）对比备份文件和数据库记录"""
+        for user_dir in await asyncio.to_thread(_list_subdirectories, settings.BACKUP_DIR):
+            async with AsyncSessionLocal() as db:
+                paths = (await db.execute(
+                    select(Backup.file_path).where(Backup.user_key == user_dir.name)
+                )).scalars().all()
+            await RetentionService._reconcile_directory(user_dir, list(paths), report)
+
+    @staticmethod
+    async def reconcile_uploads(report: Dict[str, int]) -> None:
+        """逐个插件目录（UPLOAD_DIR/{plugin_name}）对比插件包和版本记录，并清理上传临时文件"""
+        for plugin_dir in await asyncio.to_thread(_list_subdirectories, settings.UPLOAD_DIR):
+            async with AsyncSessionLocal() as db:
+                paths = (await db.execute(
+                    select(PluginVersion.file_path).where(PluginVersion.plugin_name == plugin_dir.name)
+                )).scalars().all()
+            await RetentionService._reconcile_directory(plugin_dir, list(paths), report)
+
+        # 上传过程中崩溃残留的临时文件（TEMP_DIR 中的文件都没有数据库记录）
+        if settings.TEMP_DIR.exists():
+            await RetentionService._reconcile_directory(settings.TEMP_DIR, [], report)
+
+    @staticmethod
+    async def run(retention: bool = True, orphans: bool = True) -> Dict[str, int]:
+        """执行一次完整的清理，返回清理报告"""
+        report = {
+            "retention_deleted": 0,
+            "retention_bytes": 0,
+            "orphan_files": 0,
+            "temp_files": 0,
+            "orphan_bytes": 0,
+            "missing_files": 0,
+            "jobs_pruned": 0,
+            "usage_repaired": 0,
+        }
+        started = time.perf_counter()
+        if retention:
+            await RetentionService.apply_retention(report)
+        if orphans:
+            await RetentionService.reconcile_backups(report)
+            await RetentionService.reconcile_uploads(report)
+
+        # 按 backups 表校正用量汇总（只写入有偏差的记录）
+        async with AsyncSessionLocal() as db:
+            report["usage_repaired"] = await BackupService.repair_usage(db)
+            await db.commit()
+        if report["usage_repaired"]:
+            print(f"⚠️ 已校正 {report['usage_repaired']} 条备份用量汇总")
+
+        # 清理已完成的历史任务记录
+        if settings.JOB_RETENTION_DAYS > 0:
+            async with AsyncSessionLocal() as db:
+                report["jobs_pruned"] = await JobService.prune_finished(
+                    db, datetime.utcnow() - timedelta(days=settings.JOB_RETENTION_DAYS)
+                )
+                await db.commit()
+
+        report["duration_ms"] = int((time.perf_counter() - started) * 1000)
+        return report
@@ -0,0 +1,97 @@
+"""
+增量同步服务：按时间戳游标返回变更的插件、版本和删除记录
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+
+from app.config import settings
+from app.models.change import PluginChange
+from app.models.plugin import Plugin
+from app.models.version import PluginVersion
+from app.services.change_service import PLUGIN_DELETED
+
+
+class SyncService:
+    """增量同步服务"""
+
+    @staticmethod
+    async def get_delta(db: AsyncSession, cursor: Optional[datetime]) -> dict:
+        """
+        获取游标之后变更的数据
+
+        游标比较使用 >=（数据库时间戳精度为秒），客户端可能收到少量重复记录，按主键覆盖即可。
+        返回的 next_cursor 为查询开始时的数据库时间减去 SYNC_CURSOR_LAG，
+        用于覆盖查询时尚未提交、但时间戳早于查询时刻的事务。
+
+        Args:
+            db: 数据库会话
+            cursor: 上次同步返回的 next_cursor，为空表示全量同步
+
+        Returns:
+            dict: plugins / versions / deleted / next_cursor / full
+        """
+        now = (await db.execute(select(func.now()))).scalar()
+        if isinstance(now, str):
+            now = datetime.fromisoformat(now)
+        next_cursor = now - timedelta(seconds=settings.SYNC_CURSOR_LAG)
+
+        # 数据库时间戳为不带时区的 UTC
+        if cursor is not None and cursor.tzinfo is not None:
+            cursor = cursor.astimezone(timezone.utc).replace(tzinfo=None)
+
+        full = cursor is None
+        if not full:
+            # 删除记录被清理过且游标早于现存最早记录时，无法保证返回全部删除，改为全量同步
+            first = (await db.execute(
+                select(PluginChange.seq, PluginChange.created_at)
+                .order_by(PluginChange.seq)
+                .limit(1)
+            )).first()
+            if first and first.seq > 1 and cursor < first.created_at:
+                full = True
+
+        plugin_query = select(Plugin).order_by(Plugin.name)
+        version_query = select(PluginVersion).order_by(PluginVersion.plugin_name, PluginVersion.version)
+        deleted = []
+        if not full:
+            plugin_query = plugin_query.where(Plugin.updated_at >= cursor)
+            version_query = version_query.where(PluginVersion.updated_at >= cursor)
+            result = await db.execute(
+                select(PluginChange.plugin_name, func.max(PluginChange.created_at).label("deleted_at"))
+                .where(PluginChange.action == PLUGIN_DELETED, PluginChange.created_at >= cursor)
+                .group_by(PluginChange.plugin_name)
+            )
+            deleted = [{"name": row.plugin_name, "deleted_at": row.deleted_at} for row in result]
+
+        plugins = list((await db.execute(plugin_query)).scalars().all())
+        versions = list((await db.execute(version_query)).scalars().all())
+
+        plugin_dicts = []
+        for plugin in plugins:
+            plugin_dicts.append({
+                "name": plugin.name,
+                "display_name": plugin.display_name,
+                "current_version": plugin.current_version,
+                "description": plugin.description,
+                "author": plugin.author,
+                "license": plugin.license,
+                "homepage": plugin.homepage,
+                "main_dll": plugin.main_dll,
+                "entry_class": plugin.entry_class,
+                "is_enabled": plugin.is_enabled,
+                "is_deprecated": plugin.is_deprecated,
+                "total_download_count": plugin.total_download_count,
+                "unique_download_count": plugin.unique_download_count,
+                "created_at": plugin.created_at,
+                "updated_at": plugin.updated_at,
+            })
+
+        return {
+            "plugins": plugin_dicts,
+            "versions": versions,
+            "deleted": deleted,
+            "next_cursor": next_cursor,
+            "full": full,
+        }
@@ -1,12 +1,17 @@
 """
 版本服务：处理插件版本相关的业务逻辑
 """
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, update, func
 from fastapi import HTTPException
 
+from app.models.plugin import Plugin
 from app.models.version import PluginVersion
+from app.services.change_service import ChangeService, VERSION_DEPRECATED
+from app.services.download_stats import download_stats
+from app.services.invalidation_bus import invalidation_bus
+from app.utils.hyperloglog import hash_identifier
 
 
 class VersionService:
@@ -21,7 +26,7 @@ class VersionService:
         result = await db.execute(
             select(PluginVersion)
             .where(PluginVersion.plugin_name == plugin_name)
-            .order_by(PluginVersion.created_at.desc())
+            .order_by(PluginVersion.created_at.desc(), PluginVersion.version.desc())
         )
         return list(result.scalars().all())
     
@@ -65,19 +70,125 @@ class VersionService:
                 detail=f"插件 '{plugin_name}' 的版本 '{version}' 不存在"
             )
         
-        ver.is_deprecated = True
+        if not ver.is_deprecated:
+            ver.is_deprecated = True
+            ver.updated_at = func.now()
+            ChangeService.record(db, plugin_name, VERSION_DEPRECATED, version)
         await db.commit()
         await db.refresh(ver)
+        await invalidation_bus.publish_plugin(plugin_name)
         return ver
     
     @staticmethod
     async def increment_download_count(
         db: AsyncSession, 
         plugin_name: str, 
-        version: str
+        version: str,
+        client_id: Optional[str] = None
     ) -> None:
-        """增加下载次数"""
-        ver = await VersionService.get_version(db, plugin_name, version)
-        if ver:
-            ver.download_count += 1
-            await db.commit()
+        """
+        增加下载次数
+        
+        版本下载次数和插件的 total_download_count 在同一事务中原子递增（UPDATE ... SET x = x + 1），
+        并发下载不会丢失计数。不修改插件的 updated_at：下载次数变化不算目录变更。
+        同时计入当前 worker 的分时下载统计缓冲区；提供 client_id 时计入独立下载者估计。
+        """
+        await VersionService.increment_download_counts(db, [(plugin_name, version)], client_id)
+    
+    @staticmethod
+    async def increment_download_counts(
+        db: AsyncSession,
+        packages: List[Tuple[str, str]],
+        client_id: Optional[str] = None
+    ) -> None:
+        """
+        一次增加多个版本的下载次数（同一事务提交），规则同 increment_download_count
+        
+        先按顺序更新所有版本行，再按顺序更新插件行：与单个下载（先版本后插件）的加锁顺序一致，
+        并发的下载之间不会死锁。
+        """
+        hashes = [hash_identifier(client_id)] if client_id else []
+        await VersionService.add_download_counts(
+            db, {package: (1, hashes) for package in set(packages)}
+        )
+    
+    @staticmethod
+    async def add_download_counts(
+        db: AsyncSession,
+        downloads: Dict[Tuple[str, str], Tuple[int, List[int]]]
+    ) -> int:
+        """
+        按版本累加下载次数并计入分时统计（同一事务提交），加锁顺序同 increment_download_counts
+        
+        Args:
+            downloads: (插件, 版本) -> (下载次数, 下载者标识的哈希列表)；镜像节点批量上报时每个版本可能有多次
+        
+        Returns:
+            int: 实际计入的下载次数（不存在的版本忽略）
+        """
+        counted = []
+        plugin_counts: Dict[str, int] = {}
+        for (plugin_name, version), (count, hashes) in sorted(downloads.items()):
+            result = await db.execute(
+                update(PluginVersion)
+                .where(PluginVersion.plugin_name == plugin_name, PluginVersion.version == version)
+                .values(download_count=func.coalesce(PluginVersion.download_count, 0) + count)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                plugin_counts[plugin_name] = plugin_counts.get(plugin_name, 0) + count
+                counted.append((plugin_name, version, count, hashes))
+        for plugin_name, count in sorted(plugin_counts.items()):
+            await db.execute(
+                update(Plugin)
+                .where(Plugin.name == plugin_name)
+                .values(
+                    total_download_count=Plugin.total_download_count + count,
+                    updated_at=Plugin.updated_at,
+                )
+                .execution_options(synchronize_session=False)
+            )
+        await db.commit()
+        for plugin_name, version, count, hashes in counted:
+            download_stats.record_many(plugin_name, version, count, hashes)
+        return sum(plugin_counts.values())
+    
+    @staticmethod
+    async def recount_download_totals(
+        db: AsyncSession,
+        cursor: Optional[str],
+        batch_size: int
+    ) -> Tuple[Optional[str], int]:
+        """
+        按版本下载次数重新统计一批插件的 total_download_count（按插件名分批）
+        
+        只更新与统计结果不一致的插件，不提交事务。
+        
+        Args:
+            db: 数据库会话
+            cursor: 上一批最后一个插件名，为空表示从头开始
+            batch_size: 每批插件数
+            
+        Returns:
+            Tuple[Optional[str], int]: (下一批游标，为空表示已到表尾; 本批校正的插件数)
+        """
+        query = select(Plugin.name).order_by(Plugin.name).limit(batch_size)
+        if cursor:
+            query = query.where(Plugin.name > cursor)
+        names = (await db.execute(query)).scalars().all()
+        if not names:
+            return None, 0
+        
+        total = (
+            select(func.coalesce(func.sum(PluginVersion.download_count), 0))
+            .where(PluginVersion.plugin_name == Plugin.name)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            update(Plugin)
+            .where(Plugin.name.in_(names), Plugin.total_download_count.is_distinct_from(total))
+            .values(total_download_count=total, updated_at=Plugin.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        next_cursor = names[-1] if len(names) == batch_size else None
+        return next_cursor, result.rowcount or 0
@@ -4,19 +4,14 @@ JWT 认证模块
 提供 JWT token 的生成、验证和依赖注入功能
 """
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from pydantic import BaseModel
 
 from app.config import settings
 
-
-# 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # HTTP Bearer 认证方案
 security = HTTPBearer(auto_error=False)
 
@@ -34,6 +29,18 @@ class Token(BaseModel):
     expires_in: int  # 过期时间（秒）
 
 
+@lru_cache(maxsize=1)
+def get_pwd_context():
+    """
+    获取密码加密上下文
+    
+    管理员认证直接比较配置中的明文密码，用不到 bcrypt，
+    因此 passlib 延迟到第一次使用时才导入，避免拖慢 worker 启动。
+    """
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     验证密码
@@ -45,7 +52,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     Returns:
         bool: 是否匹配
     """
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
@@ -58,7 +65,7 @@ def get_password_hash(password: str) -> str:
     Returns:
         str: 哈希后的密码
     """
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 
 def authenticate_admin(username: str, password: str) -> bool:
@@ -90,6 +97,9 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     Returns:
         str: JWT token
     """
+    # 延迟导入：jose 会连带导入 cryptography，只在签发/验证 token 时才需要
+    from jose import jwt
+    
     to_encode = data.copy()
     
     if expires_delta:
@@ -116,6 +126,8 @@ def verify_token(token: str) -> Optional[TokenData]:
     Returns:
         TokenData: token 数据，验证失败返回 None
     """
+    from jose import JWTError, jwt
+    
     try:
         payload = jwt.decode(
             token, 
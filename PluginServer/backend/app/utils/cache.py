@@ -0,0 +1,185 @@
+"""
+进程内缓存工具
+
+所有缓存实例自动登记到全局注册表，失效总线（app.services.invalidation_bus）
+收到失效消息时通过 invalidate_local() 统一清除各缓存中受影响的键。
+
+缓存键使用冒号分隔的层级命名，例如:
+- catalog                       插件列表
+- plugin:{name}                 单个插件相关的数据
+- plugin:{name}:versions        插件的版本列表
+- plugin:{name}:package:...     插件安装包的下载信息和文件内容
+
+失效一个键会同时清除以它为前缀的所有子键，例如失效 plugin:a 会清除 plugin:a:versions。
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional, Union
+
+# 已创建的缓存实例
+_registry: List[Union["TTLCache", "BytesLRUCache"]] = []
+
+# 缓存未命中时返回的哨兵值（缓存值本身可能为 None）
+MISSING = object()
+
+
+def _matches(key: str, invalidated: str) -> bool:
+    """key 是否等于 invalidated 或是它的子键"""
+    return key == invalidated or key.startswith(invalidated + ":")
+
+
+class TTLCache:
+    """
+    带过期时间和容量上限的 LRU 缓存
+
+    不是线程安全的，只在事件循环线程中使用。
+    """
+
+    def __init__(self, name: str, ttl: Optional[float] = None, max_entries: int = 1024):
+        """
+        Args:
+            name: 缓存名称（用于统计）
+            ttl: 默认过期时间（秒），None 表示只靠失效消息清除
+            max_entries: 最大条目数，超出后淘汰最久未使用的条目
+        """
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        _registry.append(self)
+
+    def get(self, key: str, default: Any = MISSING) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at and expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else 0.0
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: str) -> int:
+        """清除键及其子键，返回清除的条目数"""
+        matched = [k for k in self._data if _matches(k, key)]
+        for k in matched:
+            del self._data[k]
+        return len(matched)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+class BytesLRUCache:
+    """
+    按总字节数限制容量的 LRU 缓存（值为 bytes）
+
+    超出 max_bytes 时淘汰最久未使用的条目；大于 max_item_bytes 的值不缓存。
+    不是线程安全的，只在事件循环线程中使用。
+    """
+
+    def __init__(self, name: str, max_bytes: int, max_item_bytes: int):
+        """
+        Args:
+            name: 缓存名称（用于统计）
+            max_bytes: 所有条目的总字节数上限，0 表示不缓存
+            max_item_bytes: 单个条目的字节数上限
+        """
+        self.name = name
+        self.max_bytes = max_bytes
+        self.max_item_bytes = min(max_item_bytes, max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._data: "OrderedDict[str, bytes]" = OrderedDict()
+        _registry.append(self)
+
+    def accepts(self, size: int) -> bool:
+        """该大小的值是否会被缓存"""
+        return 0 < size <= self.max_item_bytes
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if not self.accepts(len(value)):
+            return
+        old = self._data.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._data[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self._data.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def invalidate(self, key: str) -> int:
+        """清除键及其子键，返回清除的条目数"""
+        matched = [k for k in self._data if _matches(k, key)]
+        for k in matched:
+            self.size -= len(self._data.pop(k))
+        return len(matched)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+def invalidate_local(keys: Iterable[str]) -> int:
+    """在当前进程的所有缓存中清除指定键，返回清除的条目总数"""
+    removed = 0
+    for key in keys:
+        for cache in _registry:
+            removed += cache.invalidate(key)
+    return removed
+
+
+def cache_stats() -> List[dict]:
+    """所有缓存的统计信息"""
+    return [cache.stats() for cache in _registry]
@@ -0,0 +1,36 @@
+"""
+请求来源识别：下载者标识和镜像节点请求
+"""
+import hmac
+
+from fastapi import Request
+
+from app.config import settings
+
+# 镜像节点请求上游时携带的共享密钥请求头
+MIRROR_TOKEN_HEADER = "X-Mirror-Token"
+
+
+def client_identity(http_request: Request) -> str:
+    """
+    下载者标识，用于估计独立下载者数量（只保存哈希）
+
+    客户端应在 X-Client-Id 请求头中提供稳定的安装标识；未提供时退化为 IP + User-Agent。
+    """
+    client_id = http_request.headers.get("x-client-id")
+    if client_id:
+        return f"id:{client_id}"
+    host = http_request.client.host if http_request.client else ""
+    return f"ip:{host}|{http_request.headers.get('user-agent', '')}"
+
+
+def is_mirror_request(http_request: Request) -> bool:
+    """
+    请求是否来自配置了相同 MIRROR_REPORT_TOKEN 的镜像节点
+
+    镜像节点的下载次数由镜像节点批量上报，它回源下载安装包的请求不再计入。
+    """
+    token = http_request.headers.get(MIRROR_TOKEN_HEADER, "")
+    return bool(settings.MIRROR_REPORT_TOKEN) and hmac.compare_digest(
+        token.encode("utf-8"), settings.MIRROR_REPORT_TOKEN.encode("utf-8")
+    )
@@ -0,0 +1,69 @@
+"""
+备份文件存储压缩（zstd）
+
+所有函数都是同步阻塞的，调用方通过 asyncio.to_thread 或 StreamingResponse 的线程池执行。
+zstandard 为可选依赖，只有启用压缩或下载已压缩的备份时才导入。
+"""
+from pathlib import Path
+from typing import Iterator, Optional
+
+# 压缩算法名称，同时用作 Content-Encoding
+ZSTD = "zstd"
+
+# 压缩文件的扩展名
+ZSTD_SUFFIX = ".zst"
+
+
+def _zstd():
+    # 延迟导入：未启用压缩时不需要安装 zstandard
+    import zstandard
+    return zstandard
+
+
+def zstd_available() -> bool:
+    try:
+        _zstd()
+        return True
+    except ImportError:
+        return False
+
+
+def sample_ratio(path: Path, sample_size: int, level: int) -> float:
+    """
+    压缩文件开头的一段样本，返回压缩后大小 / 原大小
+
+    已压缩的内容（zip 内的 deflate 数据、图片等）比值接近或大于 1。
+    """
+    with open(path, "rb") as f:
+        sample = f.read(sample_size)
+    if not sample:
+        return 1.0
+    compressed = _zstd().ZstdCompressor(level=level).compress(sample)
+    return len(compressed) / len(sample)
+
+
+def compress_file(source: Path, target: Path, level: int, chunk_size: int) -> int:
+    """
+    流式压缩 source 到 target，返回压缩后的大小
+
+    写入失败时删除不完整的 target。
+    """
+    compressor = _zstd().ZstdCompressor(level=level, write_content_size=True)
+    try:
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            compressor.copy_stream(src, dst, size=source.stat().st_size, read_size=chunk_size, write_size=chunk_size)
+    except BaseException:
+        target.unlink(missing_ok=True)
+        raise
+    return target.stat().st_size
+
+
+def iter_decompressed(path: Path, chunk_size: int, compression: Optional[str]) -> Iterator[bytes]:
+    """逐块读取文件内容，compression 为 zstd 时边读边解压"""
+    with open(path, "rb") as f:
+        if compression == ZSTD:
+            reader = _zstd().ZstdDecompressor().stream_reader(f, read_size=chunk_size)
+        else:
+            reader = f
+        while chunk := reader.read(chunk_size):
+            yield chunk
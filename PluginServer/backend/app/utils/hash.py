@@ -4,23 +4,28 @@
 import hashlib
 import aiofiles
 from pathlib import Path
+from typing import Optional
 
+from app.config import settings
 
-async def calculate_file_hash(file_path: Path) -> str:
+
+async def calculate_file_hash(file_path: Path, chunk_size: Optional[int] = None) -> str:
     """
     计算文件的 SHA256 哈希值
     
     Args:
         file_path: 文件路径
+        chunk_size: 分块大小，默认使用 FILE_CHUNK_SIZE
         
     Returns:
         str: SHA256 哈希值（十六进制字符串）
     """
     sha256_hash = hashlib.sha256()
+    chunk_size = chunk_size or settings.FILE_CHUNK_SIZE
     
     async with aiofiles.open(file_path, 'rb') as f:
         # 分块读取文件以处理大文件
-        while chunk := await f.read(8192):
+        while chunk := await f.read(chunk_size):
             sha256_hash.update(chunk)
     
     return sha256_hash.hexdigest()
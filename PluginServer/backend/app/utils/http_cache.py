@@ -0,0 +1,75 @@
+"""
+HTTP 缓存工具：ETag、条件请求和 Cache-Control
+
+GET 读接口返回 ETag 和 Cache-Control，浏览器、nginx 或 CDN 可以按 Cache-Control 缓存响应，
+过期后携带 If-None-Match 重新验证，数据没有变化时只返回 304。
+
+- 可变的视图（插件列表、详情、版本列表）: ETag 为响应体的哈希，public, max-age 较短
+- 固定版本的安装包: ETag 为文件哈希，同一 plugin@version 的内容不会改变，public, immutable
+"""
+import hashlib
+from typing import Dict, Optional
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+# 固定版本安装包的缓存时长（一年，immutable 响应的惯用值）
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def make_etag(value: str) -> str:
+    """构造强 ETag（带引号）"""
+    return f'"{value}"'
+
+
+def public_cache_control(max_age: int, immutable: bool = False) -> str:
+    """构造 public 的 Cache-Control，max_age 为 0 时要求每次重新验证"""
+    if max_age <= 0:
+        return "public, no-cache"
+    return f"public, max-age={max_age}" + (", immutable" if immutable else "")
+
+
+def etag_matches(http_request: Request, etag: str) -> bool:
+    """请求的 If-None-Match 是否匹配（弱比较，支持多个值和 *）"""
+    header = http_request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    target = etag.removeprefix("W/")
+    return any(item.strip().removeprefix("W/") == target for item in header.split(","))
+
+
+def cache_headers(etag: str, cache_control: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": cache_control}
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    """304 响应（必须带上与 200 响应相同的 ETag 和 Cache-Control）"""
+    return Response(status_code=304, headers=cache_headers(etag, cache_control))
+
+
+def cacheable_json(
+    http_request: Request,
+    content: BaseModel,
+    cache_control: str,
+    etag: Optional[str] = None
+) -> Response:
+    """
+    返回带 ETag 的 JSON 响应，If-None-Match 匹配时返回 304
+
+    Args:
+        http_request: 当前请求
+        content: 响应体（通常是 ApiResponse）
+        cache_control: Cache-Control 值
+        etag: 为空时取响应体的哈希
+    """
+    body = content.model_dump_json().encode("utf-8")
+    if etag is None:
+        etag = make_etag(hashlib.sha256(body).hexdigest()[:32])
+    if etag_matches(http_request, etag):
+        return not_modified(etag, cache_control)
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers=cache_headers(etag, cache_control),
+    )
@@ -0,0 +1,283 @@
+"""
+采样分析器
+
+在独立线程中周期性采样事件循环线程（以及其上挂起的 asyncio 任务）的调用栈，
+输出 flamegraph.pl / speedscope 兼容的折叠栈（collapsed stack）文本。
+
+空闲时没有任何开销：只有调用 start() 后才会创建采样线程。
+"""
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional
+
+from app.config import settings
+from app.utils.auth import verify_token
+
+
+# 支持的采样模式
+# - wall: 按墙钟时间采样，包含等待 IO 的时间
+# - cpu:  只在目标线程实际消耗 CPU 时计数
+PROFILE_MODES = {"wall", "cpu"}
+
+# 同一时间只允许一个分析会话，避免多个采样线程互相干扰
+_active_lock = threading.Lock()
+
+
+class ProfilerBusyError(RuntimeError):
+    """已有分析会话在运行"""
+
+
+def _frame_label(frame) -> str:
+    """格式化单个栈帧: func (file.py:line)"""
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})"
+
+
+def _thread_stack(frame) -> List[str]:
+    """从栈顶帧回溯到根帧，返回根在前的帧列表"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _task_stack(task: asyncio.Task) -> List[str]:
+    """沿 cr_await 链展开任务的协程栈（外层在前）"""
+    labels = []
+    coro = task.get_coro()
+    while coro is not None:
+        frame = (
+            getattr(coro, "cr_frame", None)
+            or getattr(coro, "gi_frame", None)
+            or getattr(coro, "ag_frame", None)
+        )
+        if frame is None:
+            break
+        labels.append(_frame_label(frame))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return labels
+
+
+class SamplingProfiler:
+    """
+    针对单个线程的采样分析器
+
+    用法:
+        profiler = SamplingProfiler(mode="wall")
+        profiler.start()
+        ...
+        profiler.stop()
+        text = profiler.collapsed()
+    """
+
+    def __init__(
+        self,
+        mode: str = "wall",
+        interval: float = 0.005,
+        thread_id: Optional[int] = None,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        include_tasks: bool = True,
+    ):
+        """
+        Args:
+            mode: 采样模式 (wall | cpu)
+            interval: 采样间隔（秒）
+            thread_id: 目标线程，默认为调用 start() 的线程
+            loop: 目标事件循环，用于采集挂起任务的协程栈
+            include_tasks: 是否采集 asyncio 任务栈（仅 wall 模式有意义）
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"不支持的采样模式: {mode}")
+        if mode == "cpu" and not hasattr(time, "pthread_getcpuclockid"):
+            raise ValueError("当前平台不支持 CPU 采样模式")
+
+        self.mode = mode
+        self.interval = interval
+        self.thread_id = thread_id
+        self.loop = loop
+        self.include_tasks = include_tasks and mode == "wall"
+        self.samples = 0
+        self._stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._owns_lock = False
+
+    def start(self) -> None:
+        """启动采样线程"""
+        if not _active_lock.acquire(blocking=False):
+            raise ProfilerBusyError("已有分析会话正在运行")
+        self._owns_lock = True
+
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        if self.loop is None:
+            try:
+                self.loop = asyncio.get_running_loop()
+            except RuntimeError:
+                self.loop = None
+
+        self._thread = threading.Thread(
+            target=self._run, name="microdock-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """停止采样并等待采样线程退出"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._owns_lock:
+            self._owns_lock = False
+            _active_lock.release()
+
+    def collapsed(self) -> str:
+        """返回折叠栈文本，每行: frame;frame;frame count"""
+        lines = [f"{stack} {count}" for stack, count in self._stacks.most_common()]
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def _run(self) -> None:
+        cpu_clock = None
+        last_cpu = 0.0
+        if self.mode == "cpu":
+            cpu_clock = time.pthread_getcpuclockid(self.thread_id)
+            last_cpu = time.clock_gettime(cpu_clock)
+
+        while not self._stop_event.wait(self.interval):
+            if cpu_clock is not None:
+                # 目标线程在两次采样间没有消耗 CPU 则跳过
+                now_cpu = time.clock_gettime(cpu_clock)
+                if now_cpu <= last_cpu:
+                    continue
+                last_cpu = now_cpu
+
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            self.samples += 1
+            self._stacks[";".join(_thread_stack(frame))] += 1
+            del frame
+
+            if self.include_tasks and self.loop is not None:
+                self._sample_tasks()
+
+    def _sample_tasks(self) -> None:
+        try:
+            tasks = asyncio.all_tasks(self.loop)
+        except RuntimeError:
+            return
+        for task in tasks:
+            if task.done():
+                continue
+            labels = _task_stack(task)
+            if labels:
+                labels.insert(0, f"task:{task.get_name()}")
+                self._stacks[";".join(labels)] += 1
+
+
+async def profile_for(
+    duration: float,
+    mode: str = "wall",
+    interval: float = 0.005,
+    include_tasks: bool = True,
+) -> SamplingProfiler:
+    """在当前事件循环上采样指定时长，返回已停止的分析器"""
+    profiler = SamplingProfiler(mode=mode, interval=interval, include_tasks=include_tasks)
+    profiler.start()
+    try:
+        await asyncio.sleep(duration)
+    finally:
+        profiler.stop()
+    return profiler
+
+
+class ProfileMiddleware:
+    """
+    按请求分析的 ASGI 中间件
+
+    管理员在请求头中携带 `X-Profile: wall|cpu`（以及有效的 Bearer token）时，
+    该请求在分析器下执行，响应体被替换为折叠栈文本，原状态码放在
+    `X-Profile-Status` 响应头中。未携带该请求头时只做一次请求头查找。
+    """
+
+    header_name = b"x-profile"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mode = None
+        authorization = None
+        for key, value in scope["headers"]:
+            if key == self.header_name:
+                mode = value.decode("latin-1").strip().lower()
+            elif key == b"authorization":
+                authorization = value.decode("latin-1")
+
+        if not mode or not self._is_admin(authorization):
+            await self.app(scope, receive, send)
+            return
+
+        await self._profile_request(mode, scope, receive, send)
+
+    @staticmethod
+    def _is_admin(authorization: Optional[str]) -> bool:
+        if not authorization or not authorization.lower().startswith("bearer "):
+            return False
+        return verify_token(authorization[7:].strip()) is not None
+
+    async def _profile_request(self, mode, scope, receive, send):
+        status_code = 500
+
+        async def capture_send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+
+        try:
+            profiler = SamplingProfiler(
+                mode=mode, interval=settings.PROFILER_INTERVAL_MS / 1000
+            )
+            profiler.start()
+        except ValueError as e:
+            await self._send_text(send, 400, f"{e}\n".encode("utf-8"), {})
+            return
+        except ProfilerBusyError as e:
+            await self._send_text(send, 409, f"{e}\n".encode("utf-8"), {})
+            return
+
+        try:
+            await self.app(scope, receive, capture_send)
+        finally:
+            profiler.stop()
+
+        await self._send_text(
+            send,
+            200,
+            profiler.collapsed().encode("utf-8"),
+            {
+                b"x-profile-mode": mode.encode(),
+                b"x-profile-samples": str(profiler.samples).encode(),
+                b"x-profile-status": str(status_code).encode(),
+            },
+        )
+
+    @staticmethod
+    async def _send_text(send, status: int, body: bytes, extra_headers: dict):
+        headers = [
+            (b"content-type", b"text/plain; charset=utf-8"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        headers.extend(extra_headers.items())
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,112 @@
+"""
+签名下载链接
+
+授权接口（需要查询数据库、校验密钥）只负责生成一个带 HMAC 签名和过期时间的链接，
+文件由 /api/blobs/{kind}/{path} 发送：只校验签名和过期时间，不访问数据库。
+签名覆盖文件类型、存储路径、过期时间和所有查询参数（下载文件名、压缩格式等），任何一项被修改都会失效。
+
+链接格式: {SIGNED_URL_BASE}/api/blobs/{kind}/{path}?{参数}&expires={unix 秒}&sig={签名}
+其中 path 为文件相对于存储目录的路径。
+
+过期时间向上取整到 SIGNED_URL_EXPIRES / 2 的整数倍：同一时间窗口内同一文件的链接完全相同，
+CDN 和浏览器可以按 URL 复用缓存；每个链接的有效期不少于 SIGNED_URL_EXPIRES，不超过其 1.5 倍。
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Tuple
+from urllib.parse import quote, urlencode
+
+from app.config import settings
+
+# 文件类型 -> 存储目录
+PACKAGES = "packages"
+BACKUPS = "backups"
+
+
+def storage_root(kind: str) -> Path:
+    if kind == PACKAGES:
+        return settings.UPLOAD_DIR
+    if kind == BACKUPS:
+        return settings.BACKUP_DIR
+    raise ValueError(f"未知的文件类型: {kind}")
+
+
+def _key() -> bytes:
+    """签名密钥，未配置 SIGNED_URL_SECRET 时由 JWT 密钥派生"""
+    secret = settings.SIGNED_URL_SECRET or f"signed-url:{settings.JWT_SECRET_KEY}"
+    return hashlib.sha256(secret.encode("utf-8")).digest()
+
+
+def _signature(kind: str, path: str, params: Dict[str, str]) -> str:
+    message = json.dumps([kind, path, sorted(params.items())], ensure_ascii=False, separators=(",", ":"))
+    digest = hmac.new(_key(), message.encode("utf-8"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+
+
+def relative_path(kind: str, file_path: str) -> str:
+    """文件相对于存储目录的路径（使用 / 分隔）"""
+    return Path(file_path).resolve().relative_to(storage_root(kind).resolve()).as_posix()
+
+
+def _expires_at(now: int) -> int:
+    """过期时间（unix 秒），向上取整到时间窗口的边界"""
+    window = max(settings.SIGNED_URL_EXPIRES // 2, 1)
+    return -(-(now + settings.SIGNED_URL_EXPIRES) // window) * window
+
+
+def create_signed_url(kind: str, file_path: str, params: Dict[str, str]) -> Tuple[str, datetime]:
+    """
+    生成签名下载链接
+
+    Args:
+        kind: 文件类型（PACKAGES / BACKUPS）
+        file_path: 文件路径（必须位于该类型的存储目录中）
+        params: 需要一起签名的查询参数
+
+    Returns:
+        Tuple[str, datetime]: (链接, 过期时间 UTC)
+    """
+    path = relative_path(kind, file_path)
+    expires = _expires_at(int(time.time()))
+    query = {**params, "expires": str(expires)}
+    query["sig"] = _signature(kind, path, query)
+    url = f"{settings.SIGNED_URL_BASE.rstrip('/')}/api/blobs/{kind}/{quote(path)}?{urlencode(query)}"
+    return url, datetime.utcfromtimestamp(expires)
+
+
+def verify_signed_url(kind: str, path: str, query: Dict[str, str]) -> int:
+    """
+    校验签名链接
+
+    Returns:
+        int: 链接剩余有效时间（秒），签名无效或已过期时返回 0
+    """
+    params = dict(query)
+    signature = params.pop("sig", "")
+    try:
+        remaining = int(params.get("expires", "")) - int(time.time())
+    except ValueError:
+        return 0
+    if remaining <= 0:
+        return 0
+    if not hmac.compare_digest(signature, _signature(kind, path, params)):
+        return 0
+    return remaining
+
+
+def resolve_blob_path(kind: str, path: str) -> Path:
+    """
+    签名校验通过后取得文件的实际路径
+
+    Raises:
+        ValueError: 路径不在存储目录中
+    """
+    root = storage_root(kind).resolve()
+    file_path = (root / path).resolve()
+    file_path.relative_to(root)
+    return file_path
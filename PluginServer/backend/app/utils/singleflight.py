@@ -0,0 +1,136 @@
+"""
+合并并发的相同查询（single-flight）
+
+客户端集中启动时，同一秒内会到达大量完全相同的读请求。同一个键同时只执行一次加载函数，
+期间到达的相同请求直接等待这次执行的结果，不再各自占用数据库连接和重复查询。
+
+加载在独立的任务中执行，某个等待方断开连接（任务被取消）不会影响其他等待方。
+每次执行有超时时间：超时后取消这次执行，所有等待方收到 asyncio.TimeoutError，
+之后到达的请求重新开始一次新的执行。
+
+键使用与 app.utils.cache 相同的层级命名，forget() 可以按失效消息丢弃执行中的查询，
+保证失效之后到达的请求不会拿到失效之前开始加载的数据。
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List
+
+from app.utils.cache import _matches
+
+# 已创建的实例
+_registry: List["SingleFlight"] = []
+
+
+class _Flight:
+    """一次正在执行的加载"""
+
+    __slots__ = ("task", "deadline", "waiters", "timed_out")
+
+    def __init__(self, task: asyncio.Task, deadline: float):
+        self.task = task
+        self.deadline = deadline
+        self.waiters = 0
+        self.timed_out = False
+
+
+class SingleFlight:
+    """
+    按键合并并发调用
+
+    不是线程安全的，只在事件循环线程中使用。
+    """
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: 名称（用于统计）
+        """
+        self.name = name
+        self.executed = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.errors = 0
+        self._flights: Dict[str, _Flight] = {}
+        _registry.append(self)
+
+    async def do(self, key: str, loader: Callable[[], Awaitable[Any]], timeout: float) -> Any:
+        """
+        执行 loader 或等待同一个键正在执行的 loader，返回其结果
+
+        Args:
+            key: 查询键，结果相同的调用使用相同的键
+            loader: 加载函数，只在没有相同键正在执行时调用
+            timeout: 这次执行的超时时间（秒），从执行开始计算
+
+        Raises:
+            asyncio.TimeoutError: 执行超时
+            loader 抛出的异常会传给所有等待方
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            task = asyncio.ensure_future(loader())
+            flight = _Flight(task, time.monotonic() + timeout)
+            self._flights[key] = flight
+            task.add_done_callback(lambda _, f=flight: self._finish(key, f))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+
+        flight.waiters += 1
+        try:
+            remaining = flight.deadline - time.monotonic()
+            return await asyncio.wait_for(asyncio.shield(flight.task), max(remaining, 0))
+        except asyncio.TimeoutError:
+            # 所有等待方同时超时，只由第一个取消执行
+            if not flight.timed_out and not flight.task.done():
+                flight.timed_out = True
+                self.timeouts += 1
+                self._forget(key, flight)
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _finish(self, key: str, flight: _Flight) -> None:
+        self._forget(key, flight)
+        if not flight.task.cancelled() and flight.task.exception() is not None:
+            self.errors += 1
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def forget(self, key: str) -> int:
+        """
+        丢弃键及其子键正在执行的加载，之后到达的调用重新执行
+
+        已经在等待的调用仍然得到原来那次执行的结果。
+
+        Returns:
+            int: 丢弃的执行数
+        """
+        matched = [k for k in self._flights if _matches(k, key)]
+        for k in matched:
+            del self._flights[k]
+        return len(matched)
+
+    def forget_keys(self, keys: Iterable[str]) -> None:
+        """按失效消息批量丢弃（可直接注册为失效总线的监听器）"""
+        for key in keys:
+            self.forget(key)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "in_flight": len(self._flights),
+            "waiting": sum(f.waiters for f in self._flights.values()),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
+
+
+def singleflight_stats() -> List[dict]:
+    """所有实例的统计信息"""
+    return [flight.stats() for flight in _registry]
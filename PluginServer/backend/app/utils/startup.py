@@ -0,0 +1,75 @@
+"""
+启动耗时统计
+
+记录 worker 从导入应用包到处理完第一个请求的各阶段耗时：
+
+- imported:      应用模块导入完成
+- ready:         lifespan 启动流程完成，开始接收请求
+- first_request: 第一个请求处理完成
+"""
+import time
+from typing import Dict, Optional
+
+from app import BOOT_STARTED
+
+
+class StartupTimer:
+    """启动阶段计时器，各阶段只记录第一次"""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.marks: Dict[str, float] = {}
+
+    def mark(self, name: str) -> float:
+        """记录阶段完成时间（相对导入开始的秒数）"""
+        if name not in self.marks:
+            self.marks[name] = round(time.perf_counter() - self.started, 4)
+        return self.marks[name]
+
+    def rebase(self) -> None:
+        """
+        以当前时间作为新的起点（预加载后 fork 出的 worker 使用）
+        
+        应用模块已在主进程中导入，worker 的导入耗时记为 0。
+        """
+        self.started = time.perf_counter()
+        self.marks = {"imported": 0.0}
+
+    def get(self, name: str) -> Optional[float]:
+        return self.marks.get(name)
+
+    def report(self) -> Dict[str, Optional[float]]:
+        """返回各阶段耗时报告"""
+        imported = self.get("imported")
+        ready = self.get("ready")
+        first_request = self.get("first_request")
+        return {
+            "import_seconds": imported,
+            "init_seconds": round(ready - imported, 4) if ready is not None and imported is not None else None,
+            "ready_seconds": ready,
+            "first_request_seconds": first_request,
+        }
+
+
+startup_timer = StartupTimer(BOOT_STARTED)
+
+
+class StartupTimingMiddleware:
+    """记录第一个请求完成时间的 ASGI 中间件，之后只剩一次布尔判断"""
+
+    def __init__(self, app):
+        self.app = app
+        self.recorded = False
+
+    async def __call__(self, scope, receive, send):
+        if self.recorded or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if not self.recorded:
+                self.recorded = True
+                elapsed = startup_timer.mark("first_request")
+                print(f"✓ 首个请求处理完成，距导入开始 {elapsed:.3f}s")
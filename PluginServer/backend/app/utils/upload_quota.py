@@ -0,0 +1,58 @@
+"""
+备份上传配额预检中间件
+
+FastAPI 在调用路由函数之前会先读取整个 multipart 请求体并写入临时文件，
+在路由或服务中检查配额时数据已经落盘。该中间件在读取请求体之前，
+按 Content-Length 和 X-User-Key / X-Plugin-Name 请求头检查配额，超出时直接返回 413。
+
+请求头是可选的：未携带时由 BackupService.create_backup 按实际文件大小检查。
+Content-Length 包含 multipart 边界和表单字段，比文件本身略大，预检偏保守。
+"""
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+
+from app.config import settings
+from app.database import AsyncSessionLocal
+from app.services.backup_service import BackupService
+
+# 需要预检的上传端点
+BACKUP_UPLOAD_PATH = "/api/backups/upload"
+
+
+class BackupQuotaMiddleware:
+    """在请求体到达之前拒绝超出配额的备份上传"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] != "POST"
+            or scope["path"] != BACKUP_UPLOAD_PATH
+            or not (settings.BACKUP_UPLOAD_QUOTA_BYTES or settings.BACKUP_PLUGIN_UPLOAD_QUOTA_BYTES)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        user_key = headers.get("x-user-key")
+        content_length = headers.get("content-length", "")
+        if user_key and content_length.isdigit():
+            try:
+                async with AsyncSessionLocal() as db:
+                    await BackupService.check_quota(
+                        db, user_key, headers.get("x-plugin-name") or None, int(content_length)
+                    )
+            except HTTPException as exc:
+                # 请求体未读取，关闭连接而不是继续复用
+                response = JSONResponse(
+                    status_code=exc.status_code,
+                    content={"success": False, "message": exc.detail, "data": None},
+                    headers={"Connection": "close"},
+                )
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
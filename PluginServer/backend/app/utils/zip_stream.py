@@ -0,0 +1,108 @@
+"""
+边组装边发送的 ZIP 归档（不生成临时文件）
+
+条目按存储方式（ZIP_STORED）写入，不重新压缩：插件安装包本身已经是 zip，再压缩只会浪费 CPU。
+zipfile 写入不可 seek 的输出时会为每个条目使用数据描述符（CRC 和大小写在数据之后），
+因此可以一边读取源文件一边输出，内存占用只与分块大小有关。
+
+所有函数都是同步阻塞的，由 StreamingResponse 在线程池中迭代。
+"""
+import io
+import json
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple, Union
+
+
+class _ChunkSink(io.RawIOBase):
+    """只追加、不可 seek 的输出，收集 zipfile 写出的数据供生成器取走"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def bundle_entries(packages) -> List[Tuple[str, Union[Path, bytes]]]:
+    """
+    批量下载归档的条目：先是 manifest.json（各插件的版本号、文件名、大小和 SHA256），然后是各插件的安装包
+
+    中心服务器和镜像节点共用，保证两者的归档格式相同。
+
+    Args:
+        packages: 安装包列表（需要 plugin_name、version、file_name、file_size、file_hash、file_path 属性）
+    """
+    manifest = {
+        "created_at": datetime.utcnow().isoformat() + "Z",
+        "plugins": [
+            {
+                "name": package.plugin_name,
+                "version": package.version,
+                "file_name": package.file_name,
+                "file_size": package.file_size,
+                "sha256": package.file_hash,
+            }
+            for package in packages
+        ],
+    }
+    entries = [("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))]
+    entries += [(package.file_name, Path(package.file_path)) for package in packages]
+    return entries
+
+
+def iter_zip(entries: Iterable[Tuple[str, Union[Path, bytes]]], chunk_size: int) -> Iterator[bytes]:
+    """
+    逐块生成 ZIP 归档
+
+    Args:
+        entries: (归档内文件名, 文件路径或内容) 列表，按顺序写入
+        chunk_size: 读取源文件的分块大小
+
+    Yields:
+        bytes: 归档数据块（不为空）
+    """
+    for chunk in _iter_zip(entries, chunk_size):
+        if chunk:
+            yield chunk
+
+
+def _iter_zip(entries: Iterable[Tuple[str, Union[Path, bytes]]], chunk_size: int) -> Iterator[bytes]:
+    # 延迟导入：只有批量下载时才需要组装 ZIP
+    import zipfile
+
+    sink = _ChunkSink()
+    date_time = time.gmtime()[:6]
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        for name, source in entries:
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            info.compress_type = zipfile.ZIP_STORED
+            if isinstance(source, bytes):
+                archive.writestr(info, source)
+                yield sink.take()
+                continue
+
+            # 预先给出大小，超过 4GB 的条目自动使用 zip64
+            info.file_size = source.stat().st_size
+            with open(source, "rb") as src, archive.open(info, mode="w") as dst:
+                while chunk := src.read(chunk_size):
+                    dst.write(chunk)
+                    yield sink.take()
+            yield sink.take()
+    yield sink.take()
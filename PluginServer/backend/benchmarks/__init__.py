@@ -0,0 +1,7 @@
+"""
+性能基准测试包
+
+- catalog:  合成插件目录生成器（N 插件 × M 版本 × K 备份）
+- loadtest: 进程内端到端负载测试，输出 JSON 结果并可与基线对比
+- query_plans: 热点查询的 EXPLAIN QUERY PLAN 审计，未命中预期索引时退出码为 1
+"""
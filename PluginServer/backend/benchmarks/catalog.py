@@ -0,0 +1,143 @@
+"""
+合成插件目录生成器
+
+直接写入数据库行和 ZIP 文件，生成 N 个插件 × M 个版本 × K 个备份的测试数据，
+避免逐个走上传接口导致准备阶段比测试本身还慢。
+"""
+import hashlib
+import io
+import json
+import os
+import random
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Tuple
+
+
+@dataclass
+class Catalog:
+    """生成结果，供负载测试挑选请求参数"""
+    plugin_names: List[str] = field(default_factory=list)
+    versions: List[Tuple[str, str]] = field(default_factory=list)
+    user_keys: List[str] = field(default_factory=list)
+    backups: List[Tuple[str, int]] = field(default_factory=list)
+
+
+def build_plugin_zip(name: str, version: str, payload_size: int, seed: int = 0) -> bytes:
+    """构造包含 plugin.json 和随机负载的插件 ZIP"""
+    manifest = {
+        "name": name,
+        "displayName": name.rsplit(".", 1)[-1].title(),
+        "version": version,
+        "description": f"Synthetic plugin {name}",
+        "author": "benchmark",
+        "main": f"{name}.dll",
+        "entryClass": f"{name}.Plugin",
+        "changelog": f"release {version}",
+    }
+    payload = random.Random(seed).randbytes(payload_size)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_STORED) as zf:
+        zf.writestr("plugin.json", json.dumps(manifest))
+        zf.writestr(f"{name}.dll", payload)
+    return buffer.getvalue()
+
+
+async def generate_catalog(
+    session_factory,
+    upload_dir: Path,
+    backup_dir: Path,
+    plugins: int,
+    versions: int,
+    backups: int,
+    package_size: int = 64 * 1024,
+    backup_size: int = 64 * 1024,
+) -> Catalog:
+    """
+    生成合成目录
+
+    Args:
+        session_factory: 异步会话工厂（AsyncSessionLocal）
+        upload_dir: 插件文件目录
+        backup_dir: 备份文件目录
+        plugins: 插件数量 N
+        versions: 每个插件的版本数量 M
+        backups: 每个插件对应用户的备份数量 K
+        package_size: 每个插件包的负载大小（字节）
+        backup_size: 每个备份文件大小（字节）
+    """
+    # 延迟导入：调用方需要先设置好数据目录相关的环境变量
+    from sqlalchemy import select
+    from app.models.plugin import Plugin
+    from app.models.version import PluginVersion
+    from app.models.backup import Backup
+
+    catalog = Catalog()
+    rng = random.Random(42)
+
+    async with session_factory() as db:
+        for i in range(plugins):
+            name = f"com.benchmark.plugin{i:05d}"
+            plugin_dir = upload_dir / name
+            plugin_dir.mkdir(parents=True, exist_ok=True)
+
+            version_rows = []
+            for j in range(versions):
+                version = f"1.{j}.0"
+                content = build_plugin_zip(name, version, package_size, seed=i * 1000 + j)
+                file_name = f"{name}@{version}.zip"
+                file_path = plugin_dir / file_name
+                file_path.write_bytes(content)
+                version_rows.append(PluginVersion(
+                    plugin_name=name,
+                    version=version,
+                    file_name=file_name,
+                    file_path=str(file_path),
+                    file_size=len(content),
+                    file_hash=hashlib.sha256(content).hexdigest(),
+                    changelog=f"release {version}",
+                    download_count=rng.randint(0, 1000),
+                ))
+                catalog.versions.append((name, version))
+
+            db.add(Plugin(
+                name=name,
+                display_name=f"Plugin {i}",
+                description=f"Synthetic plugin {i}",
+                author="benchmark",
+                main_dll=f"{name}.dll",
+                entry_class=f"{name}.Plugin",
+                current_version=version_rows[-1].version if version_rows else None,
+                total_download_count=sum(row.download_count for row in version_rows),
+                upload_key=f"key_{i}",
+            ))
+            db.add_all(version_rows)
+            catalog.plugin_names.append(name)
+
+            user_key = f"user_{i:05d}"
+            catalog.user_keys.append(user_key)
+            user_dir = backup_dir / user_key / "program"
+            if backups:
+                user_dir.mkdir(parents=True, exist_ok=True)
+            for k in range(backups):
+                content = os.urandom(backup_size)
+                file_hash = hashlib.sha256(content).hexdigest()
+                file_path = user_dir / f"{file_hash[:8]}.zip"
+                file_path.write_bytes(content)
+                db.add(Backup(
+                    user_key=user_key,
+                    backup_type="program",
+                    file_name=f"backup_{k}.zip",
+                    file_path=str(file_path),
+                    file_size=len(content),
+                    file_hash=file_hash,
+                    description="",
+                ))
+
+        await db.commit()
+
+        result = await db.execute(select(Backup.user_key, Backup.id))
+        catalog.backups = [(row.user_key, row.id) for row in result]
+
+    return catalog
@@ -0,0 +1,233 @@
+"""
+上传 / 哈希 / ZIP 热路径微基准
+
+针对以下函数在不同文件大小和分块大小下测量吞吐量（MB/s）、读写系统调用次数和峰值内存：
+
+- calculate_file_hash
+- FileService.save_upload_file
+- FileService.parse_plugin_json
+- BackupService.create_backup
+
+每个用例在独立子进程中运行，保证峰值 RSS 互不影响。
+系统调用次数来自 /proc/self/io（仅 Linux），其他平台显示为 null。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.micro --sizes 1 10 100 500 --chunk-sizes 8192 65536 1048576 \\
+        --output micro.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmarks.loadtest import BACKEND_DIR, prepare_environment
+
+TARGETS = ["hash", "save_upload", "parse_plugin_json", "create_backup"]
+
+# 与分块大小无关的用例，只按文件大小运行一次
+CHUNK_INDEPENDENT = {"parse_plugin_json"}
+
+MB = 1024 * 1024
+
+
+def read_proc_io() -> Optional[Dict[str, int]]:
+    """读取 /proc/self/io 中的系统调用计数"""
+    try:
+        with open("/proc/self/io", "r") as f:
+            values = dict(line.split(": ") for line in f.read().splitlines())
+        return {"syscr": int(values["syscr"]), "syscw": int(values["syscw"])}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def current_rss_mb() -> Optional[float]:
+    """当前常驻内存（MB），仅 Linux"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / MB
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """进程峰值常驻内存（MB）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / 1024 if sys.platform != "darwin" else peak / MB
+
+
+def write_data_files(data_dir: Path, size_mb: int) -> Dict[str, Path]:
+    """生成指定大小的随机数据文件和插件 ZIP"""
+    raw_path = data_dir / f"raw_{size_mb}mb.bin"
+    zip_path = data_dir / f"plugin_{size_mb}mb.zip"
+    if not raw_path.exists():
+        with open(raw_path, "wb") as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(MB))
+    if not zip_path.exists():
+        manifest = {
+            "name": "com.benchmark.micro",
+            "version": "1.0.0",
+            "main": "Micro.dll",
+            "entryClass": "Micro.Plugin",
+        }
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_STORED) as zf:
+            zf.writestr("plugin.json", json.dumps(manifest))
+            zf.write(raw_path, "Micro.dll")
+    return {"raw": raw_path, "zip": zip_path}
+
+
+async def _measure(target: str, data: Dict[str, Path], repeat: int) -> Dict:
+    """执行用例并返回耗时、系统调用和内存增量，导入与初始化不计入测量"""
+    from fastapi import UploadFile
+    from app.config import settings
+    from app.database import AsyncSessionLocal, init_db
+    from app.services.backup_service import BackupService
+    from app.services.file_service import FileService
+    from app.utils.hash import calculate_file_hash
+
+    if target == "create_backup":
+        settings.ensure_directories()
+        await init_db()
+
+    rss_before = current_rss_mb()
+    io_before = read_proc_io()
+    started = time.perf_counter()
+    for i in range(repeat):
+        if target == "hash":
+            await calculate_file_hash(data["raw"])
+        elif target == "save_upload":
+            with open(data["raw"], "rb") as f:
+                await FileService.save_upload_file(
+                    UploadFile(file=f, filename="micro.zip"), "com.benchmark.micro", f"1.0.{i}"
+                )
+        elif target == "parse_plugin_json":
+            await FileService.parse_plugin_json(data["zip"])
+        elif target == "create_backup":
+            with open(data["raw"], "rb") as f:
+                async with AsyncSessionLocal() as db:
+                    await BackupService.create_backup(
+                        db, "micro_user", "program", UploadFile(file=f, filename="micro.zip")
+                    )
+    elapsed = time.perf_counter() - started
+    io_after = read_proc_io()
+
+    measured = {"elapsed": elapsed, "rss_before": rss_before, "syscr": None, "syscw": None}
+    if io_before and io_after:
+        measured["syscr"] = io_after["syscr"] - io_before["syscr"]
+        measured["syscw"] = io_after["syscw"] - io_before["syscw"]
+    return measured
+
+
+def run_case(target: str, size_mb: int, chunk_size: int, data_dir: Path,
+             work_dir: Path, repeat: int) -> Dict:
+    """在当前（子）进程中执行单个用例"""
+    prepare_environment(work_dir)
+    from app.config import settings
+
+    settings.FILE_CHUNK_SIZE = chunk_size
+    data = write_data_files(data_dir, size_mb)
+    bytes_per_run = data["zip"].stat().st_size if target == "parse_plugin_json" else data["raw"].stat().st_size
+
+    measured = asyncio.run(_measure(target, data, repeat))
+    elapsed = measured["elapsed"]
+
+    result = {
+        "target": target,
+        "size_mb": size_mb,
+        "chunk_size": None if target in CHUNK_INDEPENDENT else chunk_size,
+        "repeat": repeat,
+        "seconds_per_run": round(elapsed / repeat, 6),
+        "mb_per_s": round(bytes_per_run * repeat / MB / elapsed, 2) if elapsed else None,
+        "read_syscalls_per_run": None,
+        "write_syscalls_per_run": None,
+        "peak_rss_mb": None,
+        "rss_growth_mb": None,
+    }
+    if measured["syscr"] is not None:
+        result["read_syscalls_per_run"] = measured["syscr"] // repeat
+        result["write_syscalls_per_run"] = measured["syscw"] // repeat
+    peak = peak_rss_mb()
+    if peak is not None:
+        result["peak_rss_mb"] = round(peak, 2)
+        if measured["rss_before"] is not None:
+            result["rss_growth_mb"] = round(peak - measured["rss_before"], 2)
+    return result
+
+
+def spawn_case(target: str, size_mb: int, chunk_size: int, data_dir: Path, repeat: int) -> Dict:
+    """在新的子进程中运行用例并解析其 JSON 输出"""
+    with tempfile.TemporaryDirectory(prefix="microdock-micro-") as work_dir:
+        output = subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.micro", "--run-case",
+                target, str(size_mb), str(chunk_size), str(data_dir), work_dir, str(repeat),
+            ],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    # 取最后一行，忽略应用启动时的其他输出
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="上传/哈希/ZIP 热路径微基准")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100], help="文件大小（MB）")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[8192, 65536, 1024 * 1024],
+                        help="分块大小（字节）")
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=TARGETS, help="要测试的函数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用例的重复次数")
+    parser.add_argument("--output", type=Path, default=None, help="结果 JSON 输出路径")
+    parser.add_argument("--run-case", nargs=6, metavar="ARG", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    if args.run_case:
+        target, size_mb, chunk_size, data_dir, work_dir, repeat = args.run_case
+        result = run_case(target, int(size_mb), int(chunk_size), Path(data_dir), Path(work_dir), int(repeat))
+        print(json.dumps(result))
+        return 0
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="microdock-micro-data-") as data_dir:
+        for size_mb in args.sizes:
+            for target in args.targets:
+                chunk_sizes = args.chunk_sizes[:1] if target in CHUNK_INDEPENDENT else args.chunk_sizes
+                for chunk_size in chunk_sizes:
+                    result = spawn_case(target, size_mb, chunk_size, Path(data_dir), args.repeat)
+                    results.append(result)
+                    print(
+                        f"{target:<18} {size_mb:>4} MB  chunk {str(result['chunk_size'] or '-'):>8}  "
+                        f"{result['mb_per_s'] or 0:>9.1f} MB/s  "
+                        f"r/w syscalls {result['read_syscalls_per_run']}/{result['write_syscalls_per_run']}  "
+                        f"peak RSS {result['peak_rss_mb']} MB"
+                    )
+
+    if args.output:
+        args.output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"结果已写入: {args.output.resolve()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
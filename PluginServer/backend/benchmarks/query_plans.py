@@ -0,0 +1,229 @@
+"""
+查询计划审计
+
+在临时 SQLite 数据库中生成合成目录，调用服务层的热点查询并捕获实际执行的 SQL，
+用 EXPLAIN QUERY PLAN 检查是否命中预期的索引、是否需要临时排序（USE TEMP B-TREE）。
+任一检查失败时退出码为 1，可在 CI 中防止索引被误删或查询写法退化。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.query_plans --plugins 200 --versions 5 --backups 5 --verbose
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from benchmarks.loadtest import prepare_environment
+
+
+@dataclass
+class PlanCheck:
+    """一项查询计划检查"""
+    label: str
+    # 执行查询的协程函数，参数为 (数据库会话, 合成目录)
+    run: Callable[..., Awaitable]
+    # 要检查的 SELECT 语句所查询的表（取捕获到的第一条）
+    table: str
+    # 查询计划中必须出现的索引名（或 INTEGER PRIMARY KEY）
+    expected: str
+    # 是否允许临时排序（结果集很小的查询）
+    allow_sort: bool = False
+
+
+def build_checks() -> List[PlanCheck]:
+    from app.services.backup_service import BackupService
+    from app.services.change_service import ChangeService
+    from app.services.download_stats import DownloadStatsService, DAY
+    from app.services.job_service import job_queue
+    from app.services.package_service import PackageService
+    from app.services.plugin_service import PluginService
+    from app.services.retention_service import RetentionService
+    from app.services.version_service import VersionService
+
+    async def user_backups(db, catalog):
+        await BackupService.get_user_backups(db, catalog.user_keys[len(catalog.user_keys) // 2])
+
+    async def retention_scan(db, catalog):
+        report = {"retention_deleted": 0, "retention_bytes": 0}
+        await RetentionService._apply_user_retention(db, catalog.user_keys[0], datetime.utcnow(), report)
+        await db.rollback()
+
+    async def plugin_versions(db, catalog):
+        await VersionService.get_versions_by_plugin_name(db, catalog.plugin_names[len(catalog.plugin_names) // 2])
+
+    async def plugin_catalog(db, catalog):
+        await PluginService.get_all_plugins(db)
+
+    async def current_package(db, catalog):
+        await PackageService.get_package(db, catalog.plugin_names[len(catalog.plugin_names) // 2])
+
+    async def backup_usage(db, catalog):
+        await BackupService.get_usage(db, catalog.user_keys[0])
+
+    async def changes_since(db, catalog):
+        await ChangeService.get_changes_since(db, 0, 100)
+
+    async def claim_job(db, catalog):
+        await job_queue._claim()
+
+    async def top_plugins(db, catalog):
+        await DownloadStatsService.get_top_plugins(db, 7, 10)
+
+    async def download_trend(db, catalog):
+        await DownloadStatsService.get_trend(db, catalog.plugin_names[0], DAY, 30)
+
+    async def version_share(db, catalog):
+        await DownloadStatsService.get_version_share(db, catalog.plugin_names[0], 30)
+
+    return [
+        PlanCheck("备份列表 get_user_backups", user_backups, "backups", "ix_backups_user_created"),
+        PlanCheck("保留策略 _apply_user_retention", retention_scan, "backups", "ix_backups_user_created"),
+        PlanCheck("版本列表 get_versions_by_plugin_name", plugin_versions, "plugin_versions",
+                  "ix_plugin_versions_plugin_created"),
+        PlanCheck("插件列表 get_all_plugins", plugin_catalog, "plugins", "ix_plugins_created_at"),
+        # 插件按主键定位，再按 (插件名, 当前版本号) 主键定位版本
+        PlanCheck("下载信息 get_package", current_package, "plugin_versions",
+                  "sqlite_autoindex_plugin_versions_1"),
+        PlanCheck("备份用量 get_usage", backup_usage, "backup_usage", "sqlite_autoindex_backup_usage_1"),
+        PlanCheck("变更订阅 get_changes_since", changes_since, "plugin_changes", "INTEGER PRIMARY KEY"),
+        # pending / 锁超时两个条件走 MULTI-INDEX OR，只对到期的候选任务排序
+        PlanCheck("任务领取 JobQueue._claim", claim_job, "jobs", "ix_jobs_status_run_after", allow_sort=True),
+        # 逐个插件按主键定位区间内的日桶，排行按聚合结果排序
+        PlanCheck("热门排行 get_top_plugins", top_plugins, "download_stats",
+                  "sqlite_autoindex_download_stats_1", allow_sort=True),
+        PlanCheck("下载趋势 get_trend", download_trend, "download_stats", "sqlite_autoindex_download_stats_1"),
+        # 按版本分组并按下载次数排序，只涉及单个插件的版本
+        PlanCheck("版本占比 get_version_share", version_share, "download_stats",
+                  "sqlite_autoindex_download_stats_1", allow_sort=True),
+    ]
+
+
+def explain(database: Path, statement: str, parameters) -> List[str]:
+    """返回 EXPLAIN QUERY PLAN 的各行说明"""
+    with sqlite3.connect(database) as conn:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+    return [row[-1] for row in rows]
+
+
+def evaluate(check: PlanCheck, plan: List[str]) -> Optional[str]:
+    """检查通过返回 None，否则返回失败原因"""
+    text = "\n".join(plan)
+    if check.expected not in text:
+        return f"未使用 {check.expected}"
+    if "USE TEMP B-TREE FOR ORDER BY" in text and not check.allow_sort:
+        return "需要临时排序"
+    return None
+
+
+async def run_audit(args) -> List[Tuple[PlanCheck, List[str], Optional[str]]]:
+    from sqlalchemy import event
+    from app.config import settings
+    from app.database import AsyncSessionLocal, engine, init_db
+    from benchmarks.catalog import generate_catalog
+
+    settings.ensure_directories()
+    await init_db()
+    catalog = await generate_catalog(
+        AsyncSessionLocal,
+        settings.UPLOAD_DIR,
+        settings.BACKUP_DIR,
+        args.plugins,
+        args.versions,
+        args.backups,
+        package_size=1024,
+        backup_size=1024,
+    )
+    # 写入插件变更、用量记录和下载统计，让相关表不为空
+    from app.services.backup_service import BackupService
+    from app.services.change_service import ChangeService, VERSION_ADDED
+    from app.services.download_stats import DownloadStatsService, download_stats
+    async with AsyncSessionLocal() as db:
+        for name, version in catalog.versions:
+            ChangeService.record(db, name, VERSION_ADDED, version)
+        await BackupService.rebuild_usage(db)
+        await db.commit()
+    for name, version in catalog.versions:
+        download_stats.record(name, version)
+    await download_stats.flush()
+    await DownloadStatsService.compact()
+    async with engine.begin() as conn:
+        await conn.exec_driver_sql("ANALYZE")
+
+    database = Path(engine.url.database)
+    captured: List[Tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    results = []
+    event.listen(engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        for check in build_checks():
+            captured.clear()
+            async with AsyncSessionLocal() as db:
+                await check.run(db, catalog)
+            selects = [
+                (statement, parameters) for statement, parameters in captured
+                if statement.lstrip().upper().startswith("SELECT") and f"FROM {check.table}" in statement
+            ]
+            if not selects:
+                results.append((check, [], f"未捕获到查询 {check.table} 的 SELECT"))
+                continue
+            plan = explain(database, *selects[0])
+            results.append((check, plan, evaluate(check, plan)))
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", capture)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="MicroDock 插件服务器查询计划审计（SQLite）")
+    parser.add_argument("--plugins", type=int, default=200, help="插件数量 N")
+    parser.add_argument("--versions", type=int, default=5, help="每个插件的版本数 M")
+    parser.add_argument("--backups", type=int, default=5, help="每个用户的备份数 K")
+    parser.add_argument("--verbose", action="store_true", help="输出完整查询计划")
+    parser.add_argument("--keep", action="store_true", help="保留临时数据目录")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    original_cwd = Path.cwd()
+
+    work_dir = Path(tempfile.mkdtemp(prefix="microdock-plans-"))
+    prepare_environment(work_dir)
+    os.environ["CATALOG_CACHE_TTL"] = "0"
+    try:
+        results = asyncio.run(run_audit(args))
+    finally:
+        os.chdir(original_cwd)
+        if args.keep:
+            print(f"数据目录已保留: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    failures = 0
+    for check, plan, error in results:
+        status = "✓" if error is None else "❌"
+        print(f"{status} {check.label}: {error or check.expected}")
+        if args.verbose or error:
+            for line in plan:
+                print(f"      {line}")
+        failures += error is not None
+
+    if failures:
+        print(f"{failures} 项查询计划检查失败")
+        return 1
+    print("所有查询计划检查通过")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,431 @@
+"""
+生产环境多进程启动入口
+
+主进程预先导入应用并监听端口，然后 fork 出 N 个 uvicorn worker 共享同一个监听套接字。
+
+- 默认每个 CPU 核心一个 worker（WORKERS=0）
+- SIGHUP:          平滑重载。先启动新一代 worker，全部就绪后再优雅停止旧 worker
+- SIGTERM/SIGINT:  优雅退出，超过 WORKER_GRACEFUL_TIMEOUT 仍未退出的 worker 会被强制结束
+- WORKER_MAX_REQUESTS: worker 处理指定数量的请求后自动退出并由主进程补充，限制内存增长
+
+启动前会检查不安全的配置：开启 DEBUG，或多 worker 下 SQLite 未启用 WAL 时拒绝启动。
+多 worker 且 CACHE_BUS_TRANSPORT=local 时自动改用 unix 传输，保证各 worker 的缓存同步失效。
+
+用法:
+    python serve.py
+    python serve.py --workers 4 --max-requests 10000
+    python serve.py --no-preload    # 每个 worker 自行导入应用，SIGHUP 可加载新代码
+
+仅支持类 Unix 系统（依赖 os.fork），Windows 本地开发请使用 start_local.py。
+"""
+import argparse
+import asyncio
+import os
+import random
+import select
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List
+
+import uvicorn
+
+sys.stdout.reconfigure(encoding='utf-8')
+
+from app.config import settings
+
+# worker 连续快速崩溃时的重启间隔上限（秒）
+MAX_RESPAWN_BACKOFF = 30.0
+
+# worker 存活少于该时间即视为启动失败
+FAST_EXIT_SECONDS = 5.0
+
+
+def default_worker_count() -> int:
+    """默认 worker 数：当前进程可用的 CPU 核心数"""
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return max(1, os.cpu_count() or 1)
+
+
+def check_config(workers: int) -> List[str]:
+    """
+    检查生产环境配置
+
+    Returns:
+        List[str]: 拒绝启动的原因列表，为空表示通过
+    """
+    errors = []
+    if settings.DEBUG:
+        errors.append("DEBUG 已开启，生产环境请设置 DEBUG=False")
+
+    is_sqlite = settings.DATABASE_URL.startswith("sqlite")
+    if workers > 1 and is_sqlite and settings.SQLITE_JOURNAL_MODE.upper() != "WAL":
+        errors.append(
+            f"多 worker 下 SQLite 必须使用 WAL 模式（当前 SQLITE_JOURNAL_MODE={settings.SQLITE_JOURNAL_MODE}）"
+        )
+
+    # 默认密钥只警告，不阻止启动
+    for name in ("JWT_SECRET_KEY", "ADMIN_PASSWORD", "UPLOAD_SECRET_KEY"):
+        if getattr(settings, name) == type(settings).model_fields[name].default:
+            print(f"⚠️  警告: {name} 仍为默认值，请在生产环境中修改")
+    return errors
+
+
+def configure_cache_bus(workers: int) -> None:
+    """多 worker 时 local 传输无法通知其他进程，自动切换为同主机的 unix 传输"""
+    if workers > 1 and settings.CACHE_BUS_TRANSPORT.lower() == "local":
+        settings.CACHE_BUS_TRANSPORT = "unix"
+        # 不预加载时 worker 会重新读取环境变量
+        os.environ["CACHE_BUS_TRANSPORT"] = "unix"
+        print("✓ 多 worker 部署，缓存失效总线使用 unix 传输")
+
+
+async def prepare_database(workers: int) -> List[str]:
+    """
+    在 fork 之前初始化数据库，并确认 SQLite 实际生效的日志模式
+
+    某些文件系统（如网络挂载）不支持 WAL，PRAGMA 会静默回退，因此需要读回确认。
+    PostgreSQL 下检查所有 worker 的连接池上限是否超过服务端 max_connections。
+    """
+    from sqlalchemy import text
+    from app.database import engine, init_db
+
+    errors = []
+    settings.ensure_directories()
+    await init_db()
+
+    if workers > 1 and engine.dialect.name == "sqlite":
+        async with engine.connect() as conn:
+            mode = (await conn.execute(text("PRAGMA journal_mode"))).scalar()
+        if str(mode).lower() != "wal":
+            errors.append(f"SQLite 实际日志模式为 {mode}，无法启用 WAL（数据库所在文件系统可能不支持）")
+
+    if engine.dialect.name == "postgresql":
+        # 每个 worker 一个连接池，连接数超过服务端上限时高峰期的请求会连接失败
+        async with engine.connect() as conn:
+            max_connections = int((await conn.execute(text("SHOW max_connections"))).scalar())
+        needed = workers * (settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+        if needed > max_connections:
+            print(
+                f"⚠️  警告: {workers} 个 worker 最多需要 {needed} 个数据库连接，"
+                f"超过 PostgreSQL max_connections={max_connections}，请调小 DB_POOL_SIZE / DB_MAX_OVERFLOW"
+            )
+
+    # fork 前必须释放连接，子进程不能共享父进程的数据库连接
+    await engine.dispose()
+    return errors
+
+
+def create_socket(host: str, port: int) -> socket.socket:
+    """创建所有 worker 共享的监听套接字"""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+class ReadyNotifyingServer(uvicorn.Server):
+    """启动完成后通过管道通知主进程的 uvicorn Server"""
+
+    def __init__(self, config: uvicorn.Config, ready_fd: int):
+        super().__init__(config)
+        self.ready_fd = ready_fd
+
+    async def startup(self, sockets=None):
+        await super().startup(sockets=sockets)
+        if self.started:
+            os.write(self.ready_fd, b"1")
+            os.close(self.ready_fd)
+
+
+class WorkerProcess:
+    """主进程中记录的 worker 信息"""
+
+    def __init__(self, pid: int, generation: int, ready_fd: int):
+        self.pid = pid
+        self.generation = generation
+        self.ready_fd = ready_fd
+        self.started_at = time.monotonic()
+        self.ready = False
+
+
+class Supervisor:
+    """预 fork 的 worker 管理器"""
+
+    def __init__(self, sock: socket.socket, workers: int, max_requests: int,
+                 max_requests_jitter: int, graceful_timeout: float, preload: bool):
+        self.sock = sock
+        self.worker_count = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.preload = preload
+        # 正在提供服务的一代，只有这一代的 worker 退出后会被补充
+        # （正在启动的新一代和正在停止的旧一代都不补充）
+        self.generation = 0
+        self.workers: Dict[int, WorkerProcess] = {}
+        self.respawn_backoff = 0.0
+        self.reload_requested = False
+        self.stop_requested = False
+
+    # ==================== 信号处理 ====================
+
+    def install_signal_handlers(self) -> None:
+        signal.signal(signal.SIGHUP, self._on_reload)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+
+    def _on_reload(self, signum, frame) -> None:
+        self.reload_requested = True
+
+    def _on_stop(self, signum, frame) -> None:
+        self.stop_requested = True
+
+    # ==================== worker 管理 ====================
+
+    def spawn_worker(self, generation: int) -> WorkerProcess:
+        """fork 一个属于指定代的新 worker"""
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for other in self.workers.values():
+                os.close(other.ready_fd)
+            self._run_worker(write_fd)
+            os._exit(0)
+
+        os.close(write_fd)
+        worker = WorkerProcess(pid, generation, read_fd)
+        self.workers[pid] = worker
+        return worker
+
+    def _run_worker(self, ready_fd: int) -> None:
+        """worker 子进程入口，不会返回"""
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, signal.SIG_DFL)
+        random.seed()
+
+        if self.preload:
+            from app.main import app
+            from app.utils.startup import startup_timer
+            # 预加载的模块在主进程中导入，启动计时从 fork 开始重新计算
+            startup_timer.rebase()
+        else:
+            # 丢弃主进程中已导入的应用模块，重新导入以加载最新代码和配置
+            for name in list(sys.modules):
+                if name == "app" or name.startswith("app."):
+                    del sys.modules[name]
+            from app.main import app
+
+        limit = None
+        if self.max_requests > 0:
+            limit = self.max_requests + random.randint(0, max(0, self.max_requests_jitter))
+
+        config = uvicorn.Config(
+            app,
+            limit_max_requests=limit,
+            timeout_graceful_shutdown=int(self.graceful_timeout),
+            proxy_headers=True,
+            log_level="info",
+        )
+        server = ReadyNotifyingServer(config, ready_fd)
+        try:
+            server.run(sockets=[self.sock])
+        finally:
+            os._exit(0)
+
+    def spawn_generation(self) -> List[WorkerProcess]:
+        """启动下一代的全部 worker（全部就绪后由调用方切换 self.generation）"""
+        generation = self.generation + 1
+        return [self.spawn_worker(generation) for _ in range(self.worker_count)]
+
+    def wait_ready(self, workers: List[WorkerProcess], timeout: float) -> bool:
+        """等待指定 worker 全部就绪"""
+        deadline = time.monotonic() + timeout
+        pending = {w.ready_fd: w for w in workers if not w.ready}
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self.stop_requested:
+                return False
+            readable, _, _ = select.select(list(pending), [], [], min(remaining, 0.5))
+            for fd in readable:
+                worker = pending.pop(fd)
+                if os.read(fd, 1):
+                    worker.ready = True
+                else:
+                    # 管道在就绪前被关闭，说明 worker 启动失败
+                    return False
+            self.reap()
+            if any(w.pid not in self.workers for w in pending.values()):
+                return False
+        return True
+
+    def signal_workers(self, workers: List[WorkerProcess], sig: int) -> None:
+        for worker in workers:
+            try:
+                os.kill(worker.pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def stop_workers(self, workers: List[WorkerProcess]) -> None:
+        """优雅停止指定 worker，超时后强制结束"""
+        self.signal_workers(workers, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        pids = {w.pid for w in workers}
+        while pids & set(self.workers) and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        leftovers = [self.workers[pid] for pid in pids & set(self.workers)]
+        if leftovers:
+            print(f"⚠️  {len(leftovers)} 个 worker 未在 {self.graceful_timeout}s 内退出，强制结束")
+            self.signal_workers(leftovers, signal.SIGKILL)
+            while pids & set(self.workers):
+                self.reap()
+                time.sleep(0.05)
+
+    def reap(self) -> None:
+        """
+        回收已退出的 worker，补充正在提供服务的一代
+
+        等待新一代就绪和停止旧一代期间也会调用：这时退出的服务中 worker 同样会被补充，
+        worker 数量不会因为重载期间的意外退出而永久减少。
+        """
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+            os.close(worker.ready_fd)
+
+            if self.stop_requested or worker.generation != self.generation:
+                continue
+
+            lifetime = time.monotonic() - worker.started_at
+            code = os.waitstatus_to_exitcode(status)
+            if lifetime < FAST_EXIT_SECONDS and code != 0:
+                # 启动即崩溃：指数退避，避免疯狂 fork
+                self.respawn_backoff = min(max(self.respawn_backoff * 2, 1.0), MAX_RESPAWN_BACKOFF)
+                print(f"⚠️  worker {pid} 异常退出（退出码 {code}），{self.respawn_backoff:.0f}s 后重启")
+                time.sleep(self.respawn_backoff)
+            else:
+                self.respawn_backoff = 0.0
+                print(f"worker {pid} 已退出（退出码 {code}），启动新 worker")
+            self.spawn_worker(worker.generation)
+
+    def reload(self) -> bool:
+        """平滑重载：新一代 worker 全部就绪后再停止旧 worker，返回是否成功"""
+        print(f"收到 SIGHUP，启动第 {self.generation + 1} 代 worker...")
+        new_workers = self.spawn_generation()
+        if not self.wait_ready(new_workers, timeout=60):
+            print("❌ 新 worker 未能全部就绪，保留旧 worker")
+            self.stop_workers(new_workers)
+            return False
+        # 切换后旧一代不再补充；等待期间补充的旧 worker 也在其中
+        self.generation += 1
+        old_workers = [w for w in self.workers.values() if w.generation != self.generation]
+        self.stop_workers(old_workers)
+        print(f"✓ 重载完成，当前 {len(self.workers)} 个 worker")
+        return True
+
+    def run(self) -> int:
+        self.install_signal_handlers()
+        if not self.start_first_generation():
+            return 1
+
+        while not self.stop_requested:
+            if self.reload_requested:
+                self.reload_requested = False
+                self.reload()
+            self.reap()
+            time.sleep(0.2)
+
+        print("正在停止所有 worker...")
+        self.stop_workers(list(self.workers.values()))
+        print("[OK] 服务器已停止")
+        return 0
+
+    def start_first_generation(self) -> bool:
+        """启动第一代 worker，未能全部就绪时停止已启动的 worker（启动期间收到停止信号不算失败）"""
+        first = self.spawn_generation()
+        if self.wait_ready(first, timeout=60):
+            self.generation += 1
+            print(f"✓ {len(first)} 个 worker 已就绪")
+            return True
+        self.stop_workers(first)
+        if self.stop_requested:
+            return True
+        print("❌ worker 未能在启动时全部就绪，退出")
+        return False
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="MicroDock 插件服务器生产启动入口")
+    parser.add_argument("--host", default=settings.HOST, help="监听地址")
+    parser.add_argument("--port", type=int, default=settings.PORT, help="监听端口")
+    parser.add_argument("--workers", type=int, default=settings.WORKERS,
+                        help="worker 数量，0 表示每个 CPU 核心一个")
+    parser.add_argument("--max-requests", type=int, default=settings.WORKER_MAX_REQUESTS,
+                        help="worker 处理多少请求后自动重启，0 表示不限制")
+    parser.add_argument("--max-requests-jitter", type=int, default=settings.WORKER_MAX_REQUESTS_JITTER,
+                        help="max-requests 的随机抖动，避免所有 worker 同时重启")
+    parser.add_argument("--graceful-timeout", type=float, default=settings.WORKER_GRACEFUL_TIMEOUT,
+                        help="优雅退出超时（秒）")
+    parser.add_argument("--no-preload", action="store_true",
+                        help="不在主进程预加载应用，SIGHUP 时 worker 会重新导入代码")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    if not hasattr(os, "fork"):
+        print("❌ 多进程启动仅支持类 Unix 系统，Windows 请使用 start_local.py")
+        return 1
+
+    args = parse_args(argv)
+    workers = args.workers or default_worker_count()
+
+    errors = check_config(workers)
+    if not errors:
+        errors = asyncio.run(prepare_database(workers))
+    if errors:
+        print("❌ 配置不安全，拒绝启动:")
+        for error in errors:
+            print(f"   - {error}")
+        return 1
+    configure_cache_bus(workers)
+
+    preload = not args.no_preload
+    if preload:
+        # 预加载：fork 前导入应用，worker 共享已导入的模块页面
+        from app.main import app  # noqa: F401
+
+    sock = create_socket(args.host, args.port)
+    print("=" * 60)
+    print("MicroDock 插件服务器 - 生产模式")
+    print(f"📍 监听: http://{args.host}:{args.port}")
+    print(f"👷 worker: {workers}  预加载: {'是' if preload else '否'}  "
+          f"最大请求数: {args.max_requests or '不限'}")
+    print("=" * 60)
+
+    supervisor = Supervisor(
+        sock,
+        workers=workers,
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+        graceful_timeout=args.graceful_timeout,
+        preload=preload,
+    )
+    return supervisor.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -84,14 +84,21 @@ export const backupService = {
         formData.append('user_key', userKey)
         formData.append('backup_type', backupType)
         formData.append('description', description)
+        // 配额预检请求头：服务器在接收文件之前即可按配额拒绝（413），不必等整个文件上传完
+        const headers = {
+            'Content-Type': 'multipart/form-data',
+            'X-User-Key': userKey
+        }
         if (pluginName) {
             formData.append('plugin_name', pluginName)
+            // 请求头只能包含 ASCII 字符，其他插件名仍由服务器在接收文件后检查
+            if (/^[\x20-\x7e]+$/.test(pluginName)) {
+                headers['X-Plugin-Name'] = pluginName
+            }
         }
 
         return api.post('/backups/upload', formData, {
-            headers: {
-                'Content-Type': 'multipart/form-data'
-            },
+            headers,
             onUploadProgress: onProgress
         })
     },